@@ -1,5 +1,5 @@
 from rest_framework import permissions
-from restaurantes.models import RestauranteUsuario
+from usuarios.autorizacao import contexto_autorizacao
 
 
 class IsFuncionarioOrHigher(permissions.BasePermission):
@@ -10,25 +10,9 @@ class IsFuncionarioOrHigher(permissions.BasePermission):
     
     def has_object_permission(self, request, view, obj):
         """Valida que funcionário trabalha no restaurante da mesa"""
-        user = request.user
-        
-        # Admin_sistema pode fazer tudo
-        if user.usuariopapel_set.filter(papel__nome='admin_sistema').exists():
-            return True
-        
-        # Admin_secundario se for proprietário do restaurante
-        if obj.restaurante.proprietario == user:
-            return True
-        
-        # Funcionário: validar que trabalha naquele restaurante
-        if user.usuariopapel_set.filter(papel__nome='funcionario').exists():
-            return RestauranteUsuario.objects.filter(
-                usuario=user,
-                restaurante=obj.restaurante,
-                papel__nome='funcionario'
-            ).exists()
-        
-        return False
+        # Admin_sistema pode fazer tudo; proprietário, admin_secundario e
+        # funcionário apenas no restaurante em que trabalham
+        return contexto_autorizacao(request).pode_gerenciar(obj.restaurante_id)
 
 
 class IsAdminForWriteOrReadOnly(permissions.BasePermission):
@@ -48,9 +32,7 @@ class IsAdminForWriteOrReadOnly(permissions.BasePermission):
             return False
         
         # Verifica se o usuário tem papel de admin (RN05)
-        return request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
+        return contexto_autorizacao(request).is_admin
 
 
 class IsAdminOrProprietarioRestaurante(permissions.BasePermission):
@@ -69,11 +51,7 @@ class IsAdminOrProprietarioRestaurante(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        # Proprietário do restaurante da mesa
-        if obj.restaurante.proprietario == request.user:
-            return True
+        contexto = contexto_autorizacao(request)
         
-        # Administrador do sistema
-        return request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
+        # Proprietário do restaurante da mesa ou administrador
+        return contexto.is_proprietario(obj.restaurante_id) or contexto.is_admin
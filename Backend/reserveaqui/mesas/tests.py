@@ -1,5 +1,7 @@
 from django.test import TestCase
 from django.db import IntegrityError
+from django.utils import timezone
+from datetime import timedelta, time
 from usuarios.models import Usuario
 from restaurantes.models import Restaurante
 from .models import Mesa
@@ -167,3 +169,186 @@ class MesaModelTest(TestCase):
         
         # Capacidade sempre retorna 4
         self.assertEqual(mesa.capacidade, 4)
+
+
+class GradeDisponibilidadeTest(TestCase):
+    """Testes para o endpoint de grade de disponibilidade do dia"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        
+        self.usuario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='proprietario_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.usuario,
+            quantidade_mesas=2
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.data = timezone.now().date() + timedelta(days=2)
+    
+    def _grade(self, **params):
+        params = {
+            'restaurante_id': self.restaurante.id,
+            'data': str(self.data),
+            'quantidade_pessoas': 8,
+            **params
+        }
+        return self.client.get('/api/mesas/grade_disponibilidade/', params)
+    
+    def test_grade_dia_inteiro(self):
+        """Teste que a grade cobre o dia inteiro no intervalo padrão"""
+        response = self._grade()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['horarios']), 48)
+        self.assertEqual(response.data['mesas_necessarias'], 2)
+        self.assertTrue(all(h['suficiente'] for h in response.data['horarios']))
+    
+    def test_grade_considera_reservas(self):
+        """Teste que horários com mesas reservadas mostram menos mesas livres"""
+        from reservas.models import Reserva, ReservaMesa
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=self.data,
+            horario=time(19, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        ReservaMesa.objects.create(reserva=reserva, mesa=self.restaurante.mesas.first())
+        
+        response = self._grade(horario_inicio='18:00', horario_fim='21:00')
+        grade = {h['horario']: h for h in response.data['horarios']}
+        
+        self.assertEqual(grade['18:00']['mesas_disponiveis'], 2)
+        self.assertEqual(grade['18:30']['mesas_disponiveis'], 1)
+        self.assertFalse(grade['19:30']['suficiente'])
+        self.assertEqual(grade['20:00']['mesas_disponiveis'], 2)
+        self.assertTrue(grade['21:00']['suficiente'])
+    
+    def test_grade_intervalo_invalido(self):
+        """Teste que o intervalo deve ser múltiplo do slot do índice"""
+        response = self._grade(intervalo=20)
+        self.assertEqual(response.status_code, 400)
+    
+    def test_grade_restaurante_invalido(self):
+        """Teste que restaurante_id não numérico é recusado"""
+        response = self._grade(restaurante_id='abc')
+        self.assertEqual(response.status_code, 400)
+
+
+class CacheDisponibilidadeTest(TestCase):
+    """Testes para o cache do endpoint de disponibilidade"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from django.core.cache import caches
+        from rest_framework.test import APIClient
+        caches['disponibilidade'].clear()
+        
+        self.usuario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='proprietario_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.usuario,
+            quantidade_mesas=2
+        )
+        
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.data = timezone.now().date() + timedelta(days=2)
+    
+    def _disponiveis(self, horario='19:00'):
+        response = self.client.get('/api/mesas/disponibilidade/', {
+            'restaurante_id': self.restaurante.id,
+            'data': str(self.data),
+            'horario': horario
+        })
+        self.assertEqual(response.status_code, 200)
+        return [mesa['numero'] for mesa in response.data['mesas']]
+    
+    def _reservar(self, mesa):
+        from reservas.models import Reserva, ReservaMesa
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=self.data,
+            horario=time(19, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        return reserva
+    
+    def test_consulta_repetida_usa_cache(self):
+        """Teste que a mesma consulta é servida do cache sem acessar o banco"""
+        from reservas.cache_disponibilidade import estatisticas
+        self.assertEqual(self._disponiveis(), [1, 2])
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(self._disponiveis(), [1, 2])
+        
+        self.assertEqual(estatisticas(), {'acertos': 1, 'faltas': 1, 'taxa_acerto': 0.5})
+    
+    def test_reserva_e_cancelamento_invalidam_o_dia(self):
+        """Teste que vínculos criados e mudanças de status descartam o cache do dia"""
+        self.assertEqual(self._disponiveis(), [1, 2])
+        self.assertEqual(self._disponiveis('12:00'), [1, 2])
+        
+        reserva = self._reservar(self.restaurante.mesas.get(numero=1))
+        self.assertEqual(self._disponiveis(), [2])
+        
+        reserva.status = 'cancelada'
+        reserva.save(skip_validation=True)
+        self.assertEqual(self._disponiveis(), [1, 2])
+    
+    def test_mudanca_de_mesa_invalida_o_restaurante(self):
+        """Teste que desativar uma mesa descarta o cache do restaurante"""
+        self.assertEqual(self._disponiveis(), [1, 2])
+        
+        mesa = self.restaurante.mesas.get(numero=2)
+        mesa.ativa = False
+        mesa.save()
+        
+        self.assertEqual(self._disponiveis(), [1])
+    
+    def test_reserva_no_dia_seguinte_invalida_horario_tardio(self):
+        """Teste que uma reserva após a meia-noite descarta o cache do horário que passa para o dia seguinte"""
+        from reservas.models import Reserva, ReservaMesa
+        self.assertEqual(self._disponiveis('23:30'), [1, 2])
+        
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=self.data + timedelta(days=1),
+            horario=time(0, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        ReservaMesa.objects.create(reserva=reserva, mesa=self.restaurante.mesas.get(numero=1))
+        
+        self.assertEqual(self._disponiveis('23:30'), [2])
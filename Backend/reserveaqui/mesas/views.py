@@ -4,11 +4,12 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import datetime, time
+import math
 from .models import Mesa
 from .serializers import MesaSerializer, MesaListSerializer
 from .permissions import IsAdminForWriteOrReadOnly, IsAdminOrProprietarioRestaurante, IsFuncionarioOrHigher
-from restaurantes.models import RestauranteUsuario
+from usuarios.autorizacao import contexto_autorizacao
 
 
 class MesaViewSet(viewsets.ModelViewSet):
@@ -22,6 +23,8 @@ class MesaViewSet(viewsets.ModelViewSet):
     partial_update: Atualizar parcialmente mesa (apenas admin ou proprietário - RN05)
     destroy: Remover mesa (apenas admin - RN05)
     disponibilidade: Consultar mesas disponíveis por data e horário
+    grade_disponibilidade: Consultar a disponibilidade de todos os horários de um dia
+    cache_disponibilidade: Contadores do cache de disponibilidade (admin_sistema)
     """
     
     queryset = Mesa.objects.select_related('restaurante').all()
@@ -57,49 +60,24 @@ class MesaViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return queryset.none()
         
-        # Admin_sistema vê todas
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if is_admin_sistema:
-            # Sem filtro restritivo - vê tudo
-            pass
-        else:
-            # Admin_secundario: vê apenas seu restaurante (como proprietário)
-            is_admin_secundario = user.usuariopapel_set.filter(
-                papel__nome='admin_secundario'
-            ).exists()
-            
-            if is_admin_secundario:
-                # Apenas mesas do restaurante que é proprietário
-                from restaurantes.models import Restaurante
-                seu_restaurante = Restaurante.objects.filter(proprietario=user).first()
-                if seu_restaurante:
-                    queryset = queryset.filter(restaurante=seu_restaurante)
-                else:
-                    return queryset.none()
+        contexto = contexto_autorizacao(self.request)
+        
+        # Admin_sistema vê todas (sem filtro restritivo)
+        if not contexto.is_admin_sistema:
+            if contexto.tem_papel('admin_secundario'):
+                # Admin_secundario: apenas mesas dos restaurantes de que é proprietário
+                restaurantes_ids = contexto.restaurantes_proprios()
+            elif contexto.tem_papel('funcionario'):
+                # Funcionário: apenas mesas dos restaurantes onde trabalha
+                restaurantes_ids = contexto.restaurantes_da_equipe()
             else:
-                # Funcionário: vê apenas do restaurante onde trabalha
-                is_funcionario = user.usuariopapel_set.filter(
-                    papel__nome='funcionario'
-                ).exists()
-                
-                if is_funcionario:
-                    # Buscar restaurantes onde trabalha
-                    restaurantes_ids = RestauranteUsuario.objects.filter(
-                        usuario=user,
-                        papel__nome='funcionario'
-                    ).values_list('restaurante_id', flat=True)
-                    
-                    if restaurantes_ids:
-                        queryset = queryset.filter(restaurante_id__in=restaurantes_ids)
-                    else:
-                        return queryset.none()
-                else:
-                    # Cliente: sem acesso direto via list
-                    # Vê apenas via query param restaurante_id
-                    return queryset.none()
+                # Cliente: sem acesso direto via list
+                # Vê apenas via query param restaurante_id
+                return queryset.none()
+            
+            if not restaurantes_ids:
+                return queryset.none()
+            queryset = queryset.filter(restaurante_id__in=restaurantes_ids)
         
         # Filtro por restaurante via query param (override)
         restaurante_id = self.request.query_params.get('restaurante_id', None)
@@ -170,61 +148,169 @@ class MesaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Buscar mesas do restaurante que estão disponíveis
-        mesas_disponiveis = Mesa.objects.filter(
-            restaurante_id=restaurante_id,
-            status='disponivel',
-            ativa=True
-        )
-        
-        # Importar Reserva para verificar conflitos
-        from reservas.models import Reserva, ReservaMesa
-        
-        # Buscar reservas confirmadas ou pendentes para essa data/horário
-        # Considera um intervalo de 2 horas (1h antes e 1h depois)
-        horario_inicio = (datetime.combine(data_reserva, horario_reserva) - timedelta(hours=1)).time()
-        horario_fim = (datetime.combine(data_reserva, horario_reserva) + timedelta(hours=1)).time()
+        if not restaurante_id.isdigit():
+            return Response(
+                {"error": "O parâmetro 'restaurante_id' deve ser um número."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        reservas_ativas = Reserva.objects.filter(
-            restaurante_id=restaurante_id,
-            data_reserva=data_reserva,
-            horario__gte=horario_inicio,
-            horario__lte=horario_fim,
-            status__in=['pendente', 'confirmada']
+        # Mesas ativas e disponíveis sem reserva sobreposta, via índice de ocupação.
+        # O resultado fica em cache até a ocupação do dia ou as mesas mudarem.
+        from reservas import cache_disponibilidade
+        from reservas.ocupacao import mesas_livres
+        mesas_disponiveis = cache_disponibilidade.obter(
+            restaurante_id, data_reserva, horario_reserva,
+            lambda: list(MesaSerializer(
+                mesas_livres(restaurante_id, data_reserva, horario_reserva), many=True
+            ).data)
         )
         
-        # IDs das mesas ocupadas nessas reservas
-        mesas_ocupadas_ids = ReservaMesa.objects.filter(
-            reserva__in=reservas_ativas
-        ).values_list('mesa_id', flat=True)
-        
-        # Excluir mesas ocupadas
-        mesas_disponiveis = mesas_disponiveis.exclude(id__in=mesas_ocupadas_ids)
-        
         # Se quantidade_pessoas foi informada, calcular quantas mesas são necessárias
         info_adicional = {}
         if quantidade_pessoas:
             try:
                 qtd_pessoas = int(quantidade_pessoas)
-                import math
                 mesas_necessarias = math.ceil(qtd_pessoas / 4)
                 info_adicional = {
                     "quantidade_pessoas": qtd_pessoas,
                     "mesas_necessarias": mesas_necessarias,
-                    "mesas_disponiveis_suficientes": mesas_disponiveis.count() >= mesas_necessarias
+                    "mesas_disponiveis_suficientes": len(mesas_disponiveis) >= mesas_necessarias
                 }
             except ValueError:
                 pass
         
-        serializer = MesaSerializer(mesas_disponiveis, many=True)
-        
         return Response({
             "restaurante_id": restaurante_id,
             "data": data_str,
             "horario": horario_str,
-            "total_mesas_disponiveis": mesas_disponiveis.count(),
+            "total_mesas_disponiveis": len(mesas_disponiveis),
             **info_adicional,
-            "mesas": serializer.data
+            "mesas": mesas_disponiveis
+        })
+    
+    @action(detail=False, methods=['get'], url_path='cache_disponibilidade')
+    def cache_disponibilidade(self, request):
+        """
+        Contadores do cache de disponibilidade (acertos, faltas e taxa de acerto).
+        Apenas admin_sistema. Com ?zerar=true, zera os contadores após a leitura.
+        """
+        if not contexto_autorizacao(request).is_admin_sistema:
+            return Response(
+                {"error": "Apenas administradores do sistema podem ver as estatísticas do cache."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        from reservas import cache_disponibilidade
+        estatisticas = cache_disponibilidade.estatisticas()
+        if request.query_params.get('zerar') == 'true':
+            cache_disponibilidade.zerar_estatisticas()
+        
+        return Response(estatisticas)
+    
+    @action(detail=False, methods=['get'], url_path='grade_disponibilidade')
+    def grade_disponibilidade(self, request):
+        """
+        Consulta a disponibilidade de um restaurante para todos os horários de um dia.
+        Substitui várias chamadas a disponibilidade/ para montar o seletor de horários.
+        
+        Query params:
+        - restaurante_id (obrigatório): ID do restaurante
+        - data (obrigatório): Data no formato YYYY-MM-DD
+        - quantidade_pessoas (obrigatório): Quantidade de pessoas
+        - intervalo (opcional): Minutos entre horários, múltiplo de 15 (padrão: 30)
+        - horario_inicio / horario_fim (opcional): Faixa do dia no formato HH:MM
+        
+        Retorna, para cada horário, quantas mesas estão livres e se comportam o grupo.
+        """
+        from reservas.ocupacao import grade_disponibilidade, MINUTOS_POR_SLOT
+        
+        restaurante_id = request.query_params.get('restaurante_id')
+        data_str = request.query_params.get('data')
+        quantidade_pessoas = request.query_params.get('quantidade_pessoas')
+        
+        # Validações
+        if not restaurante_id or not data_str or not quantidade_pessoas:
+            return Response(
+                {"error": "Os parâmetros 'restaurante_id', 'data' e 'quantidade_pessoas' são obrigatórios."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not restaurante_id.isdigit():
+            return Response(
+                {"error": "O parâmetro 'restaurante_id' deve ser um número."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            data_reserva = datetime.strptime(data_str, '%Y-%m-%d').date()
+            horario_inicio = datetime.strptime(
+                request.query_params.get('horario_inicio', '00:00'), '%H:%M'
+            ).time()
+            horario_fim = datetime.strptime(
+                request.query_params.get('horario_fim', '23:59'), '%H:%M'
+            ).time()
+        except ValueError:
+            return Response(
+                {"error": "Formato de data ou horário inválido. Use YYYY-MM-DD para data e HH:MM para horário."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            qtd_pessoas = int(quantidade_pessoas)
+            intervalo = int(request.query_params.get('intervalo', 30))
+        except ValueError:
+            return Response(
+                {"error": "Os parâmetros 'quantidade_pessoas' e 'intervalo' devem ser números inteiros."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if qtd_pessoas < 1:
+            return Response(
+                {"error": "A quantidade de pessoas deve ser maior que zero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if intervalo < MINUTOS_POR_SLOT or intervalo % MINUTOS_POR_SLOT:
+            return Response(
+                {"error": f"O intervalo deve ser múltiplo de {MINUTOS_POR_SLOT} minutos."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        agora = timezone.localtime()
+        if data_reserva < agora.date():
+            return Response(
+                {"error": "Não é possível consultar disponibilidade para datas no passado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Montar os horários candidatos do dia, ignorando os que já passaram
+        horarios = []
+        minuto = horario_inicio.hour * 60 + horario_inicio.minute
+        fim = horario_fim.hour * 60 + horario_fim.minute
+        while minuto <= fim:
+            horario = time(minuto // 60, minuto % 60)
+            if data_reserva > agora.date() or horario > agora.time():
+                horarios.append(horario)
+            minuto += intervalo
+        
+        grade, total_mesas = grade_disponibilidade(restaurante_id, data_reserva, horarios)
+        mesas_necessarias = math.ceil(qtd_pessoas / 4)
+        
+        return Response({
+            "restaurante_id": restaurante_id,
+            "data": data_str,
+            "quantidade_pessoas": qtd_pessoas,
+            "mesas_necessarias": mesas_necessarias,
+            "total_mesas": total_mesas,
+            "intervalo": intervalo,
+            "horarios": [
+                {
+                    "horario": horario.strftime('%H:%M'),
+                    "mesas_disponiveis": livres,
+                    "suficiente": livres >= mesas_necessarias
+                }
+                for horario, livres in grade
+            ]
         })
     
     @action(detail=True, methods=['patch'])
@@ -244,43 +330,20 @@ class MesaViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Validar permissão: admin_sistema, admin_secundario ou funcionario
-        user = request.user
-        
-        # Admin_sistema: tudo bem
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
+        # Validar permissão: admin_sistema, proprietário/admin_secundario ou funcionário do restaurante
+        contexto = contexto_autorizacao(request)
         
-        if not is_admin_sistema:
-            # Admin_secundario: deve ser proprietário
-            if user == mesa.restaurante.proprietario:
-                pass  # OK
-            else:
-                # Funcionário: deve trabalhar naquele restaurante
-                is_funcionario = user.usuariopapel_set.filter(
-                    papel__nome='funcionario'
-                ).exists()
-                
-                if is_funcionario:
-                    # Validar que trabalha no restaurante
-                    trabalha_aqui = RestauranteUsuario.objects.filter(
-                        usuario=user,
-                        restaurante=mesa.restaurante,
-                        papel__nome='funcionario'
-                    ).exists()
-                    
-                    if not trabalha_aqui:
-                        return Response(
-                            {"error": "Você não trabalha neste restaurante."},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    # Outro papel sem permissão
-                    return Response(
-                        {"error": "Apenas administradores e funcionários podem alternar status."},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
+        if not contexto.pode_gerenciar(mesa.restaurante_id):
+            if contexto.tem_papel('funcionario'):
+                return Response(
+                    {"error": "Você não trabalha neste restaurante."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            # Outro papel sem permissão
+            return Response(
+                {"error": "Apenas administradores e funcionários podem alternar status."},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
         mesa.status = novo_status
         mesa.save()
@@ -297,11 +360,7 @@ class MesaViewSet(viewsets.ModelViewSet):
         Body: { "ativa": true|false }
         """
         # Apenas admin_sistema
-        is_admin_sistema = request.user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if not is_admin_sistema:
+        if not contexto_autorizacao(request).is_admin_sistema:
             return Response(
                 {"error": "Apenas administradores podem ativar/desativar mesas."},
                 status=status.HTTP_403_FORBIDDEN
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Reserva, ReservaMesa, Notificacao
+from .models import Reserva, ReservaMesa, Notificacao, OcupacaoDiaria, CapacidadeSlot, BloqueioMesa, ChaveIdempotencia, ResumoDiario
 
 
 class ReservaMesaInline(admin.TabularInline):
@@ -105,6 +105,142 @@ class ReservaMesaAdmin(admin.ModelAdmin):
     
     readonly_fields = ['data_vinculacao']
 
+
+@admin.register(OcupacaoDiaria)
+class OcupacaoDiariaAdmin(admin.ModelAdmin):
+    """Admin (somente leitura) para o índice de ocupação"""
+    
+    list_display = [
+        'id',
+        'restaurante',
+        'data',
+        'data_atualizacao'
+    ]
+    
+    list_filter = [
+        'data',
+        'restaurante'
+    ]
+    
+    readonly_fields = [
+        'restaurante',
+        'data',
+        'mapa',
+        'data_atualizacao'
+    ]
+
+
+@admin.register(CapacidadeSlot)
+class CapacidadeSlotAdmin(admin.ModelAdmin):
+    """Admin (somente leitura) para a capacidade por slot"""
+    
+    list_display = [
+        'restaurante',
+        'data',
+        'slot',
+        'mesas_livres',
+        'mesas_ocupadas',
+        'pessoas'
+    ]
+    
+    list_filter = [
+        'data',
+        'restaurante'
+    ]
+    
+    readonly_fields = [
+        'restaurante',
+        'data',
+        'slot',
+        'mesas_livres',
+        'mesas_ocupadas',
+        'pessoas'
+    ]
+
+
+@admin.register(ResumoDiario)
+class ResumoDiarioAdmin(admin.ModelAdmin):
+    """Admin (somente leitura) para o resumo diário de reservas"""
+    
+    list_display = [
+        'restaurante',
+        'data_reserva',
+        'horario',
+        'status',
+        'quantidade',
+        'pessoas'
+    ]
+    
+    list_filter = [
+        'data_reserva',
+        'status',
+        'restaurante'
+    ]
+    
+    readonly_fields = [
+        'restaurante',
+        'data_reserva',
+        'horario',
+        'status',
+        'quantidade',
+        'pessoas'
+    ]
+
+@admin.register(BloqueioMesa)
+class BloqueioMesaAdmin(admin.ModelAdmin):
+    """Admin para os bloqueios temporários de mesas"""
+    
+    list_display = [
+        'token',
+        'restaurante',
+        'usuario',
+        'data_reserva',
+        'horario',
+        'quantidade_pessoas',
+        'expira_em'
+    ]
+    
+    list_filter = [
+        'data_reserva',
+        'restaurante'
+    ]
+    
+    readonly_fields = [
+        'token',
+        'inicio',
+        'fim',
+        'data_criacao'
+    ]
+
+
+@admin.register(ChaveIdempotencia)
+class ChaveIdempotenciaAdmin(admin.ModelAdmin):
+    """Admin (somente leitura) para as respostas gravadas por Idempotency-Key"""
+    
+    list_display = [
+        'chave',
+        'usuario',
+        'status_code',
+        'data_criacao',
+        'expira_em'
+    ]
+    
+    search_fields = [
+        'chave',
+        'usuario__email'
+    ]
+    
+    readonly_fields = [
+        'usuario',
+        'chave',
+        'impressao',
+        'status_code',
+        'resposta',
+        'data_criacao',
+        'expira_em'
+    ]
+
+
 @admin.register(Notificacao)
 class NotificacaoAdmin(admin.ModelAdmin):
     """Admin para o modelo Notificacao"""
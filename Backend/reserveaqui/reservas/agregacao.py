@@ -0,0 +1,91 @@
+"""
+Agregação de reservas por período (baldes de tempo).
+
+Os relatórios agrupam reservas por dia, semana ISO, mês, hora, horário ou dia
+da semana. O balde é calculado no banco (Trunc/Extract sobre `data_reserva` e
+`horario`) e a agregação vira um GROUP BY; nenhuma linha de Reserva é
+materializada em Python.
+
+- anotar_periodo: queryset de `.values()` agrupado pelo balde (campo `periodo`)
+  e por dimensões extras (ex: restaurante), para o chamador anotar e ordenar;
+- agregar_por_periodo: série ordenada pelo balde, com o rótulo de cada período.
+
+Os campos de data e horário podem ser caminhos (ex: `reserva__data_reserva`
+sobre ReservaMesa).
+"""
+
+from django.db.models import DateField, F
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay, TruncMonth, TruncWeek
+
+
+DIAS_DA_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+
+def _rotulo_semana(segunda):
+    ano, semana, _ = segunda.isocalendar()
+    return f'Semana {semana}/{ano}'
+
+
+# tipo_periodo: (expressão do balde a partir de (campo_data, campo_horario), rótulo do balde)
+PERIODOS = {
+    'dia': (
+        lambda campo_data, campo_horario: F(campo_data),
+        lambda dia: dia.strftime('%d/%m/%Y')
+    ),
+    'semana': (
+        lambda campo_data, campo_horario: TruncWeek(campo_data, output_field=DateField()),
+        _rotulo_semana
+    ),
+    'mes': (
+        lambda campo_data, campo_horario: TruncMonth(campo_data, output_field=DateField()),
+        lambda mes: mes.strftime('%m/%Y')
+    ),
+    'hora': (
+        lambda campo_data, campo_horario: ExtractHour(campo_horario),
+        lambda hora: f'{hora:02d}:00'
+    ),
+    'horario': (
+        lambda campo_data, campo_horario: F(campo_horario),
+        lambda horario: horario.strftime('%H:%M')
+    ),
+    'dia_semana': (
+        lambda campo_data, campo_horario: ExtractIsoWeekDay(campo_data),
+        lambda dia: DIAS_DA_SEMANA[dia - 1]
+    ),
+}
+
+# Períodos aceitos pelos endpoints de estatísticas
+TIPOS_PERIODO = ['dia', 'semana', 'mes', 'hora', 'dia_semana']
+
+
+def anotar_periodo(queryset, tipo_periodo, dimensoes=(), campo_data='data_reserva', campo_horario='horario'):
+    """
+    Retorna o queryset agrupado por `periodo` (o balde do tipo) e pelas
+    dimensões, pronto para .annotate(); sem ordenação.
+    """
+    if tipo_periodo not in PERIODOS:
+        raise ValueError(f'Tipo de período inválido: {tipo_periodo}')
+    expressao = PERIODOS[tipo_periodo][0](campo_data, campo_horario)
+    return queryset.annotate(periodo=expressao).values('periodo', *dimensoes).order_by()
+
+
+def rotulo_periodo(tipo_periodo, periodo):
+    """Rótulo legível do balde (ex: '05/03/2026', 'Semana 10/2026', '19:00')"""
+    return PERIODOS[tipo_periodo][1](periodo)
+
+
+def agregar_por_periodo(queryset, tipo_periodo, dimensoes=(), campo_data='data_reserva',
+                        campo_horario='horario', **agregacoes):
+    """
+    Agrega o queryset por período com uma consulta. Retorna a série ordenada pelas
+    dimensões e pelo balde: dicts com `periodo` (o valor do balde), `rotulo`, as
+    dimensões e as agregações.
+    """
+    linhas = anotar_periodo(
+        queryset, tipo_periodo, dimensoes, campo_data, campo_horario
+    ).annotate(**agregacoes).order_by(*dimensoes, 'periodo')
+    serie = []
+    for linha in linhas:
+        linha['rotulo'] = rotulo_periodo(tipo_periodo, linha['periodo'])
+        serie.append(linha)
+    return serie
@@ -0,0 +1,131 @@
+"""
+Estratégias de alocação de mesas.
+
+Depois que o índice de ocupação diz quais mesas estão livres no intervalo da
+reserva, a estratégia escolhe quais delas alocar. A escolha não muda se a
+reserva cabe agora, mas muda quantas reservas cabem depois: pegar sempre as
+mesas de menor número espalha buracos curtos pelo salão ao longo da noite.
+
+A estratégia em uso vem de settings.RESERVAS_ESTRATEGIA_ALOCACAO, com um dos
+nomes de ESTRATEGIAS ou o caminho de uma classe com o mesmo método `escolher`.
+"""
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from .ocupacao import SLOTS_POR_DIA
+
+
+class EstrategiaAlocacao:
+    """
+    Base das estratégias. `escolher` recebe as mesas livres (ordenadas por
+    número), a quantidade necessária, os índices dos dias envolvidos
+    ({data: {mesa_id: bitmap}}) e as máscaras do intervalo pedido por dia, e
+    retorna as mesas a alocar. Só é chamada quando há mesas livres suficientes.
+    """
+
+    nome = None
+
+    def escolher(self, mesas, quantidade, mapas, mascaras):
+        raise NotImplementedError
+
+
+class PrimeiroLivre(EstrategiaAlocacao):
+    """Mesas livres de menor número (comportamento original)"""
+
+    nome = 'primeiro_livre'
+
+    def escolher(self, mesas, quantidade, mapas, mascaras):
+        return mesas[:quantidade]
+
+
+class MelhorEncaixe(EstrategiaAlocacao):
+    """
+    Mesas em que a reserva deixa menos sobra inútil: trechos livres antes e
+    depois do intervalo pedido que ficariam curtos demais para outra reserva.
+    Entre as demais, prefere o menor buraco livre (mesas "coladas" em reservas
+    existentes), deixando as mesas vazias para depois. Empates vão para o menor
+    número.
+    """
+
+    nome = 'melhor_encaixe'
+
+    def escolher(self, mesas, quantidade, mapas, mascaras):
+        dias = sorted(mascaras)
+        pedido = _concatenar({dia: mascaras[dia] for dia in dias}, dias)
+        primeiro = (pedido & -pedido).bit_length() - 1
+        ultimo = pedido.bit_length() - 1
+        total_slots = len(dias) * SLOTS_POR_DIA
+        slots_pedido = ultimo - primeiro + 1
+
+        def custo(mesa):
+            ocupado = _concatenar({dia: mapas[dia].get(mesa.id, 0) for dia in dias}, dias)
+            antes = _slots_livres(ocupado, primeiro - 1, -1, -1)
+            depois = _slots_livres(ocupado, ultimo + 1, total_slots, 1)
+            # Sobras menores que uma reserva não servem para mais nada
+            desperdicio = sum(sobra for sobra in (antes, depois) if sobra < slots_pedido)
+            return desperdicio, antes + depois, mesa.numero
+
+        return sorted(mesas, key=custo)[:quantidade]
+
+
+class BlocoContiguo(EstrategiaAlocacao):
+    """
+    Mesas de números consecutivos (mesas vizinhas no salão). Usa o menor bloco
+    livre que comporta a reserva, deixando os blocos grandes para grupos
+    maiores. Sem bloco suficiente, cai para as mesas livres de menor número.
+    """
+
+    nome = 'bloco_contiguo'
+
+    def escolher(self, mesas, quantidade, mapas, mascaras):
+        blocos = []
+        for mesa in mesas:
+            if blocos and mesa.numero == blocos[-1][-1].numero + 1:
+                blocos[-1].append(mesa)
+            else:
+                blocos.append([mesa])
+
+        candidatos = [bloco for bloco in blocos if len(bloco) >= quantidade]
+        if not candidatos:
+            return mesas[:quantidade]
+        return min(candidatos, key=len)[:quantidade]
+
+
+ESTRATEGIAS = {
+    estrategia.nome: estrategia
+    for estrategia in (PrimeiroLivre, MelhorEncaixe, BlocoContiguo)
+}
+
+
+def _concatenar(bitmaps, dias):
+    """Junta os bitmaps de dias consecutivos em um só, com o primeiro dia nos bits baixos"""
+    resultado = 0
+    for posicao, dia in enumerate(dias):
+        resultado |= bitmaps[dia] << (posicao * SLOTS_POR_DIA)
+    return resultado
+
+
+def _slots_livres(ocupado, inicio, limite, passo):
+    """Conta os slots livres consecutivos a partir de `inicio`, andando `passo` até `limite`"""
+    livres = 0
+    for slot in range(inicio, limite, passo):
+        if ocupado >> slot & 1:
+            break
+        livres += 1
+    return livres
+
+
+def obter_estrategia(nome=None):
+    """
+    Instancia a estratégia pelo nome (ou caminho de classe). Sem nome, usa
+    settings.RESERVAS_ESTRATEGIA_ALOCACAO.
+    """
+    nome = nome or getattr(settings, 'RESERVAS_ESTRATEGIA_ALOCACAO', MelhorEncaixe.nome)
+    if nome in ESTRATEGIAS:
+        return ESTRATEGIAS[nome]()
+    if '.' in nome:
+        return import_string(nome)()
+    raise ValueError(
+        f"Estratégia de alocação desconhecida: {nome}. "
+        f"Opções: {', '.join(ESTRATEGIAS)} ou o caminho de uma classe."
+    )
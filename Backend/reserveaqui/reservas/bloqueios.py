@@ -0,0 +1,100 @@
+"""
+Bloqueios temporários de mesas (BloqueioMesa).
+
+Durante o preenchimento do formulário o cliente segura as mesas da futura
+reserva por alguns minutos (settings.RESERVAS_TTL_BLOQUEIO, em segundos). O
+bloqueio ocupa as mesas no índice de ocupação como uma reserva ativa, então
+outra requisição não as vê livres e a criação da reserva com o token do
+bloqueio não precisa repetir a busca de disponibilidade.
+
+Bloqueios expirados deixam de contar no recálculo do índice e são apagados:
+- na leitura de um dia cujo índice inclui um bloqueio já expirado (obter_mapas
+  e, para a tabela de capacidade, liberar_bloqueios_vencidos);
+- pelo comando `liberar_bloqueios_expirados`, para agendamento periódico.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import BloqueioMesa, dias_do_intervalo
+
+
+TTL_BLOQUEIO_PADRAO = 300
+
+
+def ttl_bloqueio():
+    """Validade de um bloqueio novo"""
+    return timedelta(seconds=getattr(settings, 'RESERVAS_TTL_BLOQUEIO', TTL_BLOQUEIO_PADRAO))
+
+
+def _atualizar_dias(dias):
+    """Recalcula o índice de cada (restaurante_id, data), em ordem"""
+    from .ocupacao import atualizar_ocupacao
+    for restaurante_id, data in sorted(dias):
+        atualizar_ocupacao(restaurante_id, data)
+
+
+def dias_dos_bloqueios(bloqueios):
+    """Retorna {(restaurante_id, data)} ocupados pelos bloqueios"""
+    return {
+        (restaurante_id, data)
+        for restaurante_id, inicio, fim in bloqueios.values_list('restaurante_id', 'inicio', 'fim')
+        for data in dias_do_intervalo(inicio, fim)
+    }
+
+
+def _excluir(bloqueios):
+    """Apaga os bloqueios e retorna (quantidade, {(restaurante_id, data) que ocupavam})"""
+    dias = set()
+    ids = []
+    for bloqueio_id, restaurante_id, inicio, fim in bloqueios.values_list('id', 'restaurante_id', 'inicio', 'fim'):
+        ids.append(bloqueio_id)
+        dias.update((restaurante_id, data) for data in dias_do_intervalo(inicio, fim))
+    if ids:
+        BloqueioMesa.objects.filter(id__in=ids).delete()
+    return len(ids), dias
+
+
+def liberar_bloqueios_expirados(restaurante_id=None, datas=None):
+    """
+    Apaga os bloqueios expirados (do restaurante e dos dias, se informados) e
+    recalcula o índice dos dias afetados. Os dias pedidos são sempre
+    recalculados, para que o índice deixe de apontar a expiração já vencida.
+    Retorna a quantidade de bloqueios apagados.
+    """
+    bloqueios = BloqueioMesa.objects.filter(expira_em__lte=timezone.now())
+    if restaurante_id is not None:
+        restaurante_id = int(restaurante_id)
+        bloqueios = bloqueios.filter(restaurante_id=restaurante_id)
+
+    with transaction.atomic():
+        if datas:
+            from .ocupacao import inicio_do_dia
+            bloqueios = bloqueios.filter(
+                fim__gt=inicio_do_dia(min(datas)),
+                inicio__lt=inicio_do_dia(max(datas) + timedelta(days=1))
+            )
+        quantidade, dias = _excluir(bloqueios)
+        if restaurante_id is not None and datas:
+            dias.update((restaurante_id, data) for data in datas)
+        _atualizar_dias(dias)
+    return quantidade
+
+
+def liberar_bloqueios_usuario(usuario):
+    """
+    Apaga os bloqueios do usuário (um bloqueio novo substitui os anteriores).
+    Na criação de um bloqueio, os dias (dias_dos_bloqueios) devem estar travados
+    junto com os do novo.
+    """
+    with transaction.atomic():
+        _atualizar_dias(_excluir(BloqueioMesa.objects.filter(usuario=usuario))[1])
+
+
+def liberar_bloqueio(bloqueio):
+    """Apaga um bloqueio e devolve suas mesas ao índice"""
+    with transaction.atomic():
+        _atualizar_dias(_excluir(BloqueioMesa.objects.filter(pk=bloqueio.pk))[1])
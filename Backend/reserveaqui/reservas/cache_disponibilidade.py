@@ -0,0 +1,160 @@
+"""
+Cache das consultas de disponibilidade.
+
+As respostas são guardadas por (restaurante, data, horário) no cache definido
+em settings.RESERVAS_CACHE_DISPONIBILIDADE (um alias de settings.CACHES, memória
+local por padrão). A invalidação é por versão: cada restaurante e cada
+(restaurante, data) têm um contador que entra na chave, e mudar a ocupação do
+dia ou as mesas do restaurante só incrementa o contador, sem precisar saber
+quais horários estavam guardados. Horários cuja reserva pode passar da
+meia-noite também levam na chave a versão do dia seguinte. Respostas de dias
+com bloqueios de mesas valem só até a expiração do primeiro deles.
+
+Os contadores de acertos e faltas ficam no próprio cache, para serem somados
+entre processos quando o backend é compartilhado.
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from django.db.models import Min
+from django.utils import timezone
+
+from restaurantes.models import DURACAO_RESERVA_MAXIMA
+from .models import OcupacaoDiaria
+
+
+PREFIXO = 'disponibilidade'
+CHAVE_ACERTOS = f'{PREFIXO}:acertos'
+CHAVE_FALTAS = f'{PREFIXO}:faltas'
+
+
+def _cache():
+    return caches[getattr(settings, 'RESERVAS_CACHE_DISPONIBILIDADE', 'default')]
+
+
+def _chave_versao_restaurante(restaurante_id):
+    return f'{PREFIXO}:versao:{restaurante_id}'
+
+
+def _chave_versao_dia(restaurante_id, data):
+    return f'{PREFIXO}:versao:{restaurante_id}:{data.isoformat()}'
+
+
+def _versao_inicial():
+    # Versões perdidas (expiradas ou removidas pelo backend) recomeçam de um
+    # valor novo, e não de zero, para nunca reaproveitar entradas antigas
+    return time.time_ns()
+
+
+def _dias_do_horario(data, horario):
+    """Dias cuja ocupação afeta uma reserva no horário (o seguinte, se ela puder passar da meia-noite)"""
+    fim_maximo = datetime.combine(data, horario) + DURACAO_RESERVA_MAXIMA
+    if fim_maximo > datetime.combine(data + timedelta(days=1), datetime.min.time()):
+        return [data, data + timedelta(days=1)]
+    return [data]
+
+
+def _versoes(restaurante_id, dias):
+    cache = _cache()
+    chaves = [_chave_versao_restaurante(restaurante_id)] + [
+        _chave_versao_dia(restaurante_id, dia) for dia in dias
+    ]
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            cache.add(chave, _versao_inicial(), timeout=None)
+            versoes[chave] = cache.get(chave)
+    return [versoes[chave] for chave in chaves]
+
+
+def _incrementar(chave, inicial=0):
+    cache = _cache()
+    try:
+        return cache.incr(chave)
+    except ValueError:
+        cache.add(chave, inicial, timeout=None)
+        return cache.incr(chave)
+
+
+def _validade(restaurante_id, dias):
+    """
+    Segundos até o primeiro bloqueio dos dias expirar (None sem bloqueios), pois
+    a expiração libera mesas sem passar por uma escrita
+    """
+    proxima = OcupacaoDiaria.objects.filter(
+        restaurante_id=restaurante_id, data__in=dias
+    ).aggregate(proxima=Min('proxima_expiracao'))['proxima']
+    if proxima is None:
+        return None
+    return int((proxima - timezone.now()).total_seconds())
+
+
+def obter(restaurante_id, data, horario, calcular):
+    """
+    Retorna a disponibilidade guardada para (restaurante, data, horário) ou a
+    calcula com `calcular()` e a guarda.
+    """
+    restaurante_id = int(restaurante_id)
+    dias = _dias_do_horario(data, horario)
+    versao_restaurante, *versoes_dias = _versoes(restaurante_id, dias)
+    chave = (
+        f'{PREFIXO}:{restaurante_id}:{versao_restaurante}:'
+        f'{data.isoformat()}:{":".join(map(str, versoes_dias))}:{horario.strftime("%H%M")}'
+    )
+
+    cache = _cache()
+    valor = cache.get(chave)
+    if valor is not None:
+        _incrementar(CHAVE_ACERTOS)
+        return valor
+
+    _incrementar(CHAVE_FALTAS)
+    valor = calcular()
+    validade = _validade(restaurante_id, dias)
+    if validade is None:
+        cache.set(chave, valor)
+    elif validade > 0:
+        cache.set(chave, valor, validade)
+    return valor
+
+
+def _invalidar(chave):
+    """
+    Incrementa a versão na hora e de novo após o commit: o segundo incremento
+    descarta o que outra requisição tenha guardado a partir do estado anterior
+    ao commit.
+    """
+    _incrementar(chave, _versao_inicial())
+    transaction.on_commit(lambda: _incrementar(chave, _versao_inicial()))
+
+
+def invalidar_dia(restaurante_id, data):
+    """Descarta as disponibilidades guardadas de um restaurante em um dia"""
+    _invalidar(_chave_versao_dia(int(restaurante_id), data))
+
+
+def invalidar_restaurante(restaurante_id):
+    """Descarta todas as disponibilidades guardadas de um restaurante"""
+    _invalidar(_chave_versao_restaurante(int(restaurante_id)))
+
+
+def estatisticas():
+    """Retorna acertos, faltas e taxa de acerto do cache"""
+    valores = _cache().get_many([CHAVE_ACERTOS, CHAVE_FALTAS])
+    acertos = valores.get(CHAVE_ACERTOS, 0)
+    faltas = valores.get(CHAVE_FALTAS, 0)
+    total = acertos + faltas
+    return {
+        'acertos': acertos,
+        'faltas': faltas,
+        'taxa_acerto': round(acertos / total, 4) if total else 0,
+    }
+
+
+def zerar_estatisticas():
+    _cache().delete_many([CHAVE_ACERTOS, CHAVE_FALTAS])
@@ -0,0 +1,237 @@
+"""
+Tabela de capacidade por slot (CapacidadeSlot).
+
+Para cada restaurante, dia e slot de MINUTOS_POR_SLOT minutos guarda:
+- mesas_livres: mesas ativas e disponíveis livres para uma reserva que começa
+  no slot (com a duração de reserva do restaurante);
+- mesas_ocupadas e pessoas: ocupação durante o slot.
+
+As linhas de um dia são recalculadas dentro da mesma transação em que o índice
+de ocupação do dia é regravado (reservas/ocupacao.py), gravando só as linhas
+que mudaram. Como uma reserva que começa no fim de um dia avança pelo seguinte,
+mudanças no dia também atualizam os últimos slots do dia anterior.
+
+Um dia sem linhas não tem reservas ativas: todas as mesas elegíveis estão livres
+(ver anotar_mesas_livres em ocupacao.py).
+"""
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from mesas.models import Mesa
+from restaurantes.models import Restaurante
+from .models import CapacidadeSlot, OcupacaoDiaria
+from .ocupacao import SLOTS_POR_DIA, MINUTOS_POR_SLOT, calcular_dia, _desserializar_mapa
+
+
+CAMPOS_CAPACIDADE = ['mesas_livres', 'mesas_ocupadas', 'pessoas']
+
+
+def slots_da_duracao(duracao):
+    """Quantidade de slots ocupados por uma reserva com a duração (arredondada para cima)"""
+    return -int(-duracao.total_seconds() // (MINUTOS_POR_SLOT * 60))
+
+
+def slot_exato(horario):
+    """Retorna o slot que começa no horário, ou None se o horário não cair no início de um slot"""
+    minutos = horario.hour * 60 + horario.minute
+    if horario.second or horario.microsecond or minutos % MINUTOS_POR_SLOT:
+        return None
+    return minutos // MINUTOS_POR_SLOT
+
+
+def _contexto_restaurante(restaurante_id):
+    """Retorna os ids das mesas elegíveis e os slots de uma reserva do restaurante"""
+    duracao = Restaurante.objects.filter(pk=restaurante_id).values_list('duracao_reserva', flat=True).first()
+    mesas = list(
+        Mesa.objects.filter(
+            restaurante_id=restaurante_id,
+            ativa=True,
+            status='disponivel'
+        ).values_list('id', flat=True)
+    )
+    return mesas, slots_da_duracao(duracao) if duracao else 1
+
+
+def _mapa_do_dia(restaurante_id, data):
+    """Bitmaps do dia a partir do índice gravado ou, se ele não existir, das reservas"""
+    ocupacao = OcupacaoDiaria.objects.filter(restaurante_id=restaurante_id, data=data).only('mapa').first()
+    if ocupacao is not None:
+        return _desserializar_mapa(ocupacao.mapa)
+    return calcular_dia(restaurante_id, data)[0]
+
+
+def _livres_por_slot(mesas, slots_reserva, mapa, mapa_seguinte, slots):
+    """Conta, para cada slot pedido, as mesas sem ocupação na janela da reserva"""
+    janela_base = (1 << slots_reserva) - 1
+    ocupacoes = [mapa.get(mesa_id, 0) | (mapa_seguinte.get(mesa_id, 0) << SLOTS_POR_DIA) for mesa_id in mesas]
+    return {
+        slot: sum(1 for bits in ocupacoes if not bits & (janela_base << slot))
+        for slot in slots
+    }
+
+
+def calcular_capacidade(restaurante_id, data, mapa=None, pessoas=None, contexto=None, mapa_seguinte=None):
+    """Retorna {slot: (mesas_livres, mesas_ocupadas, pessoas)} do dia a partir das fontes"""
+    if mapa is None or pessoas is None:
+        mapa, pessoas = calcular_dia(restaurante_id, data)
+    mesas, slots_reserva = contexto or _contexto_restaurante(restaurante_id)
+    if mapa_seguinte is None:
+        mapa_seguinte = _mapa_do_dia(restaurante_id, data + timedelta(days=1))
+
+    livres = _livres_por_slot(mesas, slots_reserva, mapa, mapa_seguinte, range(SLOTS_POR_DIA))
+    return {
+        slot: (livres[slot], sum(1 for bits in mapa.values() if bits >> slot & 1), pessoas[slot])
+        for slot in range(SLOTS_POR_DIA)
+    }
+
+
+def _gravar(restaurante_id, data, valores):
+    """Grava as linhas do dia que mudaram; `valores` pode cobrir só parte dos slots e campos"""
+    existentes = {
+        capacidade.slot: capacidade
+        for capacidade in CapacidadeSlot.objects.filter(
+            restaurante_id=restaurante_id,
+            data=data,
+            slot__in=list(valores)
+        )
+    }
+
+    novas, alteradas = [], []
+    for slot, campos in valores.items():
+        capacidade = existentes.get(slot)
+        if capacidade is None:
+            novas.append(CapacidadeSlot(restaurante_id=restaurante_id, data=data, slot=slot, **campos))
+        elif any(getattr(capacidade, campo) != valor for campo, valor in campos.items()):
+            for campo, valor in campos.items():
+                setattr(capacidade, campo, valor)
+            alteradas.append(capacidade)
+
+    if novas:
+        CapacidadeSlot.objects.bulk_create(novas)
+    if alteradas:
+        CapacidadeSlot.objects.bulk_update(alteradas, CAMPOS_CAPACIDADE)
+    return len(novas) + len(alteradas)
+
+
+def atualizar_capacidade(restaurante_id, data, mapa=None, pessoas=None):
+    """
+    Atualiza as linhas do dia e os últimos slots do dia anterior.
+    Deve rodar na transação que regravou o índice do dia (com o dia travado).
+    """
+    contexto = _contexto_restaurante(restaurante_id)
+    if mapa is None or pessoas is None:
+        mapa, pessoas = calcular_dia(restaurante_id, data)
+
+    capacidade = calcular_capacidade(restaurante_id, data, mapa, pessoas, contexto)
+    _gravar(restaurante_id, data, {
+        slot: dict(zip(CAMPOS_CAPACIDADE, valores)) for slot, valores in capacidade.items()
+    })
+
+    # Reservas no começo do dia afetam reservas que começariam no fim do dia anterior
+    mesas, slots_reserva = contexto
+    anterior = data - timedelta(days=1)
+    slots_anterior = range(SLOTS_POR_DIA - slots_reserva + 1, SLOTS_POR_DIA)
+    if not slots_anterior:
+        return
+
+    if CapacidadeSlot.objects.filter(restaurante_id=restaurante_id, data=anterior).exists():
+        livres = _livres_por_slot(mesas, slots_reserva, _mapa_do_dia(restaurante_id, anterior), mapa, slots_anterior)
+        _gravar(restaurante_id, anterior, {slot: {'mesas_livres': valor} for slot, valor in livres.items()})
+    elif any(bits & ((1 << (slots_reserva - 1)) - 1) for bits in mapa.values()):
+        # Sem linhas, o dia anterior seria lido como todo livre; materializá-lo
+        mapa_anterior, pessoas_anterior = calcular_dia(restaurante_id, anterior)
+        capacidade = calcular_capacidade(restaurante_id, anterior, mapa_anterior, pessoas_anterior, contexto, mapa)
+        _gravar(restaurante_id, anterior, {
+            slot: dict(zip(CAMPOS_CAPACIDADE, valores)) for slot, valores in capacidade.items()
+        })
+
+
+def atualizar_capacidade_restaurante(restaurante_id, desde=None):
+    """
+    Recalcula as linhas dos dias já materializados do restaurante a partir de
+    `desde` (hoje, por padrão). Usado quando mudam as mesas ou a duração de reserva.
+    """
+    desde = desde or timezone.localdate()
+    datas = CapacidadeSlot.objects.filter(
+        restaurante_id=restaurante_id,
+        data__gte=desde
+    ).values_list('data', flat=True).distinct()
+    for data in sorted(set(datas)):
+        atualizar_capacidade(restaurante_id, data)
+
+
+def mesas_livres_por_slot(restaurante_id, data):
+    """
+    Retorna {slot: mesas_livres} do dia lendo a tabela (uma consulta), construindo
+    o índice e as linhas do dia se ainda não existirem. Bloqueios já expirados
+    no dia (ou no seguinte, que afeta os últimos slots) são liberados antes.
+    """
+    from .ocupacao import atualizar_ocupacao, liberar_bloqueios_vencidos
+
+    liberar_bloqueios_vencidos(int(restaurante_id), [data, data + timedelta(days=1)])
+    livres = dict(
+        CapacidadeSlot.objects.filter(restaurante_id=restaurante_id, data=data).values_list('slot', 'mesas_livres')
+    )
+    if len(livres) < SLOTS_POR_DIA:
+        # Recalcula índice e linhas sob a trava do dia
+        atualizar_ocupacao(restaurante_id, data)
+        livres = dict(
+            CapacidadeSlot.objects.filter(restaurante_id=restaurante_id, data=data).values_list('slot', 'mesas_livres')
+        )
+    return livres
+
+
+def dias_materializaveis(restaurante_id=None, desde=None, ate=None):
+    """
+    Retorna {(restaurante_id, data)} dos dias do período que têm reservas ativas
+    ou linhas gravadas (os dias que a reconstrução e a verificação percorrem).
+    """
+    from .models import Reserva, dias_do_intervalo
+    from .ocupacao import inicio_do_dia
+
+    desde = desde or timezone.localdate()
+    reservas = Reserva.objects.filter(
+        status__in=Reserva.STATUS_ATIVOS,
+        fim__gt=inicio_do_dia(desde)
+    )
+    capacidades = CapacidadeSlot.objects.filter(data__gte=desde)
+    if ate is not None:
+        reservas = reservas.filter(inicio__lt=inicio_do_dia(ate + timedelta(days=1)))
+        capacidades = capacidades.filter(data__lte=ate)
+    if restaurante_id is not None:
+        reservas = reservas.filter(restaurante_id=restaurante_id)
+        capacidades = capacidades.filter(restaurante_id=restaurante_id)
+
+    dias = set(capacidades.values_list('restaurante_id', 'data').distinct())
+    for reserva_restaurante, inicio, fim in reservas.values_list('restaurante_id', 'inicio', 'fim'):
+        dias.update(
+            (reserva_restaurante, dia) for dia in dias_do_intervalo(inicio, fim)
+            if dia >= desde and (ate is None or dia <= ate)
+        )
+    return dias
+
+
+def verificar_capacidade(restaurante_id, data):
+    """
+    Compara as linhas gravadas do dia com o recalculado a partir das reservas e
+    mesas. Retorna a lista de (slot, gravado, esperado) divergentes; slots sem
+    linha aparecem com gravado None.
+    """
+    gravadas = {
+        slot: valores
+        for slot, *valores in CapacidadeSlot.objects.filter(
+            restaurante_id=restaurante_id,
+            data=data
+        ).values_list('slot', *CAMPOS_CAPACIDADE)
+    }
+    mapa_seguinte = calcular_dia(restaurante_id, data + timedelta(days=1))[0]
+    esperadas = calcular_capacidade(restaurante_id, data, mapa_seguinte=mapa_seguinte)
+
+    divergencias = []
+    for slot, esperado in esperadas.items():
+        gravado = gravadas.get(slot)
+        if gravado is None or tuple(gravado) != esperado:
+            divergencias.append((slot, tuple(gravado) if gravado else None, esperado))
+    return divergencias
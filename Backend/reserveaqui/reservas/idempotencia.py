@@ -0,0 +1,163 @@
+"""
+Idempotência das requisições de escrita (cabeçalho Idempotency-Key).
+
+Clientes em redes instáveis repetem POSTs. Com o cabeçalho, a primeira
+requisição registra a chave do usuário (ChaveIdempotencia) antes de executar e
+grava a resposta ao terminar; as repetições dentro da validade
+(settings.RESERVAS_TTL_IDEMPOTENCIA, em segundos) recebem a resposta gravada sem
+passar de novo pela busca de mesas ou pela transição.
+
+- Mesma chave com outro corpo ou endpoint: 422.
+- Mesma chave enquanto a primeira ainda executa: 409 (o cliente tenta depois).
+  A execução tem um prazo curto (settings.RESERVAS_PRAZO_IDEMPOTENCIA, em
+  segundos), separado da validade da resposta: se o processo morrer no meio da
+  requisição, a chave vence e a repetição seguinte a assume e executa.
+- Erros da API (ValidationError, PermissionDenied etc.) viram a resposta 4xx
+  gravada, como as demais respostas; repetições recebem o mesmo erro.
+- Respostas 5xx e exceções inesperadas liberam a chave, para que a repetição
+  execute.
+
+Chaves expiradas são substituídas no reuso e apagadas pelo comando
+`limpar_chaves_idempotencia`.
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .models import ChaveIdempotencia
+
+
+CABECALHO_IDEMPOTENCIA = 'HTTP_IDEMPOTENCY_KEY'
+CABECALHO_REPETICAO = 'Idempotent-Replayed'
+TTL_IDEMPOTENCIA_PADRAO = 86400
+PRAZO_IDEMPOTENCIA_PADRAO = 60
+TAMANHO_MAXIMO_CHAVE = 255
+
+
+def ttl_idempotencia():
+    """Validade de uma resposta gravada"""
+    return timedelta(seconds=getattr(settings, 'RESERVAS_TTL_IDEMPOTENCIA', TTL_IDEMPOTENCIA_PADRAO))
+
+
+def prazo_em_andamento():
+    """Prazo de uma chave ainda sem resposta, depois do qual outra requisição a assume"""
+    return timedelta(seconds=getattr(settings, 'RESERVAS_PRAZO_IDEMPOTENCIA', PRAZO_IDEMPOTENCIA_PADRAO))
+
+
+def impressao_requisicao(request):
+    """SHA-256 do método, caminho e corpo da requisição"""
+    corpo = json.dumps(request.data, sort_keys=True, default=str)
+    conteudo = f'{request.method} {request.path}\n{corpo}'
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+
+def _resposta_erro(mensagem, codigo):
+    return Response({'error': mensagem}, status=codigo)
+
+
+def registrar_chave(usuario, chave, impressao):
+    """
+    Registra a chave antes da execução. Retorna (registro, None) quando a
+    requisição deve executar, ou (None, resposta) com a resposta a devolver.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                registro = ChaveIdempotencia.objects.create(
+                    usuario=usuario,
+                    chave=chave,
+                    impressao=impressao,
+                    expira_em=timezone.now() + prazo_em_andamento()
+                )
+            return registro, None
+        except IntegrityError:
+            existente = ChaveIdempotencia.objects.filter(usuario=usuario, chave=chave).first()
+
+        if existente is None:
+            continue
+        if existente.expirada():
+            # Resposta vencida ou execução interrompida: libera para o novo uso
+            ChaveIdempotencia.objects.filter(pk=existente.pk, expira_em=existente.expira_em).delete()
+            continue
+        if existente.impressao != impressao:
+            return None, _resposta_erro(
+                'Esta Idempotency-Key já foi usada em outra requisição.',
+                status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if not existente.concluida():
+            return None, _resposta_erro(
+                'Uma requisição com esta Idempotency-Key ainda está em andamento.',
+                status.HTTP_409_CONFLICT
+            )
+        return None, Response(
+            existente.resposta,
+            status=existente.status_code,
+            headers={CABECALHO_REPETICAO: 'true'}
+        )
+
+    return None, _resposta_erro(
+        'Não foi possível registrar a Idempotency-Key. Tente novamente.',
+        status.HTTP_409_CONFLICT
+    )
+
+
+def concluir_chave(registro, response):
+    """Grava a resposta da primeira requisição (ou libera a chave em caso de erro do servidor)"""
+    if response.status_code >= 500:
+        registro.delete()
+        return
+    # Se o prazo venceu e outra requisição assumiu a chave, o registro não existe mais
+    ChaveIdempotencia.objects.filter(pk=registro.pk).update(
+        status_code=response.status_code,
+        resposta=response.data,
+        expira_em=timezone.now() + ttl_idempotencia()
+    )
+
+
+def idempotente(metodo):
+    """
+    Decorator para ações de ViewSet: aplica o cabeçalho Idempotency-Key, quando
+    presente, à execução do método.
+    """
+    @wraps(metodo)
+    def executar(self, request, *args, **kwargs):
+        chave = request.META.get(CABECALHO_IDEMPOTENCIA)
+        if not chave:
+            return metodo(self, request, *args, **kwargs)
+        if len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return _resposta_erro(
+                f'Idempotency-Key deve ter no máximo {TAMANHO_MAXIMO_CHAVE} caracteres.',
+                status.HTTP_400_BAD_REQUEST
+            )
+
+        registro, resposta = registrar_chave(request.user, chave, impressao_requisicao(request))
+        if resposta is not None:
+            return resposta
+
+        try:
+            try:
+                response = metodo(self, request, *args, **kwargs)
+            except APIException as exc:
+                # Resposta de erro do DRF (pelo exception handler configurado)
+                response = self.handle_exception(exc)
+        except Exception:
+            registro.delete()
+            raise
+        concluir_chave(registro, response)
+        return response
+
+    return executar
+
+
+def limpar_chaves_expiradas():
+    """Apaga as chaves vencidas; retorna a quantidade"""
+    return ChaveIdempotencia.objects.filter(expira_em__lte=timezone.now()).delete()[0]
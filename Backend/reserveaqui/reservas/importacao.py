@@ -0,0 +1,200 @@
+"""
+Importação de reservas em lote (canais parceiros e migrações).
+
+As linhas são validadas em lote (uma consulta para todos os restaurantes), e as
+mesas são alocadas em memória por restaurante, a partir dos índices de ocupação
+dos dias envolvidos, com a mesma estratégia de alocação da criação unitária.
+As reservas e os vínculos são gravados com bulk_create e os índices atualizados
+uma vez por dia, sob a mesma trava usada na criação unitária.
+
+Cada linha tem seu próprio resultado: falhas de validação ou falta de mesas não
+impedem a importação das demais.
+"""
+
+import csv
+import io
+import math
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.parsers import BaseParser
+from rest_framework.exceptions import ParseError
+
+from restaurantes.models import Restaurante
+from usuarios.autorizacao import PROPRIETARIO, carregar_contexto
+from .models import Reserva, ReservaMesa, dias_do_intervalo
+from .alocacao import obter_estrategia
+from .resumo import atualizar_resumos
+from .ocupacao import (
+    _mesas_elegiveis, _mesa_livre, intervalo_da_consulta, mascaras_intervalo,
+    obter_mapas, travar_dias, gravar_mapas
+)
+
+
+# Limite de linhas por requisição
+TAMANHO_MAXIMO_IMPORTACAO = 5000
+
+CAMPOS_IMPORTACAO = [
+    'restaurante', 'data_reserva', 'horario', 'quantidade_pessoas',
+    'nome_cliente', 'telefone_cliente', 'email_cliente', 'observacoes'
+]
+
+
+class CSVParser(BaseParser):
+    """Lê o corpo text/csv como lista de dicionários (cabeçalho na primeira linha)"""
+
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        try:
+            texto = io.StringIO(stream.read().decode(encoding), newline='')
+            return [
+                {campo: valor for campo, valor in linha.items() if campo and valor not in (None, '')}
+                for linha in csv.DictReader(texto)
+            ]
+        except (csv.Error, UnicodeDecodeError) as erro:
+            raise ParseError(f'CSV inválido: {erro}')
+
+
+class ReservaImportacaoSerializer(serializers.ModelSerializer):
+    """
+    Validação de uma linha da importação, sem consultas ao banco
+    (o restaurante é resolvido em lote pelo ImportadorReservas).
+    """
+
+    restaurante = serializers.IntegerField(min_value=1)
+    quantidade_pessoas = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Reserva
+        fields = CAMPOS_IMPORTACAO
+
+    def validate(self, data):
+        """Mesma regra de antecedência da criação unitária"""
+        reserva = Reserva(data_reserva=data['data_reserva'], horario=data['horario'])
+        try:
+            reserva.clean()
+        except DjangoValidationError as erro:
+            raise serializers.ValidationError(erro.messages)
+        return data
+
+
+class ImportadorReservas:
+    """Importa uma lista de linhas (dicionários) para o usuário que faz a requisição"""
+
+    def __init__(self, usuario, contexto=None):
+        self.usuario = usuario
+        self.contexto = contexto or carregar_contexto(usuario)
+        self.estrategia = obter_estrategia()
+
+    def importar(self, linhas):
+        """Retorna uma lista de resultados, um por linha, na ordem recebida"""
+        resultados = [None] * len(linhas)
+        validas = []
+
+        for indice, linha in enumerate(linhas):
+            serializer = ReservaImportacaoSerializer(data=linha)
+            if serializer.is_valid():
+                validas.append((indice, serializer.validated_data))
+            else:
+                resultados[indice] = self._falha(indice, serializer.errors)
+
+        restaurantes = Restaurante.objects.in_bulk({dados['restaurante'] for _, dados in validas})
+        permitidos = self._restaurantes_permitidos(restaurantes)
+
+        por_restaurante = defaultdict(list)
+        for indice, dados in validas:
+            restaurante = restaurantes.get(dados['restaurante'])
+            if restaurante is None:
+                resultados[indice] = self._falha(indice, {'restaurante': ['Restaurante não encontrado.']})
+            elif not restaurante.ativo:
+                resultados[indice] = self._falha(
+                    indice, {'restaurante': ['Este restaurante não está disponível para reservas.']}
+                )
+            elif restaurante.id not in permitidos:
+                resultados[indice] = self._falha(
+                    indice, {'restaurante': ['Sem permissão para importar reservas neste restaurante.']}
+                )
+            else:
+                por_restaurante[restaurante].append((indice, dados))
+
+        for restaurante, linhas_restaurante in por_restaurante.items():
+            for indice, resultado in self._importar_restaurante(restaurante, linhas_restaurante):
+                resultados[indice] = resultado
+
+        return resultados
+
+    def _restaurantes_permitidos(self, restaurantes):
+        """IDs (entre os pedidos) dos restaurantes em que o usuário pode importar reservas"""
+        if self.contexto.is_admin_sistema:
+            return set(restaurantes)
+        return {
+            restaurante_id for restaurante_id in restaurantes
+            if self.contexto.papel_no_restaurante(restaurante_id) in (PROPRIETARIO, 'admin_secundario')
+        }
+
+    def _importar_restaurante(self, restaurante, linhas):
+        """Aloca e grava as linhas de um restaurante em uma transação"""
+        duracao = restaurante.duracao_reserva
+        intervalos = [
+            intervalo_da_consulta(dados['data_reserva'], dados['horario'], duracao)
+            for _, dados in linhas
+        ]
+        dias = {dia for inicio, fim in intervalos for dia in dias_do_intervalo(inicio, fim)}
+
+        resultados = []
+        alocadas = []
+        with transaction.atomic():
+            travar_dias(restaurante.id, dias)
+            mesas = _mesas_elegiveis(restaurante.id)
+            mapas = obter_mapas(restaurante.id, sorted(dias))
+
+            for (indice, dados), (inicio, fim) in zip(linhas, intervalos):
+                mascaras = mascaras_intervalo(inicio, fim)
+                livres = [mesa for mesa in mesas if _mesa_livre(mapas, mesa.id, mascaras)]
+                necessarias = math.ceil(dados['quantidade_pessoas'] / 4)
+
+                if len(livres) < necessarias:
+                    resultados.append((indice, self._falha(indice, {'non_field_errors': [
+                        f'Não há mesas suficientes disponíveis. '
+                        f'Necessárias: {necessarias}, Disponíveis: {len(livres)}'
+                    ]})))
+                    continue
+
+                escolhidas = self.estrategia.escolher(livres, necessarias, mapas, mascaras)
+                for mesa in escolhidas:
+                    for dia, mascara in mascaras.items():
+                        mapas[dia][mesa.id] = mapas[dia].get(mesa.id, 0) | mascara
+
+                campos = {campo: valor for campo, valor in dados.items() if campo != 'restaurante'}
+                reserva = Reserva(restaurante=restaurante, inicio=inicio, fim=fim, **campos)
+                alocadas.append((indice, reserva, escolhidas))
+
+            if alocadas:
+                Reserva.objects.bulk_create([reserva for _, reserva, _ in alocadas], batch_size=500)
+                ReservaMesa.objects.bulk_create(
+                    [
+                        ReservaMesa(reserva=reserva, mesa=mesa)
+                        for _, reserva, escolhidas in alocadas
+                        for mesa in escolhidas
+                    ],
+                    batch_size=500
+                )
+                gravar_mapas(restaurante.id, mapas)
+                atualizar_resumos(adicionadas=[reserva.linha_resumo() for _, reserva, _ in alocadas])
+
+        for indice, reserva, escolhidas in alocadas:
+            resultados.append((indice, {
+                'linha': indice + 1,
+                'sucesso': True,
+                'reserva_id': reserva.id,
+                'mesas': [mesa.numero for mesa in escolhidas]
+            }))
+        return resultados
+
+    @staticmethod
+    def _falha(indice, erros):
+        return {'linha': indice + 1, 'sucesso': False, 'erros': erros}
@@ -0,0 +1,214 @@
+"""
+Benchmark de alocação concorrente de mesas.
+
+Cria um restaurante temporário, dispara várias threads criando reservas pelos
+mesmos horários ao mesmo tempo (pelo ReservaCreateUpdateSerializer, o mesmo
+caminho da API) e ao final confere que nenhuma mesa ficou com duas reservas
+ativas sobrepostas e que o índice de ocupação bate com os vínculos gravados.
+
+Com --bloqueio, cada tentativa bloqueia as mesas antes de criar a reserva (o
+fluxo do formulário); as recusadas passam a acontecer no bloqueio, e a criação
+com o token não deve falhar.
+
+Uso:
+    python manage.py benchmark_alocacao --threads 60 --reservas-por-thread 5 [--bloqueio]
+"""
+
+import random
+import threading
+import time as relogio
+import uuid
+from collections import defaultdict
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, DatabaseError
+from django.utils import timezone
+from rest_framework import serializers
+
+from restaurantes.models import Restaurante
+from usuarios.models import Usuario
+from reservas.models import Reserva, ReservaMesa, OcupacaoDiaria
+from reservas.ocupacao import calcular_mapa, _desserializar_mapa
+from reservas.serializers import ReservaCreateUpdateSerializer, BloqueioMesaCreateSerializer
+
+
+class Command(BaseCommand):
+    help = 'Mede a alocação concorrente de mesas e verifica que não há mesas alocadas em dobro'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=60, help='Reservas simultâneas (padrão: 60)')
+        parser.add_argument('--reservas-por-thread', type=int, default=5, help='Tentativas por thread (padrão: 5)')
+        parser.add_argument('--mesas', type=int, default=20, help='Mesas do restaurante de teste (padrão: 20)')
+        parser.add_argument('--horarios', type=int, default=4, help='Horários disputados, a cada 30 min (padrão: 4)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório')
+        parser.add_argument('--bloqueio', action='store_true', help='Bloqueia as mesas antes de cada reserva')
+        parser.add_argument('--manter', action='store_true', help='Não remove os dados criados ao final')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['reservas_por_thread'] < 1:
+            raise CommandError('--threads e --reservas-por-thread devem ser maiores que zero.')
+
+        restaurante = self._criar_restaurante(options['mesas'])
+        data = timezone.localdate() + timedelta(days=7)
+        horarios = [
+            (timezone.datetime.combine(data, time(19, 0)) + timedelta(minutes=30 * i)).time()
+            for i in range(options['horarios'])
+        ]
+
+        try:
+            resultado = self._executar(restaurante, data, horarios, options)
+            conflitos = self._verificar_conflitos(restaurante)
+            divergencias = self._verificar_indice(restaurante)
+            self._imprimir(resultado, conflitos, divergencias, options)
+        finally:
+            if not options['manter']:
+                proprietario = restaurante.proprietario
+                restaurante.delete()
+                proprietario.delete()
+
+        if conflitos or divergencias:
+            raise CommandError('Alocação inconsistente: veja os conflitos acima.')
+
+    def _criar_restaurante(self, quantidade_mesas):
+        """Cria o restaurante temporário (as mesas são criadas pelo signal do restaurante)"""
+        sufixo = uuid.uuid4().hex[:8]
+        proprietario = Usuario.objects.create_user(
+            username=f'benchmark-{sufixo}',
+            email=f'benchmark-{sufixo}@reserveaqui.local',
+            password=Usuario.gerar_senha_generica(),
+            nome='Benchmark de Alocação'
+        )
+        return Restaurante.objects.create(
+            nome=f'Benchmark {sufixo}',
+            endereco='Rua do Benchmark, 0',
+            cidade='Benchmark',
+            estado='BM',
+            cep='00000-000',
+            telefone='0000000000',
+            email=f'benchmark-{sufixo}@reserveaqui.local',
+            proprietario=proprietario,
+            quantidade_mesas=quantidade_mesas
+        )
+
+    def _executar(self, restaurante, data, horarios, options):
+        """Dispara as threads ao mesmo tempo e coleta contagens e latências"""
+        total_threads = options['threads']
+        barreira = threading.Barrier(total_threads)
+        trava_resultado = threading.Lock()
+        resultado = {
+            'sucesso': 0, 'recusadas': 0, 'recusadas_criacao': 0, 'erros': 0,
+            'latencias': [], 'mensagens_erro': []
+        }
+
+        def reservar(indice):
+            gerador = random.Random(options['semente'] + indice)
+            contagem = {'sucesso': 0, 'recusadas': 0, 'recusadas_criacao': 0, 'erros': 0}
+            latencias = []
+            erros = []
+            try:
+                barreira.wait()
+                for tentativa in range(options['reservas_por_thread']):
+                    dados = {
+                        'restaurante': restaurante.id,
+                        'data_reserva': data.isoformat(),
+                        'horario': horarios[(indice + tentativa) % len(horarios)].strftime('%H:%M'),
+                        'quantidade_pessoas': gerador.randint(1, 8),
+                        'nome_cliente': f'Cliente {indice}-{tentativa}',
+                        'telefone_cliente': '999999999',
+                    }
+                    comeco = relogio.perf_counter()
+                    etapa = 'recusadas'
+                    try:
+                        if options['bloqueio']:
+                            bloqueio = BloqueioMesaCreateSerializer(data=dados)
+                            bloqueio.is_valid(raise_exception=True)
+                            dados['bloqueio'] = str(bloqueio.save().token)
+                            etapa = 'recusadas_criacao'
+                        serializer = ReservaCreateUpdateSerializer(data=dados)
+                        serializer.is_valid(raise_exception=True)
+                        serializer.save()
+                        contagem['sucesso'] += 1
+                    except serializers.ValidationError:
+                        contagem[etapa] += 1
+                    except DatabaseError as erro:
+                        contagem['erros'] += 1
+                        erros.append(str(erro))
+                    latencias.append(relogio.perf_counter() - comeco)
+            finally:
+                connection.close()
+                with trava_resultado:
+                    for chave, valor in contagem.items():
+                        resultado[chave] += valor
+                    resultado['latencias'].extend(latencias)
+                    resultado['mensagens_erro'].extend(erros)
+
+        threads = [threading.Thread(target=reservar, args=(i,)) for i in range(total_threads)]
+        comeco = relogio.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        resultado['duracao'] = relogio.perf_counter() - comeco
+        return resultado
+
+    def _verificar_conflitos(self, restaurante):
+        """Retorna os pares de reservas ativas sobrepostas na mesma mesa"""
+        intervalos = defaultdict(list)
+        vinculos = ReservaMesa.objects.filter(
+            reserva__restaurante=restaurante,
+            reserva__status__in=Reserva.STATUS_ATIVOS
+        ).values_list('mesa__numero', 'reserva_id', 'reserva__inicio', 'reserva__fim')
+        for mesa, reserva_id, inicio, fim in vinculos:
+            intervalos[mesa].append((inicio, fim, reserva_id))
+
+        conflitos = []
+        for mesa, reservas in intervalos.items():
+            reservas.sort()
+            for anterior, atual in zip(reservas, reservas[1:]):
+                if atual[0] < anterior[1]:
+                    conflitos.append((mesa, anterior[2], atual[2]))
+        return conflitos
+
+    def _verificar_indice(self, restaurante):
+        """Retorna os dias em que o índice de ocupação difere do recalculado a partir dos vínculos"""
+        return [
+            ocupacao.data
+            for ocupacao in OcupacaoDiaria.objects.filter(restaurante=restaurante)
+            if _desserializar_mapa(ocupacao.mapa) != calcular_mapa(restaurante.id, ocupacao.data)
+        ]
+
+    def _imprimir(self, resultado, conflitos, divergencias, options):
+        tentativas = options['threads'] * options['reservas_por_thread']
+        latencias = sorted(resultado['latencias'])
+
+        def percentil(p):
+            if not latencias:
+                return 0
+            return latencias[min(int(len(latencias) * p), len(latencias) - 1)] * 1000
+
+        self.stdout.write(f"Threads: {options['threads']} | Tentativas: {tentativas} | Mesas: {options['mesas']}")
+        self.stdout.write(
+            f"Reservas criadas: {resultado['sucesso']} | Recusadas (sem mesas): {resultado['recusadas']} "
+            f"| Erros de banco: {resultado['erros']}"
+        )
+        if options['bloqueio']:
+            self.stdout.write(f"Recusadas na criação após o bloqueio: {resultado['recusadas_criacao']}")
+        self.stdout.write(
+            f"Tempo total: {resultado['duracao']:.2f}s | Vazão: {tentativas / resultado['duracao']:.1f} tentativas/s "
+            f"| Latência p50: {percentil(0.5):.1f}ms p95: {percentil(0.95):.1f}ms"
+        )
+        for mensagem in sorted(set(resultado['mensagens_erro']))[:5]:
+            self.stdout.write(self.style.WARNING(f'  erro: {mensagem}'))
+
+        if conflitos:
+            for mesa, reserva_a, reserva_b in conflitos:
+                self.stdout.write(self.style.ERROR(
+                    f'Mesa {mesa} alocada em dobro: reservas {reserva_a} e {reserva_b}'
+                ))
+        if divergencias:
+            self.stdout.write(self.style.ERROR(
+                f"Índice de ocupação divergente em: {', '.join(str(d) for d in divergencias)}"
+            ))
+        if not conflitos and not divergencias:
+            self.stdout.write(self.style.SUCCESS('Nenhuma mesa alocada em dobro.'))
@@ -0,0 +1,190 @@
+"""
+Benchmark de estratégias de alocação por replay de um dia de reservas.
+
+Reaplica a mesma sequência de pedidos (na ordem em que chegaram) com cada
+estratégia de reservas/alocacao.py, em memória e sem gravar nada no banco, e
+compara reservas aceitas, lugares vendidos e a latência da escolha de mesas.
+
+Fontes do dia:
+    --restaurante ID --data AAAA-MM-DD   reservas gravadas no banco (por data de criação)
+    --arquivo pedidos.csv|pedidos.json   linhas com horario (HH:MM) e quantidade_pessoas
+    (nenhuma)                            dia sintético gerado a partir de --semente
+"""
+
+import csv
+import json
+import math
+import random
+import time as relogio
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from mesas.models import Mesa
+from restaurantes.models import Restaurante
+from reservas.models import Reserva
+from reservas.alocacao import ESTRATEGIAS, obter_estrategia
+from reservas.ocupacao import mascaras_intervalo, intervalo_da_consulta
+
+
+MesaSimulada = namedtuple('MesaSimulada', ['id', 'numero'])
+Pedido = namedtuple('Pedido', ['horario', 'quantidade_pessoas'])
+
+
+class Command(BaseCommand):
+    help = 'Compara as estratégias de alocação de mesas reaplicando um dia de reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurante', type=int, help='ID do restaurante para reaplicar um dia gravado')
+        parser.add_argument('--data', help='Data gravada a reaplicar (AAAA-MM-DD)')
+        parser.add_argument('--arquivo', help='CSV ou JSON com horario e quantidade_pessoas por pedido')
+        parser.add_argument('--mesas', type=int, default=20, help='Mesas do salão (arquivo/sintético, padrão: 20)')
+        parser.add_argument('--duracao', type=int, default=90, help='Duração da reserva em minutos (arquivo/sintético, padrão: 90)')
+        parser.add_argument('--pedidos', type=int, default=400, help='Pedidos do dia sintético (padrão: 400)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do dia sintético')
+        parser.add_argument(
+            '--estrategias',
+            default=','.join(ESTRATEGIAS),
+            help='Estratégias separadas por vírgula (padrão: todas)'
+        )
+
+    def handle(self, *args, **options):
+        data, mesas, duracao, pedidos = self._carregar_dia(options)
+        if not pedidos:
+            raise CommandError('Nenhum pedido para reaplicar.')
+
+        self.stdout.write(
+            f'Pedidos: {len(pedidos)} | Mesas: {len(mesas)} | '
+            f'Duração: {int(duracao.total_seconds() // 60)} min | '
+            f'Lugares pedidos: {sum(p.quantidade_pessoas for p in pedidos)}'
+        )
+        self.stdout.write(
+            f"{'estratégia':<18}{'aceitas':>9}{'recusadas':>11}{'lugares':>9}"
+            f"{'média (µs)':>12}{'p95 (µs)':>10}"
+        )
+
+        for nome in [n.strip() for n in options['estrategias'].split(',') if n.strip()]:
+            try:
+                estrategia = obter_estrategia(nome)
+            except (ValueError, ImportError) as erro:
+                raise CommandError(str(erro))
+            aceitas, lugares, latencias = self._reaplicar(estrategia, data, mesas, duracao, pedidos)
+            latencias.sort()
+            media = sum(latencias) / len(latencias) * 1e6 if latencias else 0
+            p95 = latencias[min(int(len(latencias) * 0.95), len(latencias) - 1)] * 1e6 if latencias else 0
+            self.stdout.write(
+                f'{nome:<18}{aceitas:>9}{len(pedidos) - aceitas:>11}{lugares:>9}{media:>12.1f}{p95:>10.1f}'
+            )
+
+    def _carregar_dia(self, options):
+        """Retorna (data, mesas, duração, pedidos em ordem de chegada) da fonte escolhida"""
+        if options['restaurante']:
+            if not options['data']:
+                raise CommandError('--data é obrigatório com --restaurante.')
+            return self._dia_gravado(options['restaurante'], options['data'])
+
+        if options['mesas'] < 1 or options['duracao'] < 15:
+            raise CommandError('--mesas deve ser positivo e --duracao de pelo menos 15 minutos.')
+
+        data = timezone.localdate()
+        mesas = [MesaSimulada(numero, numero) for numero in range(1, options['mesas'] + 1)]
+        duracao = timedelta(minutes=options['duracao'])
+        if options['arquivo']:
+            pedidos = self._ler_arquivo(options['arquivo'])
+        else:
+            pedidos = self._dia_sintetico(options['pedidos'], options['semente'])
+        return data, mesas, duracao, pedidos
+
+    def _dia_gravado(self, restaurante_id, data_str):
+        try:
+            data = datetime.strptime(data_str, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Formato de data inválido. Use AAAA-MM-DD.')
+        try:
+            restaurante = Restaurante.objects.get(pk=restaurante_id)
+        except Restaurante.DoesNotExist:
+            raise CommandError(f'Restaurante {restaurante_id} não encontrado.')
+
+        mesas = [
+            MesaSimulada(mesa_id, numero)
+            for mesa_id, numero in Mesa.objects.filter(
+                restaurante=restaurante, ativa=True
+            ).order_by('numero').values_list('id', 'numero')
+        ]
+        pedidos = [
+            Pedido(horario, quantidade)
+            for horario, quantidade in Reserva.objects.filter(
+                restaurante=restaurante, data_reserva=data
+            ).order_by('data_criacao', 'id').values_list('horario', 'quantidade_pessoas')
+        ]
+        return data, mesas, restaurante.duracao_reserva, pedidos
+
+    def _ler_arquivo(self, caminho):
+        caminho = Path(caminho)
+        if not caminho.exists():
+            raise CommandError(f'Arquivo não encontrado: {caminho}')
+
+        with caminho.open(encoding='utf-8') as arquivo:
+            if caminho.suffix.lower() == '.json':
+                linhas = json.load(arquivo)
+            else:
+                linhas = list(csv.DictReader(arquivo))
+
+        try:
+            return [
+                Pedido(
+                    datetime.strptime(str(linha['horario'])[:5], '%H:%M').time(),
+                    int(linha['quantidade_pessoas'])
+                )
+                for linha in linhas
+            ]
+        except (KeyError, ValueError, TypeError) as erro:
+            raise CommandError(f'Linha inválida no arquivo: {erro}')
+
+    def _dia_sintetico(self, quantidade, semente):
+        """Pedidos das 11:00 às 22:00 com picos no almoço e no jantar, em ordem aleatória de chegada"""
+        gerador = random.Random(semente)
+        horarios = [time(hora, minuto) for hora in range(11, 23) for minuto in (0, 15, 30, 45)]
+        pesos = [3 if h.hour in (12, 13, 19, 20, 21) else 1 for h in horarios]
+        tamanhos, pesos_tamanho = [1, 2, 3, 4, 5, 6, 8, 10, 12], [3, 10, 4, 6, 2, 3, 2, 1, 1]
+        return [
+            Pedido(
+                gerador.choices(horarios, pesos)[0],
+                gerador.choices(tamanhos, pesos_tamanho)[0]
+            )
+            for _ in range(quantidade)
+        ]
+
+    def _reaplicar(self, estrategia, data, mesas, duracao, pedidos):
+        """Reaplica os pedidos em memória; retorna (aceitas, lugares vendidos, latências)"""
+        mapas = {}
+        aceitas = lugares = 0
+        latencias = []
+
+        for pedido in pedidos:
+            comeco = relogio.perf_counter()
+            mascaras = mascaras_intervalo(*intervalo_da_consulta(data, pedido.horario, duracao))
+            for dia in mascaras:
+                mapas.setdefault(dia, {})
+            livres = [
+                mesa for mesa in mesas
+                if not any(mapas[dia].get(mesa.id, 0) & mascara for dia, mascara in mascaras.items())
+            ]
+            necessarias = math.ceil(pedido.quantidade_pessoas / 4)
+            escolhidas = None
+            if len(livres) >= necessarias:
+                escolhidas = estrategia.escolher(livres, necessarias, mapas, mascaras)
+            latencias.append(relogio.perf_counter() - comeco)
+
+            if escolhidas is None:
+                continue
+            for mesa in escolhidas:
+                for dia, mascara in mascaras.items():
+                    mapas[dia][mesa.id] = mapas[dia].get(mesa.id, 0) | mascara
+            aceitas += 1
+            lugares += pedido.quantidade_pessoas
+
+        return aceitas, lugares, latencias
@@ -0,0 +1,144 @@
+"""
+Benchmark dos relatórios de reservas.
+
+Cria restaurantes temporários com reservas em todos os dias do maior período
+(gravadas com bulk_create, sem passar pelo índice de ocupação) e gera cada
+relatório para períodos crescentes, informando a latência e o número de
+consultas. Com consultas agrupadas sobre o período inteiro, o número de
+consultas não deve crescer com o período. Com --resumo, o resumo diário dos dias
+do período é reconstruído antes e os relatórios leem dele.
+
+Uso:
+    python manage.py benchmark_relatorios [--restaurantes 20] [--periodos 7,30,90] [--relatorio ocupacao] [--resumo]
+"""
+
+import random
+import time as relogio
+import uuid
+from datetime import time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mesas.models import Mesa
+from restaurantes.models import Restaurante
+from usuarios.models import Usuario
+from reservas.models import Reserva, ReservaMesa
+from reservas.reports import RelatorioHelper
+from reservas.resumo import dias_do_periodo, reconstruir_particao
+
+
+RELATORIOS = {
+    'ocupacao': lambda inicio, fim: RelatorioHelper.gerar_relatorio_ocupacao(data_inicio=inicio, data_fim=fim),
+    'horarios_movimentados': lambda inicio, fim: RelatorioHelper.gerar_relatorio_horarios_movimentados(
+        data_inicio=inicio, data_fim=fim
+    ),
+    'estatisticas_periodo': lambda inicio, fim: RelatorioHelper.gerar_relatorio_estatisticas_periodo(
+        data_inicio=inicio, data_fim=fim, tipo_periodo='semana'
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = 'Mede a latência e as consultas dos relatórios para períodos crescentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurantes', type=int, default=20, help='Restaurantes temporários (padrão: 20)')
+        parser.add_argument('--mesas', type=int, default=10, help='Mesas por restaurante (padrão: 10)')
+        parser.add_argument('--reservas-por-dia', type=int, default=8, help='Reservas por restaurante e dia (padrão: 8)')
+        parser.add_argument('--periodos', default='7,30,90', help='Períodos em dias, separados por vírgula')
+        parser.add_argument('--relatorio', choices=sorted(RELATORIOS), action='append', help='Relatórios medidos (padrão: todos)')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Execuções por medição; vale a menor (padrão: 3)')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatório')
+        parser.add_argument('--resumo', action='store_true', help='Reconstrói o resumo diário antes de medir')
+
+    def handle(self, *args, **options):
+        try:
+            periodos = sorted({int(periodo) for periodo in options['periodos'].split(',')})
+        except ValueError:
+            raise CommandError('--periodos deve ser uma lista de inteiros separados por vírgula.')
+        if not periodos or periodos[0] < 1 or options['restaurantes'] < 1 or options['repeticoes'] < 1:
+            raise CommandError('--periodos, --restaurantes e --repeticoes devem ser positivos.')
+
+        inicio = timezone.localdate() + timedelta(days=1)
+        proprietario, restaurantes = self._criar_dados(inicio, periodos[-1], options)
+        try:
+            if options['resumo']:
+                for data in dias_do_periodo(inicio, inicio + timedelta(days=periodos[-1] - 1)):
+                    reconstruir_particao(data)
+            for nome in options['relatorio'] or sorted(RELATORIOS):
+                for dias in periodos:
+                    fim = inicio + timedelta(days=dias - 1)
+                    linhas, consultas, duracao = self._medir(RELATORIOS[nome], inicio, fim, options['repeticoes'])
+                    self.stdout.write(
+                        f'{nome} {dias:>4} dia(s): {duracao * 1000:8.1f}ms | {consultas} consulta(s) | {linhas} linha(s)'
+                    )
+        finally:
+            for restaurante in restaurantes:
+                restaurante.delete()
+            proprietario.delete()
+
+    def _criar_dados(self, inicio, dias, options):
+        """Cria os restaurantes (mesas pelo signal) e as reservas de todos os dias do período"""
+        gerador = random.Random(options['semente'])
+        sufixo = uuid.uuid4().hex[:8]
+        proprietario = Usuario.objects.create_user(
+            username=f'benchmark-{sufixo}',
+            email=f'benchmark-{sufixo}@reserveaqui.local',
+            password=Usuario.gerar_senha_generica(),
+            nome='Benchmark de Relatórios'
+        )
+        restaurantes = [
+            Restaurante.objects.create(
+                nome=f'Benchmark {sufixo} {indice}',
+                endereco='Rua do Benchmark, 0',
+                cidade='Benchmark',
+                estado='BM',
+                cep='00000-000',
+                telefone='0000000000',
+                email=f'benchmark-{sufixo}-{indice}@reserveaqui.local',
+                proprietario=proprietario,
+                quantidade_mesas=options['mesas']
+            )
+            for indice in range(options['restaurantes'])
+        ]
+        mesas = {}
+        for mesa_id, restaurante_id in Mesa.objects.filter(restaurante__in=restaurantes).values_list('id', 'restaurante_id'):
+            mesas.setdefault(restaurante_id, []).append(mesa_id)
+
+        horarios = [time(hora, minuto) for hora in range(11, 23) for minuto in (0, 30)]
+        reservas = []
+        for restaurante in restaurantes:
+            for dia in range(dias):
+                for _ in range(options['reservas_por_dia']):
+                    reserva = Reserva(
+                        restaurante=restaurante,
+                        data_reserva=inicio + timedelta(days=dia),
+                        horario=gerador.choice(horarios),
+                        quantidade_pessoas=gerador.randint(1, 8),
+                        nome_cliente='Cliente Benchmark',
+                        telefone_cliente='0000000000',
+                        status=gerador.choice(['pendente', 'confirmada', 'confirmada', 'cancelada'])
+                    )
+                    reserva.definir_intervalo()
+                    reservas.append(reserva)
+        reservas = Reserva.objects.bulk_create(reservas, batch_size=1000)
+        ReservaMesa.objects.bulk_create(
+            [ReservaMesa(reserva=reserva, mesa_id=gerador.choice(mesas[reserva.restaurante_id])) for reserva in reservas],
+            batch_size=1000
+        )
+        self.stdout.write(f'{len(restaurantes)} restaurante(s), {len(reservas)} reserva(s) em {dias} dia(s).')
+        return proprietario, restaurantes
+
+    def _medir(self, relatorio, inicio, fim, repeticoes):
+        """Retorna (linhas, consultas, menor duração) das execuções do relatório"""
+        melhor = None
+        for _ in range(repeticoes):
+            with CaptureQueriesContext(connection) as consultas:
+                comeco = relogio.perf_counter()
+                linhas = len(relatorio(inicio, fim))
+                duracao = relogio.perf_counter() - comeco
+            melhor = duracao if melhor is None else min(melhor, duracao)
+        return linhas, len(consultas), melhor
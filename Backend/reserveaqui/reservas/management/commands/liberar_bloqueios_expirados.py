@@ -0,0 +1,25 @@
+"""
+Libera os bloqueios de mesas expirados.
+
+Os bloqueios vencidos já deixam de ocupar mesas quando o dia é lido, mas
+apagá-los periodicamente mantém o índice e a capacidade por slot em dia para as
+leituras que não passam pelo índice (busca e grade de disponibilidade).
+
+Uso (ex: a cada minuto pelo cron):
+    python manage.py liberar_bloqueios_expirados [--restaurante ID]
+"""
+
+from django.core.management.base import BaseCommand
+
+from reservas.bloqueios import liberar_bloqueios_expirados
+
+
+class Command(BaseCommand):
+    help = 'Apaga os bloqueios de mesas expirados e devolve as mesas ao índice de ocupação'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurante', type=int, help='ID do restaurante (padrão: todos)')
+
+    def handle(self, *args, **options):
+        quantidade = liberar_bloqueios_expirados(options['restaurante'])
+        self.stdout.write(self.style.SUCCESS(f'{quantidade} bloqueio(s) expirado(s) liberado(s).'))
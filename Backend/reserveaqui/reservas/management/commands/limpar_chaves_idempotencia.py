@@ -0,0 +1,21 @@
+"""
+Apaga as chaves de idempotência vencidas.
+
+Chaves vencidas já são ignoradas (e substituídas) quando reutilizadas; o comando
+só evita que a tabela cresça indefinidamente.
+
+Uso (ex: uma vez por hora pelo cron):
+    python manage.py limpar_chaves_idempotencia
+"""
+
+from django.core.management.base import BaseCommand
+
+from reservas.idempotencia import limpar_chaves_expiradas
+
+
+class Command(BaseCommand):
+    help = 'Apaga as chaves de idempotência (Idempotency-Key) vencidas'
+
+    def handle(self, *args, **options):
+        quantidade = limpar_chaves_expiradas()
+        self.stdout.write(self.style.SUCCESS(f'{quantidade} chave(s) de idempotência apagada(s).'))
@@ -0,0 +1,103 @@
+"""
+Encerra as reservas que já passaram.
+
+- confirmada -> concluida (concluir)
+- pendente -> cancelada (expirar: o horário passou sem confirmação)
+
+Seleciona as reservas cujo fim é anterior a agora menos --margem, em lotes
+percorridos pelo índice (status, fim) com cursor de posição (fim, id), e aplica
+cada lote com o mesmo UPDATE condicional das ações em lote da API. Reservas
+processadas deixam o filtro, então o comando pode ser interrompido e executado
+de novo a qualquer momento: ele continua de onde parou. --pausa espaça os lotes
+para não disputar o banco com a API; --limite encerra a execução após N
+reservas (ex: fatias de um cron).
+
+Uso (ex: a cada hora pelo cron):
+    python manage.py processar_reservas_passadas [--margem 60] [--lote 500] [--pausa 0.2] [--limite N]
+"""
+
+import time as relogio
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from reservas.models import Reserva
+from reservas.transicoes import aplicar_transicao_em_lote
+
+
+# Ação aplicada a cada status de origem
+ACOES_RESERVAS_PASSADAS = [('confirmada', 'concluir'), ('pendente', 'expirar')]
+
+
+class Command(BaseCommand):
+    help = 'Conclui as reservas confirmadas e expira as pendentes que já passaram, em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--margem', type=int, default=60, help='Minutos após o fim da reserva (padrão: 60)')
+        parser.add_argument('--lote', type=int, default=500, help='Reservas por UPDATE (padrão: 500)')
+        parser.add_argument('--pausa', type=float, default=0.2, help='Segundos entre lotes (padrão: 0.2)')
+        parser.add_argument('--limite', type=int, help='Máximo de reservas nesta execução (padrão: sem limite)')
+
+    def handle(self, *args, **options):
+        if options['margem'] < 0 or options['lote'] < 1 or options['pausa'] < 0:
+            raise CommandError('--margem e --pausa não podem ser negativos e --lote deve ser positivo.')
+        if options['limite'] is not None and options['limite'] < 1:
+            raise CommandError('--limite deve ser positivo.')
+
+        corte = timezone.now() - timedelta(minutes=options['margem'])
+        restantes = options['limite']
+        total = 0
+        comeco = relogio.perf_counter()
+
+        for status_origem, acao in ACOES_RESERVAS_PASSADAS:
+            processadas = self._processar(status_origem, acao, corte, options, restantes)
+            total += processadas
+            if restantes is not None:
+                restantes -= processadas
+                if restantes <= 0:
+                    break
+
+        duracao = relogio.perf_counter() - comeco
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} reserva(s) processada(s) em {duracao:.1f}s '
+            f'({total / duracao if duracao else 0:.0f} reservas/s).'
+        ))
+
+    def _processar(self, status_origem, acao, corte, options, limite):
+        """Percorre as reservas do status em lotes; retorna quantas mudaram de status"""
+        hoje = timezone.localdate()
+        processadas = 0
+        cursor = None
+
+        while limite is None or processadas < limite:
+            tamanho = options['lote'] if limite is None else min(options['lote'], limite - processadas)
+            reservas = Reserva.objects.filter(status=status_origem, fim__lte=corte)
+            if cursor is not None:
+                reservas = reservas.filter(Q(fim__gt=cursor[0]) | Q(fim=cursor[0], id__gt=cursor[1]))
+            pagina = list(reservas.order_by('fim', 'id').values_list('fim', 'id')[:tamanho])
+            if not pagina:
+                break
+
+            comeco = relogio.perf_counter()
+            atualizadas, _ = aplicar_transicao_em_lote(
+                [reserva_id for _, reserva_id in pagina],
+                acao,
+                recalcular_desde=hoje
+            )
+            duracao = relogio.perf_counter() - comeco
+
+            processadas += len(atualizadas)
+            cursor = pagina[-1]
+            self.stdout.write(
+                f'{acao}: {len(atualizadas)}/{len(pagina)} até {timezone.localtime(cursor[0]):%Y-%m-%d %H:%M} '
+                f'(id {cursor[1]}) - {len(pagina) / duracao if duracao else 0:.0f} linhas/s'
+            )
+
+            if len(pagina) < tamanho:
+                break
+            if options['pausa']:
+                relogio.sleep(options['pausa'])
+
+        return processadas
@@ -0,0 +1,53 @@
+"""
+Reconstrói o índice de ocupação e a tabela de capacidade por slot.
+
+Percorre os dias do período com reservas ativas ou linhas já gravadas e
+recalcula cada um sob a trava do dia (a mesma das escritas da API). Deve ser
+executado depois de migrar para a tabela de capacidade e sempre que a
+verificação (verificar_capacidade) apontar divergências.
+
+Uso:
+    python manage.py reconstruir_capacidade [--restaurante ID] [--desde AAAA-MM-DD] [--ate AAAA-MM-DD]
+"""
+
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservas.capacidade import dias_materializaveis
+from reservas.ocupacao import atualizar_ocupacao
+
+
+def ler_periodo(options):
+    """Converte --desde/--ate em datas (None quando não informados)"""
+    datas = []
+    for opcao in ('desde', 'ate'):
+        valor = options[opcao]
+        try:
+            datas.append(datetime.strptime(valor, '%Y-%m-%d').date() if valor else None)
+        except ValueError:
+            raise CommandError(f'Formato de data inválido em --{opcao}. Use AAAA-MM-DD.')
+    if all(datas) and datas[0] > datas[1]:
+        raise CommandError('--desde deve ser anterior ou igual a --ate.')
+    return datas
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de ocupação e a capacidade por slot a partir das reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurante', type=int, help='ID do restaurante (padrão: todos)')
+        parser.add_argument('--desde', help='Primeiro dia (AAAA-MM-DD, padrão: hoje)')
+        parser.add_argument('--ate', help='Último dia (AAAA-MM-DD, padrão: sem limite)')
+
+    def handle(self, *args, **options):
+        desde, ate = ler_periodo(options)
+        dias = sorted(dias_materializaveis(options['restaurante'], desde, ate))
+
+        for restaurante_id, data in dias:
+            atualizar_ocupacao(restaurante_id, data)
+
+        restaurantes = len({restaurante_id for restaurante_id, _ in dias})
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(dias)} dia(s) reconstruído(s) em {restaurantes} restaurante(s).'
+        ))
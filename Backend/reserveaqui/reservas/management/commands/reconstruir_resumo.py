@@ -0,0 +1,71 @@
+"""
+Reconstrói o resumo diário de reservas (ResumoDiario) por dia.
+
+Cada dia do período é reagregado para todos os restaurantes em uma transação
+própria, sob a trava das partições (restaurante, dia) do dia (as mesmas das
+escritas da API), que ficam marcadas como completas. Os dias são distribuídos
+entre workers paralelos, cada um com sua conexão ao banco. Deve ser executado
+depois de migrar para o resumo; a partir daí as escritas mantêm as partições
+existentes, e novas execuções cobrem os restaurantes sem escritas em um dia.
+
+Uso:
+    python manage.py reconstruir_resumo [--desde AAAA-MM-DD] [--ate AAAA-MM-DD] [--processos 4]
+"""
+
+import time as relogio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+
+from reservas.management.commands.reconstruir_capacidade import ler_periodo
+from reservas.models import Reserva
+from reservas.resumo import dias_do_periodo, reconstruir_particao
+
+
+def reconstruir_particoes(datas):
+    """Reconstrói as partições em sequência; retorna o total de linhas gravadas"""
+    try:
+        return sum(reconstruir_particao(data) for data in datas)
+    finally:
+        # Cada thread abre a própria conexão
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o resumo diário de reservas usado pelos relatórios'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primeiro dia (AAAA-MM-DD, padrão: a reserva mais antiga)')
+        parser.add_argument('--ate', help='Último dia (AAAA-MM-DD, padrão: a reserva mais recente)')
+        parser.add_argument('--processos', type=int, default=4, help='Workers paralelos (padrão: 4)')
+
+    def handle(self, *args, **options):
+        if options['processos'] < 1:
+            raise CommandError('--processos deve ser positivo.')
+        desde, ate = ler_periodo(options)
+        limites = Reserva.objects.aggregate(desde=Min('data_reserva'), ate=Max('data_reserva'))
+        desde = desde or limites['desde']
+        ate = ate or limites['ate']
+        if desde is None or ate is None:
+            self.stdout.write('Nenhuma reserva para resumir.')
+            return
+        if desde > ate:
+            raise CommandError('--desde deve ser anterior ou igual a --ate.')
+
+        datas = dias_do_periodo(desde, ate)
+        processos = min(options['processos'], len(datas))
+        comeco = relogio.perf_counter()
+        if processos == 1:
+            linhas = sum(reconstruir_particao(data) for data in datas)
+        else:
+            # Dias intercalados entre os workers, para dividir períodos com volumes diferentes
+            with ThreadPoolExecutor(max_workers=processos) as executor:
+                linhas = sum(executor.map(reconstruir_particoes, [datas[i::processos] for i in range(processos)]))
+        duracao = relogio.perf_counter() - comeco
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(datas)} dia(s) e {linhas} linha(s) de resumo reconstruídos em {duracao:.2f}s '
+            f'({linhas / duracao if duracao else 0:.0f} linhas/s, {processos} worker(s)).'
+        ))
@@ -0,0 +1,62 @@
+"""
+Verifica a tabela de capacidade por slot contra as reservas e mesas.
+
+Para cada dia do período com reservas ativas ou linhas gravadas, recalcula a
+capacidade a partir das fontes e lista os slots divergentes (ou sem linha).
+Com --corrigir, reconstrói os dias divergentes; sem ele, termina com erro se
+houver divergências (útil em tarefas agendadas).
+
+Uso:
+    python manage.py verificar_capacidade [--restaurante ID] [--desde AAAA-MM-DD] [--ate AAAA-MM-DD] [--corrigir]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservas.bloqueios import liberar_bloqueios_expirados
+from reservas.capacidade import dias_materializaveis, verificar_capacidade
+from reservas.ocupacao import atualizar_ocupacao
+from reservas.management.commands.reconstruir_capacidade import ler_periodo
+
+
+# Slots divergentes listados por dia
+DIVERGENCIAS_EXIBIDAS = 5
+
+
+class Command(BaseCommand):
+    help = 'Compara a capacidade por slot gravada com a recalculada a partir das reservas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurante', type=int, help='ID do restaurante (padrão: todos)')
+        parser.add_argument('--desde', help='Primeiro dia (AAAA-MM-DD, padrão: hoje)')
+        parser.add_argument('--ate', help='Último dia (AAAA-MM-DD, padrão: sem limite)')
+        parser.add_argument('--corrigir', action='store_true', help='Reconstrói os dias divergentes')
+
+    def handle(self, *args, **options):
+        desde, ate = ler_periodo(options)
+        # Bloqueios vencidos ainda não liberados divergiriam do recalculado
+        liberar_bloqueios_expirados(options['restaurante'])
+        dias = sorted(dias_materializaveis(options['restaurante'], desde, ate))
+
+        divergentes = []
+        for restaurante_id, data in dias:
+            divergencias = verificar_capacidade(restaurante_id, data)
+            if not divergencias:
+                continue
+            divergentes.append((restaurante_id, data))
+            self.stdout.write(self.style.WARNING(
+                f'Restaurante {restaurante_id}, {data}: {len(divergencias)} slot(s) divergente(s)'
+            ))
+            for slot, gravado, esperado in divergencias[:DIVERGENCIAS_EXIBIDAS]:
+                self.stdout.write(f'  slot {slot}: gravado {gravado}, esperado {esperado}')
+
+        self.stdout.write(f'{len(dias)} dia(s) verificado(s), {len(divergentes)} divergente(s).')
+        if not divergentes:
+            self.stdout.write(self.style.SUCCESS('Capacidade consistente.'))
+            return
+
+        if options['corrigir']:
+            for restaurante_id, data in divergentes:
+                atualizar_ocupacao(restaurante_id, data)
+            self.stdout.write(self.style.SUCCESS(f'{len(divergentes)} dia(s) reconstruído(s).'))
+        else:
+            raise CommandError('Capacidade inconsistente: use --corrigir ou reconstruir_capacidade.')
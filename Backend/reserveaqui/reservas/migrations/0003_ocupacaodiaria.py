@@ -0,0 +1,30 @@
+# Generated by Django 6.0.2 on 2026-10-17 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0002_notificacao'),
+        ('restaurantes', '0002_restaurante_quantidade_mesas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OcupacaoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('mapa', models.JSONField(blank=True, default=dict, verbose_name='Mapa de Ocupação')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocupacoes', to='restaurantes.restaurante', verbose_name='Restaurante')),
+            ],
+            options={
+                'verbose_name': 'Ocupação Diária',
+                'verbose_name_plural': 'Ocupações Diárias',
+                'unique_together': {('restaurante', 'data')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:00
+
+from datetime import datetime
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def preencher_intervalos(apps, schema_editor):
+    """Calcula inicio/fim das reservas existentes a partir da data, horário e duração do restaurante"""
+    Reserva = apps.get_model('reservas', 'Reserva')
+    OcupacaoDiaria = apps.get_model('reservas', 'OcupacaoDiaria')
+
+    reservas = list(Reserva.objects.select_related('restaurante'))
+    for reserva in reservas:
+        reserva.inicio = timezone.make_aware(datetime.combine(reserva.data_reserva, reserva.horario))
+        reserva.fim = reserva.inicio + reserva.restaurante.duracao_reserva
+    Reserva.objects.bulk_update(reservas, ['inicio', 'fim'], batch_size=500)
+
+    # O índice antigo usava a janela fixa de conflito; é reconstruído sob demanda
+    OcupacaoDiaria.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0003_ocupacaodiaria'),
+        ('restaurantes', '0003_restaurante_duracao_reserva'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reserva',
+            name='inicio',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Início'),
+        ),
+        migrations.AddField(
+            model_name='reserva',
+            name='fim',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='Fim'),
+        ),
+        migrations.RunPython(preencher_intervalos, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='reserva',
+            name='inicio',
+            field=models.DateTimeField(editable=False, verbose_name='Início'),
+        ),
+        migrations.AlterField(
+            model_name='reserva',
+            name='fim',
+            field=models.DateTimeField(editable=False, verbose_name='Fim'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['restaurante', 'inicio', 'fim'], name='reservas_re_restaur_9cbb06_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0004_reserva_inicio_fim'),
+        ('restaurantes', '0003_restaurante_duracao_reserva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapacidadeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='Slot')),
+                ('mesas_livres', models.PositiveIntegerField(default=0, help_text='Mesas livres para uma reserva que começa no slot', verbose_name='Mesas Livres')),
+                ('mesas_ocupadas', models.PositiveIntegerField(default=0, help_text='Mesas com reserva ativa durante o slot', verbose_name='Mesas Ocupadas')),
+                ('pessoas', models.PositiveIntegerField(default=0, help_text='Pessoas com reserva ativa durante o slot', verbose_name='Pessoas')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacidades', to='restaurantes.restaurante', verbose_name='Restaurante')),
+            ],
+            options={
+                'verbose_name': 'Capacidade por Slot',
+                'verbose_name_plural': 'Capacidades por Slot',
+                'ordering': ['restaurante', 'data', 'slot'],
+                'indexes': [models.Index(fields=['data', 'slot'], name='reservas_ca_data_659de0_idx')],
+                'unique_together': {('restaurante', 'data', 'slot')},
+            },
+        ),
+    ]
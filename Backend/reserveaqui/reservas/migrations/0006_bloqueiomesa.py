@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-17 13:00
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mesas', '0002_remove_mesa_capacidade'),
+        ('reservas', '0005_capacidadeslot'),
+        ('restaurantes', '0003_restaurante_duracao_reserva'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocupacaodiaria',
+            name='proxima_expiracao',
+            field=models.DateTimeField(blank=True, help_text='Expiração do primeiro bloqueio incluído no mapa (o mapa é recalculado ao ser lido depois dela)', null=True, verbose_name='Próxima Expiração'),
+        ),
+        migrations.AlterField(
+            model_name='capacidadeslot',
+            name='mesas_ocupadas',
+            field=models.PositiveIntegerField(default=0, help_text='Mesas com reserva ativa ou bloqueio durante o slot', verbose_name='Mesas Ocupadas'),
+        ),
+        migrations.CreateModel(
+            name='BloqueioMesa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='Token')),
+                ('data_reserva', models.DateField(verbose_name='Data da Reserva')),
+                ('horario', models.TimeField(verbose_name='Horário')),
+                ('quantidade_pessoas', models.PositiveIntegerField(verbose_name='Quantidade de Pessoas')),
+                ('inicio', models.DateTimeField(verbose_name='Início da Ocupação')),
+                ('fim', models.DateTimeField(verbose_name='Fim da Ocupação')),
+                ('expira_em', models.DateTimeField(verbose_name='Expira em')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('mesas', models.ManyToManyField(related_name='bloqueios', to='mesas.mesa', verbose_name='Mesas')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bloqueios', to='restaurantes.restaurante', verbose_name='Restaurante')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='bloqueios_mesa', to=settings.AUTH_USER_MODEL, verbose_name='Usuário')),
+            ],
+            options={
+                'verbose_name': 'Bloqueio de Mesa',
+                'verbose_name_plural': 'Bloqueios de Mesa',
+                'ordering': ['-data_criacao'],
+                'indexes': [models.Index(fields=['restaurante', 'inicio', 'fim'], name='reservas_bl_restaur_77aefe_idx'), models.Index(fields=['expira_em'], name='reservas_bl_expira__aefc37_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-17 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0007_chaveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['status', 'fim'], name='reservas_re_status_b449e8_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-17 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0008_reserva_status_fim_idx'),
+        ('restaurantes', '0003_restaurante_duracao_reserva'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticaoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(unique=True, verbose_name='Data')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+            ],
+            options={
+                'verbose_name': 'Partição do Resumo',
+                'verbose_name_plural': 'Partições do Resumo',
+                'ordering': ['data'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_reserva', models.DateField(verbose_name='Data da Reserva')),
+                ('horario', models.TimeField(verbose_name='Horário')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('confirmada', 'Confirmada'), ('cancelada', 'Cancelada'), ('concluida', 'Concluída')], max_length=20, verbose_name='Status')),
+                ('quantidade', models.PositiveIntegerField(default=0, verbose_name='Reservas')),
+                ('pessoas', models.PositiveIntegerField(default=0, verbose_name='Pessoas')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos', to='restaurantes.restaurante', verbose_name='Restaurante')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário',
+                'verbose_name_plural': 'Resumos Diários',
+                'ordering': ['data_reserva', 'restaurante', 'horario', 'status'],
+                'indexes': [models.Index(fields=['data_reserva', 'restaurante'], name='reservas_re_data_re_57103d_idx')],
+                'unique_together': {('restaurante', 'data_reserva', 'horario', 'status')},
+            },
+        ),
+    ]
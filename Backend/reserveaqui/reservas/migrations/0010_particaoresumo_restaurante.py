@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# As partições por dia não dizem quais restaurantes estavam completos e são
+# descartadas: até rodar `reconstruir_resumo`, os relatórios leem as reservas.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservas', '0009_particaoresumo_resumodiario'),
+        ('restaurantes', '0003_restaurante_duracao_reserva'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='ParticaoResumo',
+        ),
+        migrations.CreateModel(
+            name='ParticaoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('data_atualizacao', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='particoes_resumo', to='restaurantes.restaurante', verbose_name='Restaurante')),
+            ],
+            options={
+                'verbose_name': 'Partição do Resumo',
+                'verbose_name_plural': 'Partições do Resumo',
+                'ordering': ['data', 'restaurante'],
+                'unique_together': {('restaurante', 'data')},
+            },
+        ),
+    ]
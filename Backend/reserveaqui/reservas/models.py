@@ -1,11 +1,28 @@
 from django.db import models
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils import timezone
 from datetime import timedelta
 import math
+import uuid
 from usuarios.models import Usuario
 from restaurantes.models import Restaurante
 from mesas.models import Mesa
+from .signals import ocupacao_alterada
+
+
+def dias_do_intervalo(inicio, fim):
+    """Retorna as datas locais tocadas pelo intervalo [inicio, fim)"""
+    dia = timezone.localtime(inicio).date()
+    ultimo = timezone.localtime(fim - timedelta(microseconds=1)).date()
+    dias = []
+    while dia <= ultimo:
+        dias.append(dia)
+        dia += timedelta(days=1)
+    return dias
 
 
 class Reserva(models.Model):
@@ -21,6 +38,22 @@ class Reserva(models.Model):
         ('concluida', 'Concluída'),
     ]
     
+    # Status que ainda ocupam mesas
+    STATUS_ATIVOS = ['pendente', 'confirmada']
+    
+    # Máquina de estados: ação -> (status de origem permitidos, status de destino)
+    # Aplicada por reservas/transicoes.py
+    TRANSICOES = {
+        'confirmar': (['pendente'], 'confirmada'),
+        'cancelar': (['pendente', 'confirmada'], 'cancelada'),
+        'concluir': (['confirmada'], 'concluida'),
+        # Pendentes que passaram sem confirmação (processar_reservas_passadas)
+        'expirar': (['pendente'], 'cancelada'),
+    }
+    
+    # Campos que definem a contribuição da reserva para o resumo diário (reservas/resumo.py)
+    CAMPOS_RESUMO = ['restaurante_id', 'data_reserva', 'horario', 'status', 'quantidade_pessoas']
+    
     # Relações
     restaurante = models.ForeignKey(
         Restaurante,
@@ -47,6 +80,12 @@ class Reserva(models.Model):
     # Dados da reserva
     data_reserva = models.DateField(verbose_name='Data da Reserva')
     horario = models.TimeField(verbose_name='Horário')
+    
+    # Intervalo em que a reserva ocupa as mesas, calculado a partir da data,
+    # do horário e da duração de reserva do restaurante
+    inicio = models.DateTimeField(editable=False, verbose_name='Início')
+    fim = models.DateTimeField(editable=False, verbose_name='Fim')
+    
     quantidade_pessoas = models.PositiveIntegerField(verbose_name='Quantidade de Pessoas')
     
     # Dados do cliente
@@ -73,12 +112,45 @@ class Reserva(models.Model):
         ordering = ['-data_reserva', '-horario']
         indexes = [
             models.Index(fields=['restaurante', 'data_reserva', 'horario']),
+            models.Index(fields=['restaurante', 'inicio', 'fim']),
             models.Index(fields=['status']),
+            models.Index(fields=['status', 'fim']),
         ]
     
     def __str__(self):
         return f"{self.nome_cliente} - {self.restaurante.nome} ({self.data_reserva} às {self.horario})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda os valores carregados para detectar mudanças que afetam a ocupação"""
+        instance = super().from_db(db, field_names, values)
+        instance._valores_originais = {
+            campo: valor for campo, valor in zip(field_names, values)
+            if valor is not DEFERRED
+        }
+        # Linha gravada no resumo diário (None se algum campo não foi carregado)
+        instance._linha_resumo = (
+            instance.linha_resumo()
+            if all(campo in instance._valores_originais for campo in cls.CAMPOS_RESUMO)
+            else None
+        )
+        return instance
+    
+    def linha_resumo(self):
+        """(restaurante_id, data_reserva, horario, status, quantidade_pessoas) da reserva no resumo diário"""
+        return tuple(getattr(self, campo) for campo in self.CAMPOS_RESUMO)
+    
+    def definir_intervalo(self):
+        """Calcula início e fim da ocupação das mesas a partir da data, horário e duração"""
+        self.inicio = timezone.make_aware(
+            timezone.datetime.combine(self.data_reserva, self.horario)
+        )
+        self.fim = self.inicio + self.restaurante.duracao_reserva
+    
+    def dias_ocupados(self):
+        """Retorna as datas (locais) em que a reserva ocupa mesas"""
+        return dias_do_intervalo(self.inicio, self.fim)
+    
     def calcular_mesas_necessarias(self):
         """Calcula quantas mesas de 4 pessoas são necessárias para a reserva"""
         return math.ceil(self.quantidade_pessoas / 4)
@@ -119,6 +191,8 @@ class Reserva(models.Model):
     def save(self, *args, **kwargs):
         """Sobrescreve o save para executar validações"""
         skip_validation = kwargs.pop('skip_validation', False)
+        if self.data_reserva and self.horario:
+            self.definir_intervalo()
         if not skip_validation:
             self.full_clean()
         super().save(*args, **kwargs)
@@ -153,6 +227,250 @@ class ReservaMesa(models.Model):
     def __str__(self):
         return f"Reserva {self.reserva.id} - Mesa {self.mesa.numero}"
 
+
+class OcupacaoDiaria(models.Model):
+    """
+    Índice de ocupação das mesas de um restaurante em um dia.
+    O campo `mapa` associa o id de cada mesa ocupada a um bitmap (em hexadecimal)
+    com um bit por slot do dia. Mantido por reservas/ocupacao.py.
+    """
+    
+    restaurante = models.ForeignKey(
+        Restaurante,
+        on_delete=models.CASCADE,
+        related_name='ocupacoes',
+        verbose_name='Restaurante'
+    )
+    data = models.DateField(verbose_name='Data')
+    mapa = models.JSONField(default=dict, blank=True, verbose_name='Mapa de Ocupação')
+    proxima_expiracao = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Próxima Expiração',
+        help_text='Expiração do primeiro bloqueio incluído no mapa (o mapa é recalculado ao ser lido depois dela)'
+    )
+    data_atualizacao = models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')
+    
+    class Meta:
+        verbose_name = 'Ocupação Diária'
+        verbose_name_plural = 'Ocupações Diárias'
+        unique_together = ['restaurante', 'data']
+    
+    def __str__(self):
+        return f"Ocupação {self.restaurante_id} - {self.data}"
+
+
+class CapacidadeSlot(models.Model):
+    """
+    Capacidade de um restaurante em cada slot de 15 minutos de um dia.
+    Tabela desnormalizada, mantida na mesma transação que o índice de ocupação
+    (ver reservas/capacidade.py), para que consultas por horário leiam uma linha.
+    """
+    
+    restaurante = models.ForeignKey(
+        Restaurante,
+        on_delete=models.CASCADE,
+        related_name='capacidades',
+        verbose_name='Restaurante'
+    )
+    data = models.DateField(verbose_name='Data')
+    slot = models.PositiveSmallIntegerField(verbose_name='Slot')
+    mesas_livres = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Mesas Livres',
+        help_text='Mesas livres para uma reserva que começa no slot'
+    )
+    mesas_ocupadas = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Mesas Ocupadas',
+        help_text='Mesas com reserva ativa ou bloqueio durante o slot'
+    )
+    pessoas = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Pessoas',
+        help_text='Pessoas com reserva ativa durante o slot'
+    )
+    
+    class Meta:
+        verbose_name = 'Capacidade por Slot'
+        verbose_name_plural = 'Capacidades por Slot'
+        unique_together = ['restaurante', 'data', 'slot']
+        indexes = [
+            models.Index(fields=['data', 'slot']),
+        ]
+        ordering = ['restaurante', 'data', 'slot']
+    
+    def __str__(self):
+        return f"Capacidade {self.restaurante_id} - {self.data} slot {self.slot}"
+
+class ResumoDiario(models.Model):
+    """
+    Quantidade de reservas e de pessoas por restaurante, dia, horário e status.
+    Tabela de fatos dos relatórios, mantida por reservas/resumo.py. Os campos
+    têm os nomes dos de Reserva para que as mesmas consultas agrupadas sirvam
+    às duas tabelas.
+    """
+    
+    restaurante = models.ForeignKey(
+        Restaurante,
+        on_delete=models.CASCADE,
+        related_name='resumos',
+        verbose_name='Restaurante'
+    )
+    data_reserva = models.DateField(verbose_name='Data da Reserva')
+    horario = models.TimeField(verbose_name='Horário')
+    status = models.CharField(max_length=20, choices=Reserva.STATUS_CHOICES, verbose_name='Status')
+    quantidade = models.PositiveIntegerField(default=0, verbose_name='Reservas')
+    pessoas = models.PositiveIntegerField(default=0, verbose_name='Pessoas')
+    
+    class Meta:
+        verbose_name = 'Resumo Diário'
+        verbose_name_plural = 'Resumos Diários'
+        unique_together = ['restaurante', 'data_reserva', 'horario', 'status']
+        indexes = [
+            models.Index(fields=['data_reserva', 'restaurante']),
+        ]
+        ordering = ['data_reserva', 'restaurante', 'horario', 'status']
+    
+    def __str__(self):
+        return f"Resumo {self.restaurante_id} - {self.data_reserva} {self.horario} ({self.status})"
+
+
+class ParticaoResumo(models.Model):
+    """
+    Restaurante e dia cujo resumo (ResumoDiario) está completo. Criada na
+    reconstrução ou na primeira escrita do dia no restaurante; a partir dela, as
+    escritas somam suas variações ao resumo sob a trava desta linha.
+    """
+    
+    restaurante = models.ForeignKey(
+        Restaurante,
+        on_delete=models.CASCADE,
+        related_name='particoes_resumo',
+        verbose_name='Restaurante'
+    )
+    data = models.DateField(verbose_name='Data')
+    data_atualizacao = models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')
+    
+    class Meta:
+        verbose_name = 'Partição do Resumo'
+        verbose_name_plural = 'Partições do Resumo'
+        unique_together = ['restaurante', 'data']
+        ordering = ['data', 'restaurante']
+    
+    def __str__(self):
+        return f"Partição do resumo {self.restaurante_id} - {self.data}"
+
+
+class BloqueioMesa(models.Model):
+    """
+    Bloqueio temporário das mesas de uma futura reserva enquanto o cliente
+    preenche o formulário. Ocupa as mesas no índice até `expira_em`; ao criar a
+    reserva com o token do bloqueio, as mesas bloqueadas são usadas diretamente.
+    """
+    
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name='Token')
+    
+    # Relações
+    restaurante = models.ForeignKey(
+        Restaurante,
+        on_delete=models.CASCADE,
+        related_name='bloqueios',
+        verbose_name='Restaurante'
+    )
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='bloqueios_mesa',
+        verbose_name='Usuário'
+    )
+    mesas = models.ManyToManyField(Mesa, related_name='bloqueios', verbose_name='Mesas')
+    
+    # Dados da futura reserva
+    data_reserva = models.DateField(verbose_name='Data da Reserva')
+    horario = models.TimeField(verbose_name='Horário')
+    quantidade_pessoas = models.PositiveIntegerField(verbose_name='Quantidade de Pessoas')
+    inicio = models.DateTimeField(verbose_name='Início da Ocupação')
+    fim = models.DateTimeField(verbose_name='Fim da Ocupação')
+    
+    # Timestamps
+    expira_em = models.DateTimeField(verbose_name='Expira em')
+    data_criacao = models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')
+    
+    class Meta:
+        verbose_name = 'Bloqueio de Mesa'
+        verbose_name_plural = 'Bloqueios de Mesa'
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['restaurante', 'inicio', 'fim']),
+            models.Index(fields=['expira_em']),
+        ]
+    
+    def __str__(self):
+        return f"Bloqueio {self.restaurante_id} - {self.data_reserva} às {self.horario}"
+    
+    def definir_intervalo(self):
+        """Mesmo intervalo que a reserva ocuparia"""
+        self.inicio = timezone.make_aware(
+            timezone.datetime.combine(self.data_reserva, self.horario)
+        )
+        self.fim = self.inicio + self.restaurante.duracao_reserva
+    
+    def dias_ocupados(self):
+        """Retorna as datas (locais) em que o bloqueio ocupa mesas"""
+        return dias_do_intervalo(self.inicio, self.fim)
+    
+    def expirado(self):
+        return self.expira_em <= timezone.now()
+
+
+class ChaveIdempotencia(models.Model):
+    """
+    Resposta registrada para um cabeçalho Idempotency-Key do usuário.
+    Enquanto vale, repetições da mesma requisição recebem a resposta gravada em
+    vez de executar a criação ou a transição de novo (ver reservas/idempotencia.py).
+    """
+    
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='chaves_idempotencia',
+        verbose_name='Usuário'
+    )
+    chave = models.CharField(max_length=255, verbose_name='Chave')
+    impressao = models.CharField(
+        max_length=64,
+        verbose_name='Impressão da Requisição',
+        help_text='SHA-256 do método, caminho e corpo da primeira requisição'
+    )
+    
+    # Resposta (vazia enquanto a primeira requisição está em andamento)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Status HTTP')
+    resposta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name='Resposta')
+    
+    # Timestamps
+    data_criacao = models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')
+    # Prazo da execução enquanto não há resposta; depois, a validade da resposta
+    expira_em = models.DateTimeField(db_index=True, verbose_name='Expira em')
+    
+    class Meta:
+        verbose_name = 'Chave de Idempotência'
+        verbose_name_plural = 'Chaves de Idempotência'
+        unique_together = ['usuario', 'chave']
+        ordering = ['-data_criacao']
+    
+    def __str__(self):
+        return f"{self.usuario_id} - {self.chave}"
+    
+    def concluida(self):
+        return self.status_code is not None
+    
+    def expirada(self):
+        return self.expira_em <= timezone.now()
+
+
 class Notificacao(models.Model):
     """
     Modelo para armazenar notificações de reservas.
@@ -207,8 +525,156 @@ class Notificacao(models.Model):
     def __str__(self):
         return f"{self.titulo} - {self.usuario.email}"
     
+    @classmethod
+    def de_confirmacao(cls, reserva, restaurante, numeros_mesas):
+        """Notificação (ainda não salva) de confirmação da reserva para o cliente"""
+        return cls(
+            usuario_id=reserva.usuario_id,
+            reserva=reserva,
+            tipo='confirmacao',
+            titulo=f'Reserva Confirmada - {restaurante.nome}',
+            mensagem=f'Sua reserva para {reserva.quantidade_pessoas} pessoas em {restaurante.nome} '
+                     f'foi confirmada para {reserva.data_reserva} às {reserva.horario}. '
+                     f'Mesas: {", ".join(str(numero) for numero in numeros_mesas)}'
+        )
+    
     def marcar_como_lida(self):
         """Marca a notificação como lida"""
         self.lido = True
         self.data_leitura = timezone.now()
-        self.save()
\ No newline at end of file
+        self.save()
+
+
+def _exclusao_de_restaurante(origin):
+    """Indica se a exclusão em cascata partiu de um restaurante (o índice some junto)"""
+    modelo = getattr(origin, 'model', None) or type(origin)
+    return modelo is Restaurante
+
+
+@receiver(post_save, sender=ReservaMesa)
+def atualizar_ocupacao_vinculo_criado(sender, instance, **kwargs):
+    """Signal para marcar a mesa como ocupada no índice de ocupação"""
+    from .ocupacao import atualizar_ocupacao
+    reserva = instance.reserva
+    for data in reserva.dias_ocupados():
+        atualizar_ocupacao(reserva.restaurante_id, data)
+
+
+@receiver(post_delete, sender=ReservaMesa)
+def atualizar_ocupacao_vinculo_removido(sender, instance, origin=None, **kwargs):
+    """Signal para liberar a mesa no índice de ocupação"""
+    if _exclusao_de_restaurante(origin):
+        return
+    
+    from .ocupacao import atualizar_ocupacao
+    reserva = Reserva.objects.filter(pk=instance.reserva_id).values_list(
+        'restaurante_id', 'inicio', 'fim'
+    ).first()
+    if reserva:
+        restaurante_id, inicio, fim = reserva
+        for data in dias_do_intervalo(inicio, fim):
+            atualizar_ocupacao(restaurante_id, data)
+
+
+@receiver(post_save, sender=Reserva)
+def atualizar_resumo_reserva(sender, instance, created, **kwargs):
+    """Signal para tirar a linha anterior da reserva do resumo diário e somar a atual"""
+    from .resumo import atualizar_resumos
+    anterior = getattr(instance, '_linha_resumo', None)
+    atual = instance.linha_resumo()
+    instance._linha_resumo = atual
+    if created:
+        atualizar_resumos(adicionadas=[atual])
+    elif anterior is None:
+        # Valores gravados antes desconhecidos: o dia atual é reagregado
+        atualizar_resumos(dias=[atual[:2]])
+    elif anterior != atual:
+        atualizar_resumos(adicionadas=[atual], removidas=[anterior])
+
+
+@receiver(post_delete, sender=Reserva)
+def atualizar_resumo_reserva_removida(sender, instance, origin=None, **kwargs):
+    """Signal para tirar a reserva excluída do resumo diário"""
+    if _exclusao_de_restaurante(origin):
+        return
+    
+    from .resumo import atualizar_resumos
+    linha = getattr(instance, '_linha_resumo', None)
+    if linha is None:
+        atualizar_resumos(dias=[(instance.restaurante_id, instance.data_reserva)])
+    else:
+        atualizar_resumos(removidas=[linha])
+
+
+@receiver(post_save, sender=Reserva)
+def atualizar_ocupacao_reserva(sender, instance, created, **kwargs):
+    """
+    Signal para manter o índice quando status, intervalo ou quantidade de pessoas
+    (contada na capacidade por slot) da reserva mudam. Se a reserva mudou de dia,
+    os dias antigos também são recalculados.
+    """
+    originais = getattr(instance, '_valores_originais', None)
+    campos = ['restaurante_id', 'inicio', 'fim', 'status', 'quantidade_pessoas']
+    atuais = {campo: getattr(instance, campo) for campo in campos}
+    instance._valores_originais = atuais
+    
+    # Reserva nova ainda não tem mesas vinculadas
+    if created:
+        return
+    
+    if originais and all(originais.get(campo) == atuais[campo] for campo in campos):
+        return
+    
+    from .ocupacao import atualizar_ocupacao
+    dias = {(atuais['restaurante_id'], data) for data in instance.dias_ocupados()}
+    if originais and all(originais.get(campo) for campo in ['restaurante_id', 'inicio', 'fim']):
+        dias.update(
+            (originais['restaurante_id'], data)
+            for data in dias_do_intervalo(originais['inicio'], originais['fim'])
+        )
+    
+    for restaurante_id, data in dias:
+        atualizar_ocupacao(restaurante_id, data)
+
+
+@receiver(ocupacao_alterada)
+def invalidar_cache_disponibilidade_dia(sender, restaurante_id, data, **kwargs):
+    """Signal para descartar as disponibilidades guardadas do dia cuja ocupação mudou"""
+    from .cache_disponibilidade import invalidar_dia
+    invalidar_dia(restaurante_id, data)
+
+
+@receiver(post_save, sender=Mesa)
+@receiver(post_delete, sender=Mesa)
+def invalidar_cache_disponibilidade_mesa(sender, instance, **kwargs):
+    """Signal para descartar as disponibilidades do restaurante quando uma mesa muda (status, ativa, etc.)"""
+    from .cache_disponibilidade import invalidar_restaurante
+    invalidar_restaurante(instance.restaurante_id)
+
+
+@receiver(post_save, sender=Restaurante)
+def invalidar_cache_disponibilidade_restaurante(sender, instance, created, **kwargs):
+    """Signal para descartar as disponibilidades do restaurante (ex: mudança na duração das reservas)"""
+    if created:
+        return
+    from .cache_disponibilidade import invalidar_restaurante
+    invalidar_restaurante(instance.pk)
+
+
+@receiver(post_save, sender=Mesa)
+@receiver(post_delete, sender=Mesa)
+def atualizar_capacidade_mesa(sender, instance, origin=None, **kwargs):
+    """Signal para recalcular as mesas livres por slot quando uma mesa muda (status, ativa, etc.)"""
+    if _exclusao_de_restaurante(origin):
+        return
+    from .capacidade import atualizar_capacidade_restaurante
+    atualizar_capacidade_restaurante(instance.restaurante_id)
+
+
+@receiver(post_save, sender=Restaurante)
+def atualizar_capacidade_restaurante_alterado(sender, instance, created, **kwargs):
+    """Signal para recalcular as mesas livres por slot (ex: mudança na duração das reservas)"""
+    if created:
+        return
+    from .capacidade import atualizar_capacidade_restaurante
+    atualizar_capacidade_restaurante(instance.pk)
@@ -0,0 +1,455 @@
+"""
+Índice de ocupação de mesas por restaurante e dia.
+
+Cada OcupacaoDiaria guarda, para cada mesa, um bitmap com um bit por slot de
+MINUTOS_POR_SLOT minutos. Uma reserva marca os slots do seu intervalo
+[inicio, fim) em cada dia que toca, e "quais mesas estão livres às HH:MM" vira
+um AND entre o bitmap de cada mesa e a máscara do intervalo consultado.
+
+O índice é recalculado dentro da transação de cada escrita que afeta a ocupação
+(ver signals em reservas/models.py) e construído sob demanda na primeira leitura.
+Bloqueios temporários (reservas/bloqueios.py) ocupam as mesas como reservas até
+expirarem; o dia lido depois da expiração de um bloqueio é recalculado.
+Junto com ele é mantida a tabela de capacidade por slot (reservas/capacidade.py).
+"""
+
+from datetime import datetime, timedelta, time
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Q, F, Min, Value, DateTimeField, ExpressionWrapper, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from mesas.models import Mesa
+from restaurantes.models import DURACAO_RESERVA_MAXIMA
+from .models import Reserva, ReservaMesa, OcupacaoDiaria, CapacidadeSlot, BloqueioMesa, dias_do_intervalo
+from .signals import ocupacao_alterada
+
+
+MINUTOS_POR_SLOT = 15
+SLOTS_POR_DIA = 24 * 60 // MINUTOS_POR_SLOT
+
+
+def inicio_do_dia(data):
+    """Retorna o datetime (aware) da meia-noite local da data"""
+    return timezone.make_aware(datetime.combine(data, time.min))
+
+
+def intervalo_da_consulta(data, horario, duracao):
+    """Retorna o intervalo [inicio, fim) que uma reserva no horário ocuparia"""
+    inicio = timezone.make_aware(datetime.combine(data, horario))
+    return inicio, inicio + duracao
+
+
+def mascaras_intervalo(inicio, fim):
+    """
+    Retorna {data: máscara de bits} com os slots ocupados pelo intervalo em cada dia.
+    Intervalos fora do início de um slot ocupam o slot inteiro, o que só torna o
+    índice mais conservador.
+    """
+    mascaras = {}
+    inicio = timezone.localtime(inicio)
+    fim = timezone.localtime(fim)
+    dia = inicio.date()
+
+    while inicio_do_dia(dia) < fim:
+        comeco_dia = inicio_do_dia(dia)
+        minutos_inicio = max((inicio - comeco_dia).total_seconds() / 60, 0)
+        minutos_fim = min((fim - comeco_dia).total_seconds() / 60, 24 * 60)
+
+        primeiro = int(minutos_inicio // MINUTOS_POR_SLOT)
+        ultimo = min(-int(-minutos_fim // MINUTOS_POR_SLOT), SLOTS_POR_DIA)
+        if ultimo > primeiro:
+            mascaras[dia] = ((1 << (ultimo - primeiro)) - 1) << primeiro
+
+        dia += timedelta(days=1)
+
+    return mascaras
+
+
+def _bloqueios_do_dia(restaurante_id, data):
+    """Bloqueios ainda válidos do restaurante que tocam o dia"""
+    comeco_dia = inicio_do_dia(data)
+    return BloqueioMesa.objects.filter(
+        restaurante_id=restaurante_id,
+        inicio__gte=comeco_dia - DURACAO_RESERVA_MAXIMA,
+        inicio__lt=inicio_do_dia(data + timedelta(days=1)),
+        fim__gt=comeco_dia,
+        expira_em__gt=timezone.now()
+    )
+
+
+def calcular_dia(restaurante_id, data):
+    """
+    Calcula, a partir das reservas ativas e dos bloqueios válidos que tocam o dia
+    (duas consultas), o bitmap de cada mesa e a quantidade de pessoas com reserva
+    em cada slot.
+    """
+    comeco_dia = inicio_do_dia(data)
+    fim_dia = inicio_do_dia(data + timedelta(days=1))
+
+    mapa = {}
+    pessoas = [0] * SLOTS_POR_DIA
+    reservas_contadas = set()
+    vinculos = ReservaMesa.objects.filter(
+        reserva__restaurante_id=restaurante_id,
+        reserva__inicio__gte=comeco_dia - DURACAO_RESERVA_MAXIMA,
+        reserva__inicio__lt=fim_dia,
+        reserva__fim__gt=comeco_dia,
+        reserva__status__in=Reserva.STATUS_ATIVOS
+    ).values_list('mesa_id', 'reserva_id', 'reserva__inicio', 'reserva__fim', 'reserva__quantidade_pessoas')
+
+    for mesa_id, reserva_id, inicio, fim, quantidade_pessoas in vinculos:
+        mascara = mascaras_intervalo(inicio, fim).get(data, 0)
+        mapa[mesa_id] = mapa.get(mesa_id, 0) | mascara
+
+        if reserva_id not in reservas_contadas:
+            reservas_contadas.add(reserva_id)
+            for slot in range(SLOTS_POR_DIA):
+                if mascara >> slot & 1:
+                    pessoas[slot] += quantidade_pessoas
+
+    bloqueios = BloqueioMesa.mesas.through.objects.filter(
+        bloqueiomesa__in=_bloqueios_do_dia(restaurante_id, data)
+    ).values_list('mesa_id', 'bloqueiomesa__inicio', 'bloqueiomesa__fim')
+    for mesa_id, inicio, fim in bloqueios:
+        mapa[mesa_id] = mapa.get(mesa_id, 0) | mascaras_intervalo(inicio, fim).get(data, 0)
+
+    return mapa, pessoas
+
+
+def _proxima_expiracao(restaurante_id, data):
+    """Expiração do primeiro bloqueio válido que toca o dia (None se não houver)"""
+    return _bloqueios_do_dia(restaurante_id, data).aggregate(proxima=Min('expira_em'))['proxima']
+
+
+def calcular_mapa(restaurante_id, data):
+    """Calcula o bitmap de cada mesa a partir das reservas ativas que tocam o dia (uma consulta)"""
+    return calcular_dia(restaurante_id, data)[0]
+
+
+def _serializar_mapa(mapa):
+    """Converte {mesa_id: int} para o formato salvo no JSONField"""
+    return {str(mesa_id): format(bits, 'x') for mesa_id, bits in mapa.items() if bits}
+
+
+def _desserializar_mapa(mapa):
+    """Converte o JSONField de volta para {mesa_id: int}"""
+    return {int(mesa_id): int(bits, 16) for mesa_id, bits in mapa.items()}
+
+
+def atualizar_ocupacao(restaurante_id, data):
+    """
+    Recalcula o índice de um restaurante em um dia.
+    A linha é bloqueada antes do recálculo para que escritas concorrentes no mesmo
+    dia sejam aplicadas em sequência e a última sempre veja todas as anteriores.
+    """
+    from .capacidade import atualizar_capacidade
+
+    with transaction.atomic():
+        ocupacao, _ = OcupacaoDiaria.objects.select_for_update().get_or_create(
+            restaurante_id=restaurante_id,
+            data=data
+        )
+        mapa, pessoas = calcular_dia(restaurante_id, data)
+        ocupacao.mapa = _serializar_mapa(mapa)
+        ocupacao.proxima_expiracao = _proxima_expiracao(restaurante_id, data)
+        ocupacao.save(update_fields=['mapa', 'proxima_expiracao', 'data_atualizacao'])
+        atualizar_capacidade(restaurante_id, data, mapa, pessoas)
+    ocupacao_alterada.send(sender=OcupacaoDiaria, restaurante_id=restaurante_id, data=data)
+    return ocupacao
+
+
+def _criar_indice(restaurante_id, data, bloquear=False):
+    """
+    Cria o índice do dia a partir das reservas. Se outra requisição o criar
+    primeiro, retorna o dela (bloqueado, se pedido).
+    """
+    from .capacidade import atualizar_capacidade
+
+    try:
+        with transaction.atomic():
+            mapa, pessoas = calcular_dia(restaurante_id, data)
+            ocupacao = OcupacaoDiaria.objects.create(
+                restaurante_id=restaurante_id,
+                data=data,
+                mapa=_serializar_mapa(mapa),
+                proxima_expiracao=_proxima_expiracao(restaurante_id, data)
+            )
+            atualizar_capacidade(restaurante_id, data, mapa, pessoas)
+            return ocupacao
+    except IntegrityError:
+        ocupacoes = OcupacaoDiaria.objects.select_for_update() if bloquear else OcupacaoDiaria.objects
+        return ocupacoes.get(restaurante_id=restaurante_id, data=data)
+
+
+def travar_alocacao(restaurante, data, horario, reserva_atual=None, outros_dias=()):
+    """
+    Trava a alocação de mesas do restaurante nos dias ocupados por uma reserva no
+    horário (e, em edições, nos dias atuais de `reserva_atual`, no restaurante
+    atual dela; em `outros_dias`, pares (restaurante_id, data) liberados na mesma
+    transação) até o fim da transação em andamento.
+
+    A trava é o lock da linha do índice de cada dia: quem a segura é o único que
+    pode ler as mesas livres e gravar vínculos naquele dia, então a verificação de
+    disponibilidade e a criação dos vínculos não podem ser intercaladas por outra
+    reserva. Os dias são travados em ordem (restaurante, data) para evitar deadlock.
+    Deve ser chamada dentro de transaction.atomic().
+    """
+    inicio, fim = intervalo_da_consulta(data, horario, restaurante.duracao_reserva)
+    dias = {(restaurante.id, dia) for dia in dias_do_intervalo(inicio, fim)}
+    if reserva_atual is not None and reserva_atual.inicio is not None:
+        dias.update((reserva_atual.restaurante_id, dia) for dia in reserva_atual.dias_ocupados())
+    dias.update(outros_dias)
+
+    travar_dias_restaurantes(dias)
+
+
+def travar_dias(restaurante_id, dias):
+    """Bloqueia (criando se preciso) as linhas do índice dos dias, em ordem de data"""
+    travar_dias_restaurantes((restaurante_id, dia) for dia in dias)
+
+
+def travar_dias_restaurantes(dias):
+    """
+    Bloqueia (criando se preciso) as linhas do índice de cada (restaurante_id,
+    data), em ordem de restaurante e data
+    """
+    for restaurante_id, dia in sorted(set(dias)):
+        ocupacao = OcupacaoDiaria.objects.select_for_update().filter(
+            restaurante_id=restaurante_id,
+            data=dia
+        ).first()
+        if ocupacao is None:
+            _criar_indice(restaurante_id, dia, bloquear=True)
+
+
+def gravar_mapas(restaurante_id, mapas):
+    """
+    Grava índices já calculados ({data: {mesa_id: bitmap}}), para escritas em lote
+    que não disparam os signals (bulk_create). Os dias devem estar travados.
+    """
+    from .capacidade import atualizar_capacidade
+
+    for data, mapa in mapas.items():
+        OcupacaoDiaria.objects.filter(
+            restaurante_id=restaurante_id,
+            data=data
+        ).update(mapa=_serializar_mapa(mapa), data_atualizacao=timezone.now())
+        atualizar_capacidade(restaurante_id, data)
+        ocupacao_alterada.send(sender=OcupacaoDiaria, restaurante_id=restaurante_id, data=data)
+
+
+def obter_mapas(restaurante_id, datas):
+    """
+    Retorna {data: {mesa_id: bitmap}} para as datas pedidas em uma consulta,
+    construindo os índices que ainda não existirem e liberando os bloqueios já
+    expirados dos dias lidos.
+    """
+    ocupacoes = OcupacaoDiaria.objects.filter(
+        restaurante_id=restaurante_id,
+        data__in=datas
+    ).only('data', 'mapa', 'proxima_expiracao')
+    
+    agora = timezone.now()
+    mapas = {}
+    for ocupacao in ocupacoes:
+        if ocupacao.proxima_expiracao is not None and ocupacao.proxima_expiracao <= agora:
+            from .bloqueios import liberar_bloqueios_expirados
+            liberar_bloqueios_expirados(restaurante_id, [ocupacao.data])
+            ocupacao.refresh_from_db(fields=['mapa'])
+        mapas[ocupacao.data] = _desserializar_mapa(ocupacao.mapa)
+
+    for data in datas:
+        if data not in mapas:
+            mapas[data] = _desserializar_mapa(_criar_indice(restaurante_id, data).mapa)
+
+    return mapas
+
+
+def liberar_bloqueios_vencidos(restaurantes, datas):
+    """
+    Libera os bloqueios já expirados dos dias lidos, para leituras que não passam
+    por obter_mapas (tabela de capacidade). `restaurantes` é um id ou um
+    queryset. Sem bloqueio vencido, custa uma consulta.
+    """
+    from .bloqueios import liberar_bloqueios_expirados
+
+    ocupacoes = OcupacaoDiaria.objects.filter(data__in=datas, proxima_expiracao__lte=timezone.now())
+    if isinstance(restaurantes, int):
+        ocupacoes = ocupacoes.filter(restaurante_id=restaurantes)
+    else:
+        ocupacoes = ocupacoes.filter(restaurante__in=restaurantes.values('pk'))
+
+    vencidos = {}
+    for restaurante_id, data in ocupacoes.values_list('restaurante_id', 'data'):
+        vencidos.setdefault(restaurante_id, []).append(data)
+    for restaurante_id, dias in vencidos.items():
+        liberar_bloqueios_expirados(restaurante_id, dias)
+
+
+def obter_mapa(restaurante_id, data):
+    """Retorna o índice do dia como {mesa_id: bitmap}, construindo-o se ainda não existir"""
+    return obter_mapas(restaurante_id, [data])[data]
+
+
+def _mesas_elegiveis(restaurante_id):
+    """Mesas ativas e disponíveis do restaurante, já com o restaurante (e sua duração de reserva)"""
+    return list(
+        Mesa.objects.filter(
+            restaurante_id=restaurante_id,
+            ativa=True,
+            status='disponivel'
+        ).select_related('restaurante')
+    )
+
+
+def _mesa_livre(mapas, mesa_id, mascaras):
+    """Indica se a mesa não tem slot ocupado em nenhuma das máscaras por dia"""
+    return not any(mapas[dia].get(mesa_id, 0) & mascara for dia, mascara in mascaras.items())
+
+
+def situacao_mesas(restaurante_id, data, horario, reserva_atual=None):
+    """
+    Retorna (mesas_livres, mapas, mascaras) para uma reserva no horário: as mesas
+    sem conflito, ordenadas por número, os índices dos dias envolvidos como
+    {data: {mesa_id: bitmap}} e as máscaras do intervalo consultado por dia.
+    As estratégias de alocação (reservas/alocacao.py) usam os mapas para escolher
+    entre as mesas livres.
+
+    Em caso de edição, `reserva_atual` tem suas próprias mesas desconsideradas.
+    """
+    mesas = _mesas_elegiveis(restaurante_id)
+    if not mesas:
+        return [], {}, {}
+
+    # Todas as mesas são do mesmo restaurante; a duração vem do select_related
+    duracao = mesas[0].restaurante.duracao_reserva
+    mascaras = mascaras_intervalo(*intervalo_da_consulta(data, horario, duracao))
+    mapas = obter_mapas(restaurante_id, list(mascaras))
+
+    if (
+        reserva_atual is not None
+        and reserva_atual.restaurante_id == int(restaurante_id)
+        and reserva_atual.status in Reserva.STATUS_ATIVOS
+        and reserva_atual.inicio is not None
+    ):
+        mascaras_atual = mascaras_intervalo(reserva_atual.inicio, reserva_atual.fim)
+        for mesa_id in reserva_atual.reservamesa_set.values_list('mesa_id', flat=True):
+            for dia, mascara in mascaras_atual.items():
+                if dia in mapas and mesa_id in mapas[dia]:
+                    mapas[dia][mesa_id] &= ~mascara
+
+    livres = [mesa for mesa in mesas if _mesa_livre(mapas, mesa.id, mascaras)]
+    return livres, mapas, mascaras
+
+
+def mesas_livres(restaurante_id, data, horario, reserva_atual=None):
+    """
+    Retorna as mesas ativas e disponíveis do restaurante sem conflito com uma
+    reserva no horário, ordenadas por número.
+
+    Em caso de edição, `reserva_atual` tem suas próprias mesas desconsideradas.
+    """
+    return situacao_mesas(restaurante_id, data, horario, reserva_atual)[0]
+
+
+def grade_disponibilidade(restaurante_id, data, horarios):
+    """
+    Conta as mesas livres em cada horário da lista, para o dia inteiro de uma vez.
+    Lê os índices envolvidos (o dia e, se alguma reserva passar da meia-noite, o
+    seguinte) e as mesas do restaurante uma única vez e resolve tudo em memória.
+
+    Retorna uma lista de (horario, quantidade_de_mesas_livres) e o total de mesas.
+    """
+    from .capacidade import slot_exato, mesas_livres_por_slot
+
+    # Horários no início de um slot são lidos direto da tabela de capacidade
+    slots = [slot_exato(horario) for horario in horarios]
+    if all(slot is not None for slot in slots):
+        total = Mesa.objects.filter(restaurante_id=restaurante_id, ativa=True, status='disponivel').count()
+        if not total:
+            return [(horario, 0) for horario in horarios], 0
+        livres = mesas_livres_por_slot(restaurante_id, data)
+        return [(horario, livres.get(slot, total)) for horario, slot in zip(horarios, slots)], total
+
+    mesas = _mesas_elegiveis(restaurante_id)
+    if not mesas:
+        return [(horario, 0) for horario in horarios], 0
+
+    duracao = mesas[0].restaurante.duracao_reserva
+    mascaras_por_horario = [
+        (horario, mascaras_intervalo(*intervalo_da_consulta(data, horario, duracao)))
+        for horario in horarios
+    ]
+    datas = sorted({dia for _, mascaras in mascaras_por_horario for dia in mascaras})
+    mapas = obter_mapas(restaurante_id, datas)
+
+    grade = []
+    for horario, mascaras in mascaras_por_horario:
+        livres = sum(1 for mesa in mesas if _mesa_livre(mapas, mesa.id, mascaras))
+        grade.append((horario, livres))
+
+    return grade, len(mesas)
+
+
+def anotar_mesas_livres(restaurantes, data, horario):
+    """
+    Anota cada restaurante do queryset com `mesas_livres` no horário, em uma única
+    consulta agregada (usada na busca entre restaurantes).
+    O intervalo consultado usa a duração de reserva de cada restaurante.
+
+    Horários no início de um slot são lidos da tabela de capacidade (uma linha por
+    restaurante); restaurantes sem linha no dia não têm reservas ativas e contam
+    todas as mesas elegíveis.
+    """
+    from .capacidade import slot_exato
+
+    slot = slot_exato(horario)
+    if slot is not None:
+        # A capacidade do dia também depende do índice do dia seguinte
+        liberar_bloqueios_vencidos(restaurantes, [data, data + timedelta(days=1)])
+        livres_no_slot = CapacidadeSlot.objects.filter(
+            restaurante=OuterRef('pk'),
+            data=data,
+            slot=slot
+        ).values('mesas_livres')[:1]
+        return restaurantes.annotate(
+            mesas_livres=Coalesce(
+                Subquery(livres_no_slot),
+                Count('mesas', filter=Q(mesas__ativa=True, mesas__status='disponivel'))
+            )
+        )
+
+    inicio = timezone.make_aware(datetime.combine(data, horario))
+    fim = ExpressionWrapper(
+        Value(inicio) + F('reserva__restaurante__duracao_reserva'),
+        output_field=DateTimeField()
+    )
+
+    # Sobreposição de intervalos; o limite inferior pela duração máxima deixa a
+    # consulta usar o índice (restaurante, inicio, fim)
+    mesas_ocupadas = ReservaMesa.objects.filter(
+        reserva__status__in=Reserva.STATUS_ATIVOS,
+        reserva__inicio__gte=inicio - DURACAO_RESERVA_MAXIMA,
+        reserva__inicio__lt=fim,
+        reserva__fim__gt=inicio
+    ).values('mesa_id')
+    mesas_bloqueadas = BloqueioMesa.mesas.through.objects.filter(
+        bloqueiomesa__expira_em__gt=timezone.now(),
+        bloqueiomesa__inicio__gte=inicio - DURACAO_RESERVA_MAXIMA,
+        bloqueiomesa__inicio__lt=ExpressionWrapper(
+            Value(inicio) + F('bloqueiomesa__restaurante__duracao_reserva'),
+            output_field=DateTimeField()
+        ),
+        bloqueiomesa__fim__gt=inicio
+    ).values('mesa_id')
+
+    return restaurantes.annotate(
+        mesas_livres=Count(
+            'mesas',
+            filter=(
+                Q(mesas__ativa=True, mesas__status='disponivel')
+                & ~Q(mesas__id__in=mesas_ocupadas)
+                & ~Q(mesas__id__in=mesas_bloqueadas)
+            )
+        )
+    )
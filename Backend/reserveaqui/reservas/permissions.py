@@ -1,4 +1,16 @@
 from rest_framework import permissions
+from usuarios.autorizacao import contexto_autorizacao
+
+
+def restaurantes_da_equipe(contexto, restaurantes):
+    """
+    Retorna os ids (entre `restaurantes`) dos restaurantes em que o usuário do
+    contexto gerencia reservas: admin_sistema, proprietário, admin_secundario ou
+    funcionário vinculado. Não consulta o banco.
+    """
+    if contexto.is_admin_sistema:
+        return set(restaurantes)
+    return set(restaurantes) & contexto.restaurantes_da_equipe()
 
 
 class IsOwnerOrAdminForReservas(permissions.BasePermission):
@@ -19,15 +31,11 @@ class IsOwnerOrAdminForReservas(permissions.BasePermission):
         - Usuário comum só pode ver e editar suas próprias reservas
         """
         # Verificar se é admin
-        is_admin = request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if is_admin:
+        if contexto_autorizacao(request).is_admin:
             return True
         
         # Usuário comum só pode acessar suas próprias reservas
-        return obj.usuario == request.user
+        return obj.usuario_id == request.user.id
 
 
 class IsAdminOrReadAuthenticated(permissions.BasePermission):
@@ -49,6 +57,4 @@ class IsAdminOrReadAuthenticated(permissions.BasePermission):
             return True
         
         # Escrita apenas para admins
-        return request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
+        return contexto_autorizacao(request).is_admin
@@ -3,11 +3,19 @@ Módulo de Relatórios de ocupação e movimentação.
 Endpoints de relatório de ocupação, horários mais movimentados e estatísticas por período.
 """
 
-from django.db.models import Count, Q, F, Case, When, DecimalField, Avg
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
 from django.utils import timezone
-from datetime import datetime, timedelta, date
+from datetime import timedelta
 from rest_framework import serializers
 from .models import Reserva, ReservaMesa
+from .agregacao import agregar_por_periodo, anotar_periodo
+from .resumo import fonte_de_reservas
+
+
+# Validade (segundos) das estatísticas do painel em cache
+TTL_ESTATISTICAS_PADRAO = 10
 
 
 class RelatorioOcupacaoSerializer(serializers.Serializer):
@@ -51,10 +59,12 @@ class RelatorioHelper:
     def gerar_relatorio_ocupacao(restaurante_id=None, data_inicio=None, data_fim=None):
         """
         Gera relatório de ocupação de mesas.
-        Calcula percentual de ocupação por restaurante/data.
+        Calcula percentual de ocupação por restaurante/data com três consultas
+        agrupadas sobre todo o período (mesas ativas, reservas e mesas ocupadas),
+        combinadas em memória. As contagens de reservas vêm do resumo diário
+        quando o período está coberto; as mesas distintas ocupadas, das reservas.
         """
         from restaurantes.models import Restaurante
-        from mesas.models import Mesa
         
         # Filtros padrão
         if not data_inicio:
@@ -62,59 +72,66 @@ class RelatorioHelper:
         if not data_fim:
             data_fim = data_inicio
         
-        # Buscar restaurantes
-        restaurantes_qs = Restaurante.objects.all()
+        # Restaurantes com mesas ativas
+        restaurantes_qs = Restaurante.objects.annotate(
+            total_mesas=Count('mesas', filter=Q(mesas__ativa=True))
+        ).filter(total_mesas__gt=0)
+        fonte = fonte_de_reservas(data_inicio, data_fim, restaurante_id)
+        vinculos_qs = ReservaMesa.objects.filter(
+            reserva__data_reserva__gte=data_inicio,
+            reserva__data_reserva__lte=data_fim,
+            reserva__status__in=['pendente', 'confirmada']
+        )
         if restaurante_id:
             restaurantes_qs = restaurantes_qs.filter(id=restaurante_id)
+            vinculos_qs = vinculos_qs.filter(reserva__restaurante_id=restaurante_id)
+        
+        # Reservas confirmadas e pendentes por (restaurante, data)
+        reservas = {
+            (linha['restaurante_id'], linha['periodo']): linha
+            for linha in agregar_por_periodo(
+                fonte.queryset.filter(status__in=['pendente', 'confirmada']),
+                'dia',
+                dimensoes=('restaurante_id',),
+                confirmadas=fonte.contar(Q(status='confirmada')),
+                pendentes=fonte.contar(Q(status='pendente'))
+            )
+        }
         
+        # Mesas distintas ocupadas por (restaurante, data)
+        mesas_ocupadas = {
+            (linha['reserva__restaurante_id'], linha['periodo']): linha['quantidade']
+            for linha in agregar_por_periodo(
+                vinculos_qs,
+                'dia',
+                dimensoes=('reserva__restaurante_id',),
+                campo_data='reserva__data_reserva',
+                campo_horario='reserva__horario',
+                quantidade=Count('mesa_id', distinct=True)
+            )
+        }
+        
+        datas = [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
         relatorio = []
         
-        for restaurante in restaurantes_qs:
-            # Calcular total de mesas
-            total_mesas = Mesa.objects.filter(restaurante=restaurante, ativa=True).count()
-            
-            if total_mesas == 0:
-                continue
-            
-            # Iterar sobre datas
-            data_atual = data_inicio
-            while data_atual <= data_fim:
-                # Contar reservas confirmadas para a data
-                reservas_confirmadas = Reserva.objects.filter(
-                    restaurante=restaurante,
-                    data_reserva=data_atual,
-                    status='confirmada'
-                ).count()
-                
-                # Contar mesas ocupadas (usar ReservaMesa)
-                mesas_ocupadas = ReservaMesa.objects.filter(
-                    reserva__restaurante=restaurante,
-                    reserva__data_reserva=data_atual,
-                    reserva__status__in=['pendente', 'confirmada']
-                ).values('mesa_id').distinct().count()
-                
-                # Contar reservas pendentes
-                reservas_pendentes = Reserva.objects.filter(
-                    restaurante=restaurante,
-                    data_reserva=data_atual,
-                    status='pendente'
-                ).count()
-                
-                # Calcular percentual
-                percentual = (mesas_ocupadas / total_mesas * 100) if total_mesas > 0 else 0
+        for restaurante_id_atual, restaurante_nome, total_mesas in restaurantes_qs.values_list(
+            'id', 'nome', 'total_mesas'
+        ):
+            for data_atual in datas:
+                chave = (restaurante_id_atual, data_atual)
+                contagem = reservas.get(chave, {})
+                ocupadas = mesas_ocupadas.get(chave, 0)
                 
                 relatorio.append({
-                    'restaurante_id': restaurante.id,
-                    'restaurante_nome': restaurante.nome,
+                    'restaurante_id': restaurante_id_atual,
+                    'restaurante_nome': restaurante_nome,
                     'data': data_atual,
                     'total_mesas': total_mesas,
-                    'mesas_ocupadas': mesas_ocupadas,
-                    'percentual_ocupacao': round(percentual, 2),
-                    'reservas_confirmadas': reservas_confirmadas,
-                    'reservas_pendentes': reservas_pendentes,
+                    'mesas_ocupadas': ocupadas,
+                    'percentual_ocupacao': round(ocupadas / total_mesas * 100, 2),
+                    'reservas_confirmadas': contagem.get('confirmadas', 0),
+                    'reservas_pendentes': contagem.get('pendentes', 0),
                 })
-                
-                data_atual += timedelta(days=1)
         
         return relatorio
     
@@ -122,7 +139,9 @@ class RelatorioHelper:
     def gerar_relatorio_horarios_movimentados(restaurante_id=None, data_inicio=None, data_fim=None, top=10):
         """
         Gera relatório de horários mais movimentados.
-        Identifica os horários com maior número de reservas.
+        Identifica os horários com maior número de reservas com um GROUP BY
+        (restaurante, horário) ordenado e limitado no banco, sobre o resumo
+        diário quando o período está coberto.
         """
         # Filtros padrão
         if not data_inicio:
@@ -130,58 +149,39 @@ class RelatorioHelper:
         if not data_fim:
             data_fim = timezone.now().date()
         
-        # Buscar reservas no período
-        reservas_qs = Reserva.objects.filter(
-            data_reserva__gte=data_inicio,
-            data_reserva__lte=data_fim,
-            status__in=['pendente', 'confirmada']
-        )
+        # Reservas (ou resumo) no período
+        fonte = fonte_de_reservas(data_inicio, data_fim, restaurante_id)
+        reservas_qs = fonte.queryset.filter(status__in=['pendente', 'confirmada'])
         
-        if restaurante_id:
-            reservas_qs = reservas_qs.filter(restaurante_id=restaurante_id)
-        
-        # Agrupar por restaurante e horário
-        horarios = {}
-        
-        for reserva in reservas_qs:
-            chave = (reserva.restaurante_id, reserva.restaurante.nome, reserva.horario)
-            
-            if chave not in horarios:
-                horarios[chave] = {
-                    'total_reservas': 0,
-                    'pessoas_total': 0,
-                    'confirmadas': 0,
-                }
-            
-            horarios[chave]['total_reservas'] += 1
-            horarios[chave]['pessoas_total'] += reserva.quantidade_pessoas
-            
-            if reserva.status == 'confirmada':
-                horarios[chave]['confirmadas'] += 1
+        # Agrupar por restaurante e horário; o nome vem do mesmo JOIN
+        horarios = anotar_periodo(
+            reservas_qs, 'horario', dimensoes=('restaurante_id', 'restaurante__nome')
+        ).annotate(
+            total_reservas=fonte.contar(),
+            pessoas_total=fonte.somar_pessoas(),
+            confirmadas=fonte.contar(Q(status='confirmada'))
+        ).order_by('-total_reservas', 'restaurante_id', 'periodo')[:top]
         
         # Montar resposta
-        relatorio = []
-        for (restaurante_id, restaurante_nome, horario), stats in horarios.items():
-            taxa_confirmacao = (stats['confirmadas'] / stats['total_reservas'] * 100) if stats['total_reservas'] > 0 else 0
-            
-            relatorio.append({
-                'restaurante_id': restaurante_id,
-                'restaurante_nome': restaurante_nome,
-                'horario': horario,
+        return [
+            {
+                'restaurante_id': stats['restaurante_id'],
+                'restaurante_nome': stats['restaurante__nome'],
+                'horario': stats['periodo'],
                 'total_reservas': stats['total_reservas'],
                 'pessoas_total': stats['pessoas_total'],
-                'taxa_confirmacao': round(taxa_confirmacao, 2),
-            })
-        
-        # Ordenar por total de reservas (decrescente) e retornar top
-        relatorio.sort(key=lambda x: x['total_reservas'], reverse=True)
-        return relatorio[:top]
+                'taxa_confirmacao': round(stats['confirmadas'] / stats['total_reservas'] * 100, 2),
+            }
+            for stats in horarios
+        ]
     
     @staticmethod
     def gerar_relatorio_estatisticas_periodo(restaurante_id=None, data_inicio=None, data_fim=None, tipo_periodo='dia'):
         """
-        Gera estatísticas por período (dia, semana, mês).
+        Gera estatísticas por período (dia, semana, mês, hora ou dia da semana).
         Calcula: total, confirmadas, canceladas, pessoas, ticket médio, taxa de cancelamento.
+        Os períodos vêm agrupados e em ordem cronológica do banco (reservas/agregacao.py),
+        a partir do resumo diário quando o período está coberto.
         """
         # Filtros padrão
         if not data_inicio:
@@ -189,60 +189,27 @@ class RelatorioHelper:
         if not data_fim:
             data_fim = timezone.now().date()
         
-        # Buscar reservas
-        reservas_qs = Reserva.objects.filter(
-            data_reserva__gte=data_inicio,
-            data_reserva__lte=data_fim
-        )
-        
-        if restaurante_id:
-            reservas_qs = reservas_qs.filter(restaurante_id=restaurante_id)
+        # Reservas (ou resumo) no período
+        fonte = fonte_de_reservas(data_inicio, data_fim, restaurante_id)
         
-        # Agrupar por período
-        stats_por_periodo = {}
-        
-        for reserva in reservas_qs:
-            if tipo_periodo == 'dia':
-                periodo_chave = str(reserva.data_reserva)
-                periodo_label = reserva.data_reserva.strftime('%d/%m/%Y')
-            elif tipo_periodo == 'semana':
-                ano, semana, _ = reserva.data_reserva.isocalendar()
-                periodo_chave = f"{ano}-W{semana:02d}"
-                periodo_label = f"Semana {semana}/{ano}"
-            elif tipo_periodo == 'mes':
-                periodo_chave = reserva.data_reserva.strftime('%Y-%m')
-                periodo_label = reserva.data_reserva.strftime('%m/%Y')
-            else:
-                continue
-            
-            if periodo_chave not in stats_por_periodo:
-                stats_por_periodo[periodo_chave] = {
-                    'periodo': periodo_label,
-                    'total': 0,
-                    'confirmadas': 0,
-                    'canceladas': 0,
-                    'pendentes': 0,
-                    'pessoas': 0,
-                }
-            
-            stats_por_periodo[periodo_chave]['total'] += 1
-            stats_por_periodo[periodo_chave]['pessoas'] += reserva.quantidade_pessoas
-            
-            if reserva.status == 'confirmada':
-                stats_por_periodo[periodo_chave]['confirmadas'] += 1
-            elif reserva.status == 'cancelada':
-                stats_por_periodo[periodo_chave]['canceladas'] += 1
-            elif reserva.status == 'pendente':
-                stats_por_periodo[periodo_chave]['pendentes'] += 1
+        serie = agregar_por_periodo(
+            fonte.queryset,
+            tipo_periodo,
+            total=fonte.contar(),
+            confirmadas=fonte.contar(Q(status='confirmada')),
+            canceladas=fonte.contar(Q(status='cancelada')),
+            pendentes=fonte.contar(Q(status='pendente')),
+            pessoas=fonte.somar_pessoas()
+        )
         
         # Montar resposta final
         relatorio = []
-        for periodo_chave, stats in stats_por_periodo.items():
+        for stats in serie:
             ticket_medio = (stats['pessoas'] / stats['confirmadas']) if stats['confirmadas'] > 0 else 0
-            taxa_cancelamento = (stats['canceladas'] / stats['total'] * 100) if stats['total'] > 0 else 0
+            taxa_cancelamento = stats['canceladas'] / stats['total'] * 100
             
             relatorio.append({
-                'periodo': stats['periodo'],
+                'periodo': stats['rotulo'],
                 'total_reservas': stats['total'],
                 'reservas_confirmadas': stats['confirmadas'],
                 'reservas_canceladas': stats['canceladas'],
@@ -252,6 +219,59 @@ class RelatorioHelper:
                 'taxa_cancelamento': round(taxa_cancelamento, 2),
             })
         
-        # Ordenar por período
-        relatorio.sort(key=lambda x: x['periodo'])
         return relatorio
+    
+    @staticmethod
+    def gerar_estatisticas(restaurante_id=None, data_inicio=None, data_fim=None, tipo_periodo=None):
+        """
+        Gera as estatísticas do painel (total, por status e de hoje) com uma
+        consulta de agregados condicionais, no restaurante e período informados.
+        Com tipo_periodo, inclui a `serie` por status em cada período.
+        """
+        reservas_qs = Reserva.objects.all()
+        if restaurante_id:
+            reservas_qs = reservas_qs.filter(restaurante_id=restaurante_id)
+        if data_inicio:
+            reservas_qs = reservas_qs.filter(data_reserva__gte=data_inicio)
+        if data_fim:
+            reservas_qs = reservas_qs.filter(data_reserva__lte=data_fim)
+        
+        por_status = {
+            f'{status_reserva}s': Count('id', filter=Q(status=status_reserva))
+            for status_reserva, _ in Reserva.STATUS_CHOICES
+        }
+        stats = reservas_qs.aggregate(
+            total_reservas=Count('id'),
+            **por_status,
+            hoje=Count('id', filter=Q(data_reserva=timezone.now().date()))
+        )
+        
+        if tipo_periodo:
+            stats['tipo_periodo'] = tipo_periodo
+            stats['serie'] = [
+                {
+                    'periodo': linha['rotulo'],
+                    'total_reservas': linha['total_reservas'],
+                    **{campo: linha[campo] for campo in por_status},
+                }
+                for linha in agregar_por_periodo(reservas_qs, tipo_periodo, total_reservas=Count('id'), **por_status)
+            ]
+        
+        return stats
+    
+    @staticmethod
+    def estatisticas_em_cache(restaurante_id=None, data_inicio=None, data_fim=None, tipo_periodo=None):
+        """
+        gerar_estatisticas guardado no cache por escopo (restaurante, período,
+        tipo_periodo e dia atual) por settings.RESERVAS_TTL_ESTATISTICAS segundos,
+        para que painéis consultando a cada poucos segundos não repitam a agregação.
+        """
+        escopo = (restaurante_id, data_inicio, data_fim, tipo_periodo, timezone.now().date())
+        chave = 'reservas:estatisticas:' + ':'.join('' if parte is None else str(parte) for parte in escopo)
+        stats = cache.get(chave)
+        if stats is None:
+            stats = RelatorioHelper.gerar_estatisticas(restaurante_id, data_inicio, data_fim, tipo_periodo)
+            ttl = getattr(settings, 'RESERVAS_TTL_ESTATISTICAS', TTL_ESTATISTICAS_PADRAO)
+            if ttl:
+                cache.set(chave, stats, ttl)
+        return stats
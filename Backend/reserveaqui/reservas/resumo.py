@@ -0,0 +1,213 @@
+"""
+Resumo diário de reservas (ResumoDiario) para os relatórios.
+
+Para cada restaurante, dia, horário e status, guarda a quantidade de reservas e
+de pessoas. Os relatórios leem o resumo quando todos os (restaurante, dia) do
+período pedido estão completos (ParticaoResumo) e as reservas em caso contrário.
+
+Manutenção, por partição (restaurante, dia):
+- cada escrita em reservas (save, exclusão, transições de status e importação)
+  informa, na mesma transação, as linhas que tirou e as que somou ao resumo;
+  as variações são aplicadas às linhas (horário, status) afetadas. A primeira
+  escrita de um restaurante em um dia ainda sem partição agrega só as reservas
+  desse restaurante no dia;
+- o comando `reconstruir_resumo` reagrega um período inteiro, para todos os
+  restaurantes, e é o único que reconstrói dias completos.
+
+A linha da partição é travada (SELECT ... FOR UPDATE) durante a atualização,
+então escritas simultâneas no mesmo restaurante e dia não gravam o resumo ao
+mesmo tempo; escritas em outros restaurantes ou dias não se esperam.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from restaurantes.models import Restaurante
+
+from .models import Reserva, ResumoDiario, ParticaoResumo
+
+
+CAMPOS_RESUMO = ['restaurante_id', 'data_reserva', 'horario', 'status']
+
+
+def _agregar(filtro):
+    """Linhas do resumo calculadas a partir das reservas que atendem ao filtro"""
+    linhas = Reserva.objects.filter(filtro).values(*CAMPOS_RESUMO).annotate(
+        quantidade=Count('id'),
+        pessoas=Sum('quantidade_pessoas')
+    ).order_by()
+    return [ResumoDiario(**linha) for linha in linhas]
+
+
+def _reagregar(filtro):
+    """Regrava o resumo das reservas do filtro; retorna as linhas gravadas"""
+    ResumoDiario.objects.filter(filtro).delete()
+    return len(ResumoDiario.objects.bulk_create(_agregar(filtro)))
+
+
+def _travar_particao(restaurante_id, data):
+    """Trava a partição do restaurante no dia, criando-a se preciso; retorna (partição, criada)"""
+    return ParticaoResumo.objects.select_for_update().get_or_create(restaurante_id=restaurante_id, data=data)
+
+
+def _aplicar_variacoes(restaurante_id, data, variacoes):
+    """
+    Soma {(horario, status): [quantidade, pessoas]} às linhas do resumo do dia.
+    Retorna False, sem gravar, se alguma linha ficaria negativa (resumo divergente).
+    """
+    linhas = {
+        (linha.horario, linha.status): linha
+        for linha in ResumoDiario.objects.filter(
+            restaurante_id=restaurante_id,
+            data_reserva=data,
+            horario__in={horario for horario, _ in variacoes}
+        )
+    }
+    novas, alteradas, vazias = [], [], []
+    for (horario, status), (quantidade, pessoas) in variacoes.items():
+        linha = linhas.get((horario, status)) or ResumoDiario(
+            restaurante_id=restaurante_id, data_reserva=data, horario=horario, status=status
+        )
+        linha.quantidade += quantidade
+        linha.pessoas += pessoas
+        if linha.quantidade < 0 or linha.pessoas < 0:
+            return False
+        if linha.pk is None:
+            if linha.quantidade:
+                novas.append(linha)
+        elif linha.quantidade:
+            alteradas.append(linha)
+        else:
+            vazias.append(linha.pk)
+
+    if novas:
+        ResumoDiario.objects.bulk_create(novas)
+    if alteradas:
+        ResumoDiario.objects.bulk_update(alteradas, ['quantidade', 'pessoas'])
+    if vazias:
+        ResumoDiario.objects.filter(pk__in=vazias).delete()
+    return True
+
+
+def reconstruir_particao(data):
+    """
+    Reconstrói o resumo do dia para todos os restaurantes e marca suas partições
+    como completas; retorna as linhas gravadas.
+    """
+    with transaction.atomic():
+        ParticaoResumo.objects.bulk_create(
+            [ParticaoResumo(restaurante_id=restaurante_id, data=data)
+             for restaurante_id in Restaurante.objects.values_list('id', flat=True)],
+            ignore_conflicts=True
+        )
+        # Mesma ordem de trava das escritas: (restaurante, dia)
+        particoes = ParticaoResumo.objects.select_for_update().filter(data=data).order_by('restaurante_id')
+        list(particoes.values_list('id', flat=True))
+        linhas = _reagregar(Q(data_reserva=data))
+        particoes.update(data_atualizacao=timezone.now())
+    return linhas
+
+
+def atualizar_resumos(adicionadas=(), removidas=(), dias=()):
+    """
+    Aplica ao resumo uma escrita em reservas. Deve rodar na transação da escrita,
+    para que o resumo mude junto com as reservas.
+
+    adicionadas/removidas: linhas (restaurante_id, data_reserva, horario, status,
+    quantidade_pessoas) somadas ou tiradas pela escrita (Reserva.linha_resumo);
+    dias: (restaurante_id, data) cujas linhas anteriores são desconhecidas, reagregados.
+    """
+    campo_data = Reserva._meta.get_field('data_reserva')
+    campo_horario = Reserva._meta.get_field('horario')
+    variacoes = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for sinal, linhas in ((1, adicionadas), (-1, removidas)):
+        for restaurante_id, data, horario, status, pessoas in linhas:
+            # Instâncias ainda não relidas podem trazer data e horário como texto
+            chave_dia = (restaurante_id, campo_data.to_python(data))
+            variacao = variacoes[chave_dia][campo_horario.to_python(horario), status]
+            variacao[0] += sinal
+            variacao[1] += sinal * (pessoas or 0)
+    reagregar = set(dias)
+
+    particoes = {
+        chave for chave in set(variacoes) | reagregar
+        if chave[0] is not None and chave[1] is not None
+    }
+    for restaurante_id, data in sorted(particoes):
+        alteradas = {
+            chave: variacao for chave, variacao in variacoes.get((restaurante_id, data), {}).items()
+            if variacao != [0, 0]
+        }
+        if not alteradas and (restaurante_id, data) not in reagregar:
+            continue
+        # Sem savepoint próprio: um erro desfaz a escrita inteira
+        with transaction.atomic(savepoint=False):
+            _, criada = _travar_particao(restaurante_id, data)
+            if (
+                criada
+                or (restaurante_id, data) in reagregar
+                or not _aplicar_variacoes(restaurante_id, data, alteradas)
+            ):
+                _reagregar(Q(restaurante_id=restaurante_id, data_reserva=data))
+
+
+def periodo_coberto(data_inicio, data_fim, restaurante_id=None):
+    """
+    Indica se todos os dias do período têm o resumo completo em todos os
+    restaurantes (ou no informado)
+    """
+    dias = (data_fim - data_inicio).days + 1
+    if dias <= 0:
+        return False
+    restaurantes = Restaurante.objects.all()
+    if restaurante_id:
+        restaurantes = restaurantes.filter(pk=restaurante_id)
+    return not restaurantes.annotate(
+        dias_cobertos=Count(
+            'particoes_resumo',
+            filter=Q(particoes_resumo__data__gte=data_inicio, particoes_resumo__data__lte=data_fim)
+        )
+    ).filter(dias_cobertos__lt=dias).exists()
+
+
+def dias_do_periodo(data_inicio, data_fim):
+    """Datas de data_inicio a data_fim, inclusive"""
+    return [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
+
+
+class FonteReservas:
+    """
+    Tabela lida por um relatório: as reservas ou o resumo. As duas têm
+    restaurante, data_reserva, horario e status; muda só como contar reservas e
+    somar pessoas.
+    """
+
+    def __init__(self, queryset, usa_resumo):
+        self.queryset = queryset
+        self.usa_resumo = usa_resumo
+
+    def contar(self, filtro=None):
+        """Expressão da quantidade de reservas (opcionalmente só as do filtro)"""
+        if self.usa_resumo:
+            return Coalesce(Sum('quantidade', filter=filtro), Value(0))
+        return Count('id', filter=filtro)
+
+    def somar_pessoas(self, filtro=None):
+        """Expressão do total de pessoas"""
+        campo = 'pessoas' if self.usa_resumo else 'quantidade_pessoas'
+        return Coalesce(Sum(campo, filter=filtro), Value(0))
+
+
+def fonte_de_reservas(data_inicio, data_fim, restaurante_id=None):
+    """Fonte do período (o resumo, se todos os dias estiverem completos), já filtrada"""
+    usa_resumo = periodo_coberto(data_inicio, data_fim, restaurante_id)
+    modelo = ResumoDiario if usa_resumo else Reserva
+    queryset = modelo.objects.filter(data_reserva__gte=data_inicio, data_reserva__lte=data_fim)
+    if restaurante_id:
+        queryset = queryset.filter(restaurante_id=restaurante_id)
+    return FonteReservas(queryset, usa_resumo)
@@ -1,9 +1,12 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta, datetime
 import math
-from .models import Reserva, ReservaMesa, Notificacao
-from mesas.models import Mesa
+from .models import Reserva, ReservaMesa, Notificacao, BloqueioMesa
+from .ocupacao import situacao_mesas, travar_alocacao, atualizar_ocupacao, gravar_mapas
+from .bloqueios import ttl_bloqueio, liberar_bloqueios_usuario, dias_dos_bloqueios
+from .alocacao import obter_estrategia
 from restaurantes.models import Restaurante
 from .reports import (
     RelatorioOcupacaoSerializer,
@@ -35,12 +38,12 @@ class ReservaSerializer(serializers.ModelSerializer):
         model = Reserva
         fields = [
             'id', 'restaurante', 'restaurante_nome', 'usuario', 'usuario_nome',
-            'data_reserva', 'horario', 'quantidade_pessoas',
+            'data_reserva', 'horario', 'inicio', 'fim', 'quantidade_pessoas',
             'nome_cliente', 'telefone_cliente', 'email_cliente', 'observacoes',
             'status', 'mesas_vinculadas', 'mesas_necessarias', 'pode_cancelar',
             'data_criacao', 'data_atualizacao'
         ]
-        read_only_fields = ['id', 'usuario', 'status', 'data_criacao', 'data_atualizacao']
+        read_only_fields = ['id', 'usuario', 'status', 'inicio', 'fim', 'data_criacao', 'data_atualizacao']
     
     def get_mesas_necessarias(self, obj):
         """Calcula quantas mesas são necessárias"""
@@ -65,18 +68,27 @@ class ReservaListSerializer(serializers.ModelSerializer):
         ]
     
     def get_total_mesas(self, obj):
-        """Retorna total de mesas alocadas"""
+        """Retorna total de mesas alocadas (a reserva cancelada libera as suas)"""
+        if obj.status == 'cancelada':
+            return 0
         return obj.mesas.count()
 
 
 class ReservaCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer para criação e atualização de reservas com validações"""
     
+    bloqueio = serializers.UUIDField(
+        write_only=True,
+        required=False,
+        help_text='Token de um bloqueio de mesas (as mesas bloqueadas são usadas na criação)'
+    )
+    
     class Meta:
         model = Reserva
         fields = [
             'restaurante', 'data_reserva', 'horario', 'quantidade_pessoas',
-            'nome_cliente', 'telefone_cliente', 'email_cliente', 'observacoes'
+            'nome_cliente', 'telefone_cliente', 'email_cliente', 'observacoes',
+            'bloqueio'
         ]
     
     def validate(self, data):
@@ -115,74 +127,179 @@ class ReservaCreateUpdateSerializer(serializers.ModelSerializer):
         """
         Verifica se há mesas disponíveis para a reserva.
         Impedir reservas de uma mesma mesa no mesmo horário
+        Retorna (mesas escolhidas, índices dos dias, máscaras do intervalo).
         """
         # Calcular quantas mesas são necessárias
         mesas_necessarias = math.ceil(quantidade_pessoas / 4)
         
-        # Buscar reservas conflitantes (±1h)
-        data_hora = datetime.combine(data_reserva, horario)
-        inicio = (data_hora - timedelta(hours=1)).time()
-        fim = (data_hora + timedelta(hours=1)).time()
+        # Consultar o índice de ocupação (sobreposição com o intervalo da reserva)
+        mesas_disponiveis, mapas, mascaras = situacao_mesas(
+            restaurante.id, data_reserva, horario, reserva_atual=reserva_atual
+        )
         
-        # Buscar reservas conflitantes
-        reservas_conflitantes = Reserva.objects.filter(
-            restaurante=restaurante,
-            data_reserva=data_reserva,
-            horario__gte=inicio,
-            horario__lte=fim,
-            status__in=['pendente', 'confirmada']
+        if len(mesas_disponiveis) < mesas_necessarias:
+            raise serializers.ValidationError(
+                f'Não há mesas suficientes disponíveis. '
+                f'Necessárias: {mesas_necessarias}, Disponíveis: {len(mesas_disponiveis)}'
+            )
+        
+        # A estratégia configurada escolhe quais das mesas livres alocar
+        escolhidas = obter_estrategia().escolher(mesas_disponiveis, mesas_necessarias, mapas, mascaras)
+        return escolhidas, mapas, mascaras
+    
+    def _vincular_mesas(self, reserva, mesas, mapas=None, mascaras=None):
+        """
+        Grava os vínculos em um INSERT e o índice dos dias uma vez (bulk_create não
+        dispara os signals). Com os índices lidos sob a trava (`mapas`), o índice
+        novo é calculado em memória; sem eles, é recalculado a partir do banco.
+        Os vínculos ficam em cache na reserva para a resposta não reler as mesas.
+        """
+        vinculos = ReservaMesa.objects.bulk_create(
+            [ReservaMesa(reserva=reserva, mesa=mesa) for mesa in mesas]
         )
         
-        # Excluir a reserva atual em caso de edição
-        if reserva_atual:
-            reservas_conflitantes = reservas_conflitantes.exclude(id=reserva_atual.id)
+        if mapas is None:
+            for data in reserva.dias_ocupados():
+                atualizar_ocupacao(reserva.restaurante_id, data)
+        else:
+            for mesa in mesas:
+                for dia, mascara in mascaras.items():
+                    mapas[dia][mesa.id] = mapas[dia].get(mesa.id, 0) | mascara
+            gravar_mapas(reserva.restaurante_id, {dia: mapas[dia] for dia in mascaras})
         
-        # Obter IDs das mesas ocupadas
-        mesas_ocupadas_ids = ReservaMesa.objects.filter(
-            reserva__in=reservas_conflitantes
-        ).values_list('mesa_id', flat=True)
+        vinculos_em_cache = reserva.reservamesa_set.all()
+        vinculos_em_cache._result_cache = vinculos
+        vinculos_em_cache._prefetch_done = True
+        reserva._prefetched_objects_cache = {'reservamesa_set': vinculos_em_cache}
+    
+    def _realocar_mesas(self, reserva, restaurante, data_reserva, horario, quantidade_pessoas):
+        """
+        Ajusta as mesas da reserva editada gravando só a diferença: mantém as mesas
+        atuais que continuam livres e elegíveis no novo horário, e só busca (pela
+        estratégia configurada) as que faltarem. Vínculos que sobram são
+        reaproveitados para as mesas novas (UPDATE) e os demais removidos ou criados.
+        Deve ser chamado com a alocação travada.
         
-        # Buscar mesas disponíveis
-        mesas_disponiveis = Mesa.objects.filter(
-            restaurante=restaurante,
-            ativa=True,
-            status='disponivel'
-        ).exclude(id__in=mesas_ocupadas_ids)
+        Retorna None se nenhuma mesa foi acrescentada; senão (mapas, mascaras, mesas
+        da reserva), para que o índice dos dias seja gravado sem novo recálculo.
+        """
+        mesas_necessarias = math.ceil(quantidade_pessoas / 4)
+        vinculos = {vinculo.mesa_id: vinculo for vinculo in reserva.reservamesa_set.all()}
+        livres, mapas, mascaras = situacao_mesas(
+            restaurante.id, data_reserva, horario, reserva_atual=reserva
+        )
         
-        if mesas_disponiveis.count() < mesas_necessarias:
+        if len(livres) < mesas_necessarias:
             raise serializers.ValidationError(
                 f'Não há mesas suficientes disponíveis. '
-                f'Necessárias: {mesas_necessarias}, Disponíveis: {mesas_disponiveis.count()}'
+                f'Necessárias: {mesas_necessarias}, Disponíveis: {len(livres)}'
+            )
+        
+        estrategia = obter_estrategia()
+        mantidas = [mesa for mesa in livres if mesa.id in vinculos]
+        if len(mantidas) >= mesas_necessarias:
+            mantidas = estrategia.escolher(mantidas, mesas_necessarias, mapas, mascaras)
+            novas = []
+        else:
+            candidatas = [mesa for mesa in livres if mesa.id not in vinculos]
+            novas = estrategia.escolher(candidatas, mesas_necessarias - len(mantidas), mapas, mascaras)
+        
+        mantidas_ids = {mesa.id for mesa in mantidas}
+        sobras = [vinculo for mesa_id, vinculo in vinculos.items() if mesa_id not in mantidas_ids]
+        
+        # Vínculos que sobraram passam para as mesas novas (sem signals: o índice
+        # é gravado pelo chamador ou pelo signal da reserva)
+        reaproveitados = list(zip(sobras, novas))
+        for vinculo, mesa in reaproveitados:
+            vinculo.mesa = mesa
+        if reaproveitados:
+            ReservaMesa.objects.bulk_update([vinculo for vinculo, _ in reaproveitados], ['mesa'])
+        
+        if len(sobras) > len(novas):
+            ReservaMesa.objects.filter(pk__in=[vinculo.pk for vinculo in sobras[len(novas):]]).delete()
+        elif len(novas) > len(sobras):
+            ReservaMesa.objects.bulk_create(
+                [ReservaMesa(reserva=reserva, mesa=mesa) for mesa in novas[len(sobras):]]
             )
         
-        return list(mesas_disponiveis[:mesas_necessarias])
+        if not novas:
+            return None
+        return mapas, mascaras, mantidas + novas
+    
+    def _mesas_do_bloqueio(self, token, restaurante, data_reserva, horario, quantidade_pessoas):
+        """
+        Consome o bloqueio e retorna as mesas bloqueadas a usar na reserva.
+        Retorna None se o bloqueio expirou ou não cobre mais a reserva (ex: mais
+        pessoas ou mesa desativada); nesse caso a disponibilidade é verificada de novo.
+        Deve ser chamado com a alocação travada.
+        """
+        bloqueio = BloqueioMesa.objects.filter(token=token).first()
+        request = self.context.get('request')
+        usuario = request.user if request and request.user.is_authenticated else None
+        
+        if bloqueio is None or (bloqueio.usuario_id is not None and bloqueio.usuario != usuario):
+            raise serializers.ValidationError({'bloqueio': 'Bloqueio não encontrado.'})
+        if (bloqueio.restaurante_id, bloqueio.data_reserva, bloqueio.horario) != (restaurante.id, data_reserva, horario):
+            raise serializers.ValidationError(
+                {'bloqueio': 'O bloqueio é de outro restaurante, data ou horário.'}
+            )
+        
+        mesas = list(bloqueio.mesas.filter(ativa=True, status='disponivel').order_by('numero'))
+        expirado = bloqueio.expirado()
+        dias = bloqueio.dias_ocupados()
+        bloqueio.delete()
+        
+        mesas_necessarias = math.ceil(quantidade_pessoas / 4)
+        if expirado or len(mesas) < mesas_necessarias:
+            # Devolve as mesas ao índice antes da nova verificação
+            for dia in dias:
+                atualizar_ocupacao(restaurante.id, dia)
+            return None
+        
+        # Os vínculos criados em seguida recalculam o índice sem o bloqueio
+        return mesas[:mesas_necessarias]
     
     def create(self, validated_data):
         """
         Cria uma reserva e aloca automaticamente as mesas necessárias.
+        Com um bloqueio válido, usa as mesas bloqueadas sem nova busca.
         Validação para criar reservas
         """
         restaurante = validated_data['restaurante']
         data_reserva = validated_data['data_reserva']
         horario = validated_data['horario']
         quantidade_pessoas = validated_data['quantidade_pessoas']
-        
-        # Verificar disponibilidade e obter mesas disponíveis
-        mesas_disponiveis = self._verificar_disponibilidade(
-            restaurante, data_reserva, horario, quantidade_pessoas
-        )
+        token = validated_data.pop('bloqueio', None)
         
         # Adicionar usuário se autenticado
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             validated_data['usuario'] = request.user
         
-        # Criar a reserva
-        reserva = Reserva.objects.create(**validated_data)
-        
-        # Alocar mesas automaticamente
-        for mesa in mesas_disponiveis:
-            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        # Verificação e alocação sob a trava do dia, para que duas reservas
+        # simultâneas não fiquem com a mesma mesa
+        with transaction.atomic():
+            travar_alocacao(restaurante, data_reserva, horario)
+            
+            mesas_disponiveis = mapas = mascaras = None
+            if token:
+                mesas_disponiveis = self._mesas_do_bloqueio(
+                    token, restaurante, data_reserva, horario, quantidade_pessoas
+                )
+            
+            # Verificar disponibilidade e obter mesas disponíveis
+            if mesas_disponiveis is None:
+                mesas_disponiveis, mapas, mascaras = self._verificar_disponibilidade(
+                    restaurante, data_reserva, horario, quantidade_pessoas
+                )
+            
+            # Criar a reserva (campos já validados pelo serializer; o full_clean
+            # só repetiria a antecedência e consultaria as chaves estrangeiras)
+            reserva = Reserva(**validated_data)
+            reserva.save(skip_validation=True)
+            
+            # Alocar mesas automaticamente
+            self._vincular_mesas(reserva, mesas_disponiveis, mapas, mascaras)
         
         return reserva
     
@@ -191,6 +308,8 @@ class ReservaCreateUpdateSerializer(serializers.ModelSerializer):
         Atualiza uma reserva com validações.
         Validação para editar reservas
         """
+        validated_data.pop('bloqueio', None)
+        
         # Validar se a reserva pode ser editada
         if instance.status in ['cancelada', 'concluida']:
             raise serializers.ValidationError(
@@ -208,37 +327,102 @@ class ReservaCreateUpdateSerializer(serializers.ModelSerializer):
                 'Não é possível editar reservas com menos de 2 horas de antecedência.'
             )
         
-        # Se houver mudança em data, horário ou quantidade de pessoas, realocar mesas
-        mudou_parametros = (
-            'data_reserva' in validated_data or 
-            'horario' in validated_data or 
-            'quantidade_pessoas' in validated_data
+        # Se houver mudança em restaurante, data, horário ou quantidade de pessoas, realocar mesas
+        mudou_parametros = any(
+            campo in validated_data
+            for campo in ('restaurante', 'data_reserva', 'horario', 'quantidade_pessoas')
         )
         
-        if mudou_parametros:
-            restaurante = validated_data.get('restaurante', instance.restaurante)
-            data_reserva = validated_data.get('data_reserva', instance.data_reserva)
-            horario = validated_data.get('horario', instance.horario)
-            quantidade_pessoas = validated_data.get('quantidade_pessoas', instance.quantidade_pessoas)
+        with transaction.atomic():
+            realocacao = None
+            if mudou_parametros:
+                restaurante = validated_data.get('restaurante', instance.restaurante)
+                data_reserva = validated_data.get('data_reserva', instance.data_reserva)
+                horario = validated_data.get('horario', instance.horario)
+                quantidade_pessoas = validated_data.get('quantidade_pessoas', instance.quantidade_pessoas)
+                
+                travar_alocacao(restaurante, data_reserva, horario, reserva_atual=instance)
+                realocacao = self._realocar_mesas(instance, restaurante, data_reserva, horario, quantidade_pessoas)
             
-            # Verificar disponibilidade
-            mesas_disponiveis = self._verificar_disponibilidade(
-                restaurante, data_reserva, horario, quantidade_pessoas, instance
-            )
+            # Atualizar campos
+            intervalo_anterior = (instance.restaurante_id, instance.inicio, instance.fim, instance.quantidade_pessoas)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
             
-            # Remover mesas antigas
-            ReservaMesa.objects.filter(reserva=instance).delete()
+            instance.save()
             
-            # Alocar novas mesas
-            for mesa in mesas_disponiveis:
-                ReservaMesa.objects.create(reserva=instance, mesa=mesa)
+            # Mesmo intervalo e mesmas pessoas: o signal da reserva não recalcula o
+            # índice, então as mesas acrescentadas são marcadas nos índices já lidos
+            # sob a trava
+            intervalo_atual = (instance.restaurante_id, instance.inicio, instance.fim, instance.quantidade_pessoas)
+            if realocacao and intervalo_anterior == intervalo_atual:
+                mapas, mascaras, mesas = realocacao
+                for mesa in mesas:
+                    for dia, mascara in mascaras.items():
+                        mapas[dia][mesa.id] = mapas[dia].get(mesa.id, 0) | mascara
+                gravar_mapas(instance.restaurante_id, {dia: mapas[dia] for dia in mascaras})
+        return instance
+
+class BloqueioMesaSerializer(serializers.ModelSerializer):
+    """Serializer de leitura de um bloqueio de mesas"""
+    mesas = serializers.SlugRelatedField(many=True, read_only=True, slug_field='numero')
+    
+    class Meta:
+        model = BloqueioMesa
+        fields = [
+            'token', 'restaurante', 'data_reserva', 'horario', 'quantidade_pessoas',
+            'mesas', 'expira_em'
+        ]
+        read_only_fields = fields
+
+
+class BloqueioMesaCreateSerializer(ReservaCreateUpdateSerializer):
+    """
+    Bloqueia as mesas de uma futura reserva por alguns minutos, com as mesmas
+    validações e a mesma alocação da criação de reservas.
+    """
+    
+    bloqueio = None
+    
+    class Meta:
+        model = BloqueioMesa
+        fields = ['restaurante', 'data_reserva', 'horario', 'quantidade_pessoas']
+    
+    def create(self, validated_data):
+        restaurante = validated_data['restaurante']
+        data_reserva = validated_data['data_reserva']
+        horario = validated_data['horario']
         
-        # Atualizar campos
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+        request = self.context.get('request')
+        usuario = request.user if request and request.user.is_authenticated else None
         
-        instance.save()
-        return instance
+        with transaction.atomic():
+            if usuario is None:
+                travar_alocacao(restaurante, data_reserva, horario)
+            else:
+                # Um bloqueio por usuário: o novo substitui os anteriores, sob as
+                # travas dos dias de todos eles
+                travar_alocacao(
+                    restaurante, data_reserva, horario,
+                    outros_dias=dias_dos_bloqueios(BloqueioMesa.objects.filter(usuario=usuario))
+                )
+                liberar_bloqueios_usuario(usuario)
+                validated_data['usuario'] = usuario
+            
+            mesas, _, _ = self._verificar_disponibilidade(
+                restaurante, data_reserva, horario, validated_data['quantidade_pessoas']
+            )
+            
+            bloqueio = BloqueioMesa(expira_em=timezone.now() + ttl_bloqueio(), **validated_data)
+            bloqueio.definir_intervalo()
+            bloqueio.save()
+            bloqueio.mesas.set(mesas)
+            
+            for dia in bloqueio.dias_ocupados():
+                atualizar_ocupacao(restaurante.id, dia)
+        
+        return bloqueio
+
 
 class NotificacaoSerializer(serializers.ModelSerializer):
     """Serializer para notificações de reservas"""
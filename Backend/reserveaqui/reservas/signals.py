@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Enviado sempre que o índice de ocupação de um restaurante em um dia é
+# regravado (reservas/ocupacao.py), com os argumentos restaurante_id e data.
+# Quem guarda dados derivados da ocupação (cache de disponibilidade, etc.)
+# escuta este signal em vez dos signals de cada modelo.
+ocupacao_alterada = Signal()
@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.db import IntegrityError
+from django.core.cache import cache
 from datetime import timedelta, date, time
 from usuarios.models import Usuario
 from restaurantes.models import Restaurante
@@ -359,3 +360,1854 @@ class ReservaMesaModelTest(TestCase):
         self.assertEqual(self.reserva.mesas.count(), 2)
         self.assertIn(self.mesa, self.reserva.mesas.all())
         self.assertIn(mesa2, self.reserva.mesas.all())
+
+
+class OcupacaoDiariaTest(TestCase):
+    """Testes para o índice de ocupação por restaurante e dia"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=3
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesa1, self.mesa2, self.mesa3 = Mesa.objects.filter(restaurante=self.restaurante)
+    
+    def _criar_reserva(self, horario, mesas, status='pendente'):
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=self.data,
+            horario=horario,
+            quantidade_pessoas=4 * len(mesas),
+            nome_cliente='Cliente',
+            telefone_cliente='999999999',
+            status=status
+        )
+        for mesa in mesas:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        return reserva
+    
+    def _livres(self, horario):
+        from .ocupacao import mesas_livres
+        return [mesa.numero for mesa in mesas_livres(self.restaurante.id, self.data, horario)]
+    
+    def test_intervalo_calculado_pela_duracao_do_restaurante(self):
+        """Teste que inicio/fim da reserva usam a duração de reserva do restaurante"""
+        self.restaurante.duracao_reserva = timedelta(minutes=90)
+        self.restaurante.save()
+        
+        reserva = self._criar_reserva(time(19, 0), [self.mesa1])
+        
+        self.assertEqual(timezone.localtime(reserva.inicio).time(), time(19, 0))
+        self.assertEqual(reserva.fim - reserva.inicio, timedelta(minutes=90))
+    
+    def test_mascaras_intervalo_dividem_por_dia(self):
+        """Teste que um intervalo que passa da meia-noite marca os dois dias"""
+        from .ocupacao import mascaras_intervalo, intervalo_da_consulta, SLOTS_POR_DIA
+        mascaras = mascaras_intervalo(*intervalo_da_consulta(self.data, time(23, 30), timedelta(hours=1)))
+        
+        seguinte = self.data + timedelta(days=1)
+        self.assertEqual(set(mascaras), {self.data, seguinte})
+        self.assertEqual(mascaras[self.data], 0b11 << (SLOTS_POR_DIA - 2))
+        self.assertEqual(mascaras[seguinte], 0b11)
+    
+    def test_mesas_livres_respeita_intervalo(self):
+        """Teste que a mesa só fica ocupada quando os intervalos se sobrepõem"""
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        
+        self.assertEqual(self._livres(time(19, 30)), [2, 3])
+        self.assertEqual(self._livres(time(18, 15)), [2, 3])
+        # Intervalos semiabertos: terminar às 19:00 ou começar às 20:00 não conflita
+        self.assertEqual(self._livres(time(18, 0)), [1, 2, 3])
+        self.assertEqual(self._livres(time(20, 0)), [1, 2, 3])
+    
+    def test_duracao_maior_amplia_conflito(self):
+        """Teste que restaurantes com duração maior bloqueiam a mesa por mais tempo"""
+        self.restaurante.duracao_reserva = timedelta(hours=2)
+        self.restaurante.save()
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        
+        self.assertEqual(self._livres(time(20, 30)), [2, 3])
+        self.assertEqual(self._livres(time(17, 15)), [2, 3])
+        self.assertEqual(self._livres(time(21, 0)), [1, 2, 3])
+    
+    def test_reserva_passando_da_meia_noite(self):
+        """Teste que uma reserva às 23:30 ocupa a mesa no início do dia seguinte"""
+        from .ocupacao import mesas_livres
+        self._criar_reserva(time(23, 30), [self.mesa1])
+        seguinte = self.data + timedelta(days=1)
+        
+        livres = mesas_livres(self.restaurante.id, seguinte, time(0, 15))
+        self.assertEqual([mesa.numero for mesa in livres], [2, 3])
+        livres = mesas_livres(self.restaurante.id, seguinte, time(0, 30))
+        self.assertEqual([mesa.numero for mesa in livres], [1, 2, 3])
+    
+    def test_indice_atualizado_ao_cancelar(self):
+        """Teste que cancelar a reserva libera a mesa no índice"""
+        reserva = self._criar_reserva(time(19, 0), [self.mesa1, self.mesa2])
+        self.assertEqual(self._livres(time(19, 0)), [3])
+        
+        reserva.status = 'cancelada'
+        reserva.save(skip_validation=True)
+        
+        self.assertEqual(self._livres(time(19, 0)), [1, 2, 3])
+    
+    def test_indice_atualizado_ao_remover_mesas(self):
+        """Teste que remover vínculos de mesa libera a mesa no índice"""
+        reserva = self._criar_reserva(time(19, 0), [self.mesa1])
+        self.assertEqual(self._livres(time(19, 0)), [2, 3])
+        
+        ReservaMesa.objects.filter(reserva=reserva).delete()
+        
+        self.assertEqual(self._livres(time(19, 0)), [1, 2, 3])
+    
+    def test_indice_atualizado_ao_mudar_horario(self):
+        """Teste que editar o horário move a ocupação no índice"""
+        reserva = Reserva.objects.get(pk=self._criar_reserva(time(19, 0), [self.mesa1]).pk)
+        
+        reserva.horario = time(22, 0)
+        reserva.save(skip_validation=True)
+        
+        self.assertEqual(self._livres(time(19, 0)), [1, 2, 3])
+        self.assertEqual(self._livres(time(22, 0)), [2, 3])
+    
+    def test_indice_construido_sob_demanda(self):
+        """Teste que o índice é criado na primeira leitura do dia"""
+        from .models import OcupacaoDiaria
+        self.assertFalse(OcupacaoDiaria.objects.filter(restaurante=self.restaurante, data=self.data).exists())
+        
+        self.assertEqual(self._livres(time(12, 0)), [1, 2, 3])
+        
+        self.assertTrue(OcupacaoDiaria.objects.filter(restaurante=self.restaurante, data=self.data).exists())
+    
+    def test_travar_alocacao_cria_indice_com_reservas_existentes(self):
+        """Teste que a trava de alocação cria o índice do dia já com as reservas existentes"""
+        from django.db import transaction
+        from .models import OcupacaoDiaria
+        from .ocupacao import travar_alocacao, obter_mapa
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        OcupacaoDiaria.objects.all().delete()
+        
+        with transaction.atomic():
+            travar_alocacao(self.restaurante, self.data, time(19, 30))
+        
+        self.assertTrue(OcupacaoDiaria.objects.filter(restaurante=self.restaurante, data=self.data).exists())
+        self.assertIn(self.mesa1.id, obter_mapa(self.restaurante.id, self.data))
+    
+    def test_excluir_restaurante_com_reservas(self):
+        """Teste que excluir um restaurante com reservas não recria o índice"""
+        from .models import OcupacaoDiaria
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        
+        self.restaurante.delete()
+        
+        self.assertEqual(OcupacaoDiaria.objects.count(), 0)
+
+
+class CapacidadeSlotTest(TestCase):
+    """Testes para a tabela de capacidade por slot"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=3,
+            duracao_reserva=timedelta(hours=2)
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesa1, self.mesa2, self.mesa3 = Mesa.objects.filter(restaurante=self.restaurante)
+    
+    def _criar_reserva(self, horario, mesas, data=None):
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=data or self.data,
+            horario=horario,
+            quantidade_pessoas=4 * len(mesas),
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        for mesa in mesas:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        return reserva
+    
+    def _capacidade(self, horario, data=None):
+        from .models import CapacidadeSlot
+        from .capacidade import slot_exato
+        capacidade = CapacidadeSlot.objects.get(
+            restaurante=self.restaurante,
+            data=data or self.data,
+            slot=slot_exato(horario)
+        )
+        return capacidade.mesas_livres, capacidade.mesas_ocupadas, capacidade.pessoas
+    
+    def test_capacidade_atualizada_ao_criar_e_cancelar(self):
+        """Teste que as linhas do dia acompanham a criação e o cancelamento de reservas"""
+        reserva = self._criar_reserva(time(19, 0), [self.mesa1, self.mesa2])
+        
+        self.assertEqual(self._capacidade(time(19, 0)), (1, 2, 8))
+        self.assertEqual(self._capacidade(time(18, 0)), (1, 0, 0))
+        self.assertEqual(self._capacidade(time(21, 0)), (3, 0, 0))
+        
+        reserva.status = 'cancelada'
+        reserva.save(skip_validation=True)
+        
+        self.assertEqual(self._capacidade(time(19, 0)), (3, 0, 0))
+        self.assertEqual(self._capacidade(time(18, 0)), (3, 0, 0))
+    
+    def test_reserva_no_inicio_do_dia_atualiza_dia_anterior(self):
+        """Teste que uma reserva à 00:30 reduz as mesas livres no fim do dia anterior"""
+        self._criar_reserva(time(0, 30), [self.mesa1], data=self.data + timedelta(days=1))
+        
+        self.assertEqual(self._capacidade(time(23, 0))[0], 2)
+        self.assertEqual(self._capacidade(time(22, 30))[0], 3)
+    
+    def test_capacidade_atualizada_ao_desativar_mesa(self):
+        """Teste que desativar uma mesa recalcula os dias já materializados"""
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        
+        self.mesa3.ativa = False
+        self.mesa3.save()
+        
+        self.assertEqual(self._capacidade(time(19, 0))[0], 1)
+        self.assertEqual(self._capacidade(time(12, 0))[0], 2)
+    
+    def test_verificar_capacidade_sem_divergencias(self):
+        """Teste que as linhas mantidas incrementalmente batem com o recalculado"""
+        from .capacidade import verificar_capacidade
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        self._criar_reserva(time(20, 15), [self.mesa2, self.mesa3])
+        self._criar_reserva(time(1, 0), [self.mesa2], data=self.data + timedelta(days=1))
+        
+        self.assertEqual(verificar_capacidade(self.restaurante.id, self.data), [])
+        self.assertEqual(verificar_capacidade(self.restaurante.id, self.data + timedelta(days=1)), [])
+    
+    def test_comandos_verificar_e_reconstruir(self):
+        """Teste que a verificação aponta linhas apagadas e o --corrigir as reconstrói"""
+        from io import StringIO
+        from django.core.management import call_command, CommandError
+        from .models import CapacidadeSlot
+        self._criar_reserva(time(19, 0), [self.mesa1])
+        CapacidadeSlot.objects.filter(restaurante=self.restaurante, slot=76).delete()
+        
+        with self.assertRaises(CommandError):
+            call_command('verificar_capacidade', stdout=StringIO())
+        
+        call_command('verificar_capacidade', corrigir=True, stdout=StringIO())
+        self.assertEqual(self._capacidade(time(19, 0)), (2, 1, 4))
+        
+        CapacidadeSlot.objects.all().delete()
+        call_command('reconstruir_capacidade', stdout=StringIO())
+        self.assertEqual(self._capacidade(time(19, 0)), (2, 1, 4))
+    
+    def test_busca_usa_capacidade_do_slot(self):
+        """Teste que a anotação da busca lê a capacidade em horários de início de slot"""
+        from .ocupacao import anotar_mesas_livres
+        self._criar_reserva(time(19, 0), [self.mesa1, self.mesa2])
+        restaurantes = Restaurante.objects.filter(pk=self.restaurante.pk)
+        
+        self.assertEqual(anotar_mesas_livres(restaurantes, self.data, time(19, 30)).get().mesas_livres, 1)
+        self.assertEqual(anotar_mesas_livres(restaurantes, self.data, time(19, 40)).get().mesas_livres, 1)
+        outro_dia = self.data + timedelta(days=3)
+        self.assertEqual(anotar_mesas_livres(restaurantes, outro_dia, time(19, 30)).get().mesas_livres, 3)
+
+
+class TransicaoReservaTest(TestCase):
+    """Testes para as transições de status por UPDATE condicional"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=3
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesa1 = Mesa.objects.filter(restaurante=self.restaurante).first()
+    
+    def _criar_reserva(self, data=None, horario=time(19, 0), status='pendente'):
+        reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=data or self.data,
+            horario=horario,
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999',
+            status=status
+        )
+        reserva.save(skip_validation=True)
+        ReservaMesa.objects.create(reserva=reserva, mesa=self.mesa1)
+        return reserva
+    
+    def test_confirmar_reserva_proxima(self):
+        """Teste que confirmar não aplica a regra de antecedência da criação"""
+        from .transicoes import aplicar_transicao
+        agora = timezone.localtime() + timedelta(minutes=30)
+        reserva = self._criar_reserva(data=agora.date(), horario=agora.time().replace(second=0, microsecond=0))
+        
+        confirmada = aplicar_transicao(reserva, 'confirmar')
+        
+        self.assertEqual(confirmada.status, 'confirmada')
+        self.assertEqual(Reserva.objects.get(pk=reserva.pk).status, 'confirmada')
+        self.assertGreaterEqual(confirmada.data_atualizacao, reserva.data_atualizacao)
+    
+    def test_transicao_repetida_falha(self):
+        """Teste que a segunda confirmação simultânea encontra a reserva já confirmada"""
+        from .transicoes import aplicar_transicao, TransicaoInvalida
+        reserva = self._criar_reserva()
+        desatualizada = Reserva.objects.get(pk=reserva.pk)
+        
+        aplicar_transicao(reserva, 'confirmar')
+        
+        with self.assertRaisesMessage(TransicaoInvalida, 'Esta reserva já está confirmada.'):
+            aplicar_transicao(desatualizada, 'confirmar')
+    
+    def test_concluir_exige_confirmada(self):
+        """Teste que só reservas confirmadas podem ser concluídas"""
+        from .transicoes import aplicar_transicao, TransicaoInvalida
+        reserva = self._criar_reserva()
+        
+        with self.assertRaisesMessage(TransicaoInvalida, 'Apenas reservas confirmadas podem ser concluídas.'):
+            aplicar_transicao(reserva, 'concluir')
+        
+        aplicar_transicao(reserva, 'confirmar')
+        self.assertEqual(aplicar_transicao(reserva, 'concluir').status, 'concluida')
+    
+    def test_cancelar_libera_mesas_no_indice(self):
+        """Teste que cancelar devolve as mesas ao índice sem remover os vínculos"""
+        from .ocupacao import mesas_livres
+        from .transicoes import aplicar_transicao
+        reserva = self._criar_reserva()
+        self.assertNotIn(self.mesa1, mesas_livres(self.restaurante.id, self.data, time(19, 0)))
+        
+        aplicar_transicao(reserva, 'cancelar')
+        
+        self.assertIn(self.mesa1, mesas_livres(self.restaurante.id, self.data, time(19, 0)))
+        self.assertTrue(ReservaMesa.objects.filter(reserva=reserva).exists())
+    
+    def test_listagem_nao_conta_mesas_de_cancelada(self):
+        """Teste que a listagem mostra zero mesas para a reserva cancelada, como antes de manter os vínculos"""
+        from .serializers import ReservaListSerializer
+        from .transicoes import aplicar_transicao
+        reserva = self._criar_reserva()
+        self.assertEqual(ReservaListSerializer(reserva).data['total_mesas'], 1)
+        
+        cancelada = aplicar_transicao(reserva, 'cancelar')
+        
+        self.assertEqual(ReservaListSerializer(cancelada).data['total_mesas'], 0)
+
+
+class CriacaoReservaConsultasTest(TestCase):
+    """Orçamento de consultas da criação de reservas pela API"""
+    
+    # Restaurante, trava do dia, mesas elegíveis, índice, INSERT da reserva,
+    # partição e linhas do resumo diário, INSERT dos vínculos, índice e capacidade
+    # por slot, e os savepoints
+    CONSULTAS_CRIACAO = 22
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        self.cliente = Usuario.objects.create_user(
+            email='cliente@test.com',
+            nome='Cliente',
+            username='cliente_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.cliente,
+            quantidade_mesas=10
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente)
+        
+        # Primeira reserva do dia cria o índice e a capacidade do dia
+        self._reservar('12:00', 2)
+    
+    def _reservar(self, horario, pessoas):
+        return self.client.post('/api/reservas/', {
+            'restaurante': self.restaurante.id,
+            'data_reserva': str(self.data),
+            'horario': horario,
+            'quantidade_pessoas': pessoas,
+            'nome_cliente': 'Cliente',
+            'telefone_cliente': '999999999'
+        }, format='json')
+    
+    def test_consultas_independem_do_tamanho_do_grupo(self):
+        """Teste que criar uma reserva custa o mesmo número de consultas para 1 ou 3 mesas"""
+        with self.assertNumQueries(self.CONSULTAS_CRIACAO):
+            response = self._reservar('19:00', 4)
+        self.assertEqual(len(response.data['reserva']['mesas_vinculadas']), 1)
+        
+        with self.assertNumQueries(self.CONSULTAS_CRIACAO):
+            response = self._reservar('21:00', 12)
+        self.assertEqual(len(response.data['reserva']['mesas_vinculadas']), 3)
+    
+    def test_indice_e_vinculos_consistentes(self):
+        """Teste que o índice gravado em memória bate com o recalculado a partir dos vínculos"""
+        from .ocupacao import obter_mapa, calcular_mapa
+        self._reservar('19:00', 12)
+        
+        self.assertEqual(obter_mapa(self.restaurante.id, self.data), calcular_mapa(self.restaurante.id, self.data))
+        self.assertEqual(ReservaMesa.objects.count(), 4)
+
+
+class EstrategiaAlocacaoTest(TestCase):
+    """Testes para as estratégias de alocação de mesas"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=4
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesas = list(Mesa.objects.filter(restaurante=self.restaurante).order_by('numero'))
+    
+    def _criar_reserva(self, horario, mesas):
+        reserva = Reserva.objects.create(
+            restaurante=self.restaurante,
+            data_reserva=self.data,
+            horario=horario,
+            quantidade_pessoas=4 * len(mesas),
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        for mesa in mesas:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        return reserva
+    
+    def _escolher(self, nome, horario, quantidade):
+        from .alocacao import obter_estrategia
+        from .ocupacao import situacao_mesas
+        livres, mapas, mascaras = situacao_mesas(self.restaurante.id, self.data, horario)
+        escolhidas = obter_estrategia(nome).escolher(livres, quantidade, mapas, mascaras)
+        return [mesa.numero for mesa in escolhidas]
+    
+    def test_melhor_encaixe_evita_sobras_curtas(self):
+        """Teste que o melhor encaixe cola a reserva em outra em vez de deixar sobra inútil"""
+        # Mesa 1 termina às 19:00; mesa 2 começa às 20:30 (sobra de 30 min às 20:00)
+        self._criar_reserva(time(18, 0), [self.mesas[0]])
+        self._criar_reserva(time(20, 30), [self.mesas[1]])
+        
+        self.assertEqual(self._escolher('primeiro_livre', time(19, 0), 1), [1])
+        self.assertEqual(self._escolher('melhor_encaixe', time(19, 0), 1), [1])
+        self.assertEqual(self._escolher('melhor_encaixe', time(19, 30), 1), [2])
+    
+    def test_bloco_contiguo_usa_menor_bloco_suficiente(self):
+        """Teste que o bloco contíguo escolhe mesas vizinhas"""
+        self._criar_reserva(time(19, 0), [self.mesas[1]])
+        
+        self.assertEqual(self._escolher('primeiro_livre', time(19, 0), 2), [1, 3])
+        self.assertEqual(self._escolher('bloco_contiguo', time(19, 0), 2), [3, 4])
+        self.assertEqual(self._escolher('bloco_contiguo', time(19, 0), 1), [1])
+    
+    def test_estrategia_configurada_no_serializer(self):
+        """Teste que a criação de reservas usa a estratégia de settings"""
+        from django.test import override_settings
+        from .serializers import ReservaCreateUpdateSerializer
+        self._criar_reserva(time(19, 0), [self.mesas[1]])
+        
+        with override_settings(RESERVAS_ESTRATEGIA_ALOCACAO='bloco_contiguo'):
+            serializer = ReservaCreateUpdateSerializer(data={
+                'restaurante': self.restaurante.id,
+                'data_reserva': self.data,
+                'horario': '19:00',
+                'quantidade_pessoas': 8,
+                'nome_cliente': 'Grupo',
+                'telefone_cliente': '999999999'
+            })
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            reserva = serializer.save()
+        
+        self.assertEqual(sorted(reserva.mesas.values_list('numero', flat=True)), [3, 4])
+    
+    def test_estrategia_desconhecida(self):
+        """Teste que uma estratégia inexistente gera erro claro"""
+        from .alocacao import obter_estrategia
+        with self.assertRaises(ValueError):
+            obter_estrategia('aleatoria')
+
+
+class ImportacaoReservasTest(TestCase):
+    """Testes para a importação de reservas em lote"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        self.outro = Usuario.objects.create_user(
+            email='outro@test.com',
+            nome='Outro',
+            username='outro_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=3
+        )
+        self.restaurante_alheio = Restaurante.objects.create(
+            nome='Restaurante Alheio',
+            endereco='Rua Outra, 1',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='alheio@restaurant.com',
+            proprietario=self.outro,
+            quantidade_mesas=3
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.proprietario)
+    
+    def _linha(self, horario='19:00', pessoas=4, restaurante=None, data=None):
+        return {
+            'restaurante': (restaurante or self.restaurante).id,
+            'data_reserva': str(data or self.data),
+            'horario': horario,
+            'quantidade_pessoas': pessoas,
+            'nome_cliente': 'Cliente Parceiro',
+            'telefone_cliente': '999999999'
+        }
+    
+    def test_importar_json_com_resultado_por_linha(self):
+        """Teste que cada linha tem seu resultado e as válidas são gravadas com mesas"""
+        linhas = [
+            self._linha(pessoas=6),
+            self._linha(data=timezone.now().date() - timedelta(days=1)),
+            self._linha(restaurante=self.restaurante_alheio),
+            self._linha(pessoas=0),
+        ]
+        response = self.client.post('/api/reservas/importar/', linhas, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['importadas'], 1)
+        self.assertEqual(response.data['falhas'], 3)
+        
+        resultados = response.data['resultados']
+        self.assertEqual([r['linha'] for r in resultados], [1, 2, 3, 4])
+        self.assertTrue(resultados[0]['sucesso'])
+        self.assertEqual(resultados[0]['mesas'], [1, 2])
+        self.assertIn('restaurante', resultados[2]['erros'])
+        self.assertIn('quantidade_pessoas', resultados[3]['erros'])
+        
+        reserva = Reserva.objects.get(pk=resultados[0]['reserva_id'])
+        self.assertEqual(reserva.fim - reserva.inicio, self.restaurante.duracao_reserva)
+        self.assertEqual(reserva.mesas.count(), 2)
+    
+    def test_importar_csv_respeita_capacidade_e_atualiza_indice(self):
+        """Teste que o lote aloca em memória sem passar da capacidade e mantém o índice"""
+        from .ocupacao import mesas_livres, calcular_mapa, obter_mapa
+        csv_texto = (
+            'restaurante,data_reserva,horario,quantidade_pessoas,nome_cliente,telefone_cliente\n'
+            f'{self.restaurante.id},{self.data},19:00,8,Grupo,999999999\n'
+            f'{self.restaurante.id},{self.data},19:30,4,Casal,999999999\n'
+            f'{self.restaurante.id},{self.data},19:30,4,Atrasado,999999999\n'
+            f'{self.restaurante.id},{self.data},21:00,12,Festa,999999999\n'
+        )
+        response = self.client.post('/api/reservas/importar/', csv_texto, content_type='text/csv')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [r['sucesso'] for r in response.data['resultados']],
+            [True, True, False, True]
+        )
+        self.assertEqual(ReservaMesa.objects.filter(reserva__restaurante=self.restaurante).count(), 6)
+        self.assertEqual(obter_mapa(self.restaurante.id, self.data), calcular_mapa(self.restaurante.id, self.data))
+        self.assertEqual(mesas_livres(self.restaurante.id, self.data, time(19, 0)), [])
+    
+    def test_importar_corpo_invalido(self):
+        """Teste que o corpo precisa ser uma lista de reservas"""
+        response = self.client.post('/api/reservas/importar/', {'reserva': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        
+        response = self.client.post('/api/reservas/importar/', [], format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BloqueioMesaTest(TestCase):
+    """Testes para os bloqueios temporários de mesas"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        self.cliente = Usuario.objects.create_user(
+            email='cliente@test.com',
+            nome='Cliente',
+            username='cliente_test',
+            password='SenhaForte123'
+        )
+        self.outro_cliente = Usuario.objects.create_user(
+            email='outro@test.com',
+            nome='Outro Cliente',
+            username='outro_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.outro_cliente,
+            quantidade_mesas=3
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente)
+    
+    def _dados(self, pessoas=8, horario='19:00'):
+        return {
+            'restaurante': self.restaurante.id,
+            'data_reserva': str(self.data),
+            'horario': horario,
+            'quantidade_pessoas': pessoas
+        }
+    
+    def _livres(self, horario=time(19, 0)):
+        from .ocupacao import mesas_livres
+        return [mesa.numero for mesa in mesas_livres(self.restaurante.id, self.data, horario)]
+    
+    def _bloquear(self, pessoas=8):
+        response = self.client.post('/api/reservas/bloquear/', self._dados(pessoas), format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['bloqueio']
+    
+    def test_bloqueio_ocupa_mesas(self):
+        """Teste que as mesas bloqueadas aparecem ocupadas para os demais"""
+        bloqueio = self._bloquear()
+        
+        self.assertEqual(len(bloqueio['mesas']), 2)
+        self.assertEqual(len(self._livres()), 1)
+        
+        self.client.force_authenticate(self.outro_cliente)
+        response = self.client.post('/api/reservas/bloquear/', self._dados(), format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_reserva_usa_mesas_do_bloqueio(self):
+        """Teste que a reserva criada com o token usa as mesas bloqueadas e consome o bloqueio"""
+        from .models import BloqueioMesa
+        bloqueio = self._bloquear()
+        
+        dados = dict(self._dados(), nome_cliente='Cliente', telefone_cliente='999999999', bloqueio=bloqueio['token'])
+        response = self.client.post('/api/reservas/', dados, format='json')
+        
+        self.assertEqual(response.status_code, 201)
+        mesas = sorted(vinculo['mesa_numero'] for vinculo in response.data['reserva']['mesas_vinculadas'])
+        self.assertEqual(mesas, sorted(bloqueio['mesas']))
+        self.assertFalse(BloqueioMesa.objects.exists())
+        self.assertEqual(len(self._livres()), 1)
+    
+    def test_bloqueio_de_outro_usuario_recusado(self):
+        """Teste que o token de outro usuário não é aceito na criação"""
+        bloqueio = self._bloquear()
+        
+        self.client.force_authenticate(self.outro_cliente)
+        dados = dict(self._dados(), nome_cliente='Outro', telefone_cliente='999999999', bloqueio=bloqueio['token'])
+        response = self.client.post('/api/reservas/', dados, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('bloqueio', response.data)
+    
+    def test_bloqueio_expirado_liberado_na_leitura(self):
+        """Teste que um bloqueio vencido deixa de ocupar as mesas e é apagado ao ler o dia"""
+        from .models import BloqueioMesa, OcupacaoDiaria
+        self._bloquear()
+        vencido = timezone.now() - timedelta(seconds=1)
+        BloqueioMesa.objects.update(expira_em=vencido)
+        OcupacaoDiaria.objects.update(proxima_expiracao=vencido)
+        
+        self.assertEqual(self._livres(), [1, 2, 3])
+        self.assertFalse(BloqueioMesa.objects.exists())
+    
+    def test_bloqueio_expirado_liberado_na_capacidade_e_no_cache(self):
+        """Teste que grade, busca e disponibilidade em cache deixam de contar um bloqueio vencido"""
+        from django.core.cache import caches
+        from .models import BloqueioMesa, OcupacaoDiaria
+        caches['disponibilidade'].clear()
+        self._bloquear()
+        
+        def consultar():
+            busca = self.client.get('/api/restaurantes/busca_disponibilidade/', {
+                'cidade': 'Test City',
+                'data': str(self.data),
+                'horario': '19:00',
+                'quantidade_pessoas': 4
+            }).data['results'][0]['mesas_livres']
+            grade = self.client.get('/api/mesas/grade_disponibilidade/', {
+                'restaurante_id': self.restaurante.id,
+                'data': str(self.data),
+                'quantidade_pessoas': 4,
+                'horario_inicio': '19:00',
+                'horario_fim': '19:00'
+            }).data['horarios'][0]['mesas_disponiveis']
+            disponibilidade = self.client.get('/api/mesas/disponibilidade/', {
+                'restaurante_id': self.restaurante.id,
+                'data': str(self.data),
+                'horario': '19:00'
+            }).data['total_mesas_disponiveis']
+            return grade, busca, disponibilidade
+        
+        self.assertEqual(consultar(), (1, 1, 1))
+        
+        vencido = timezone.now() - timedelta(seconds=1)
+        BloqueioMesa.objects.update(expira_em=vencido)
+        OcupacaoDiaria.objects.update(proxima_expiracao=vencido)
+        caches['disponibilidade'].clear()
+        self.assertEqual(consultar(), (3, 3, 3))
+        self.assertFalse(BloqueioMesa.objects.exists())
+    
+    def test_disponibilidade_em_cache_expira_com_o_bloqueio(self):
+        """Teste que a disponibilidade de um dia com bloqueio fica em cache só até a expiração"""
+        from .cache_disponibilidade import _validade
+        from .models import BloqueioMesa
+        self._bloquear()
+        
+        validade = _validade(self.restaurante.id, [self.data])
+        expira_em = BloqueioMesa.objects.get().expira_em
+        self.assertAlmostEqual(validade, (expira_em - timezone.now()).total_seconds(), delta=2)
+    
+    def test_novo_bloqueio_substitui_anterior(self):
+        """Teste que cada usuário mantém um bloqueio por vez"""
+        from .models import BloqueioMesa
+        self._bloquear()
+        self._bloquear(pessoas=4)
+        
+        self.assertEqual(BloqueioMesa.objects.count(), 1)
+        self.assertEqual(len(self._livres()), 2)
+    
+    def test_liberar_bloqueio_e_comando(self):
+        """Teste que liberar o bloqueio devolve as mesas e o comando apaga os expirados"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import BloqueioMesa
+        bloqueio = self._bloquear()
+        
+        response = self.client.post('/api/reservas/liberar_bloqueio/', {'token': bloqueio['token']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._livres(), [1, 2, 3])
+        
+        self._bloquear()
+        BloqueioMesa.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        call_command('liberar_bloqueios_expirados', stdout=StringIO())
+        self.assertFalse(BloqueioMesa.objects.exists())
+
+
+class TransicaoEmLoteTest(TestCase):
+    """Testes para as ações em lote da equipe (confirmar_lote, cancelar_lote, concluir_lote)"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        self.cliente = Usuario.objects.create_user(
+            email='cliente@test.com',
+            nome='Cliente',
+            username='cliente_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=10
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesas = list(Mesa.objects.filter(restaurante=self.restaurante).order_by('numero'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.proprietario)
+    
+    def _criar_reservas(self, quantidade, status='pendente'):
+        reservas = []
+        for indice in range(quantidade):
+            reserva = Reserva(
+                restaurante=self.restaurante,
+                usuario=self.cliente,
+                data_reserva=self.data,
+                horario=time(19, 0),
+                quantidade_pessoas=4,
+                nome_cliente='Cliente',
+                telefone_cliente='999999999',
+                status=status
+            )
+            reserva.save(skip_validation=True)
+            ReservaMesa.objects.create(reserva=reserva, mesa=self.mesas[indice])
+            reservas.append(reserva)
+        return reservas
+    
+    def test_confirmar_lote_com_resultado_por_id(self):
+        """Teste que o lote confirma as pendentes e informa as falhas de cada id"""
+        pendentes = self._criar_reservas(2)
+        confirmada = self._criar_reservas(1, status='confirmada')[0]
+        ids = [reserva.id for reserva in pendentes] + [confirmada.id, 99999]
+        
+        response = self.client.post('/api/reservas/confirmar_lote/', {'ids': ids}, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['total'], response.data['sucesso'], response.data['falhas']), (4, 2, 2))
+        resultados = {resultado['id']: resultado for resultado in response.data['resultados']}
+        self.assertEqual(resultados[pendentes[0].id]['status'], 'confirmada')
+        self.assertEqual(resultados[confirmada.id]['erro'], 'Esta reserva já está confirmada.')
+        self.assertEqual(resultados[99999]['erro'], 'Reserva não encontrada.')
+        self.assertEqual(Reserva.objects.filter(status='confirmada').count(), 3)
+    
+    def test_confirmar_lote_notifica_clientes(self):
+        """Teste que cada reserva confirmada gera a notificação com as mesas"""
+        from .models import Notificacao
+        reservas = self._criar_reservas(3)
+        
+        self.client.post('/api/reservas/confirmar_lote/', {'ids': [r.id for r in reservas]}, format='json')
+        
+        notificacoes = Notificacao.objects.filter(usuario=self.cliente, tipo='confirmacao')
+        self.assertEqual(notificacoes.count(), 3)
+        self.assertTrue(notificacoes.get(reserva=reservas[1]).mensagem.endswith('Mesas: 2'))
+    
+    def test_consultas_independem_do_tamanho_do_lote(self):
+        """Teste que o número de consultas não cresce com a quantidade de ids"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        reservas = self._criar_reservas(8)
+        # Carrega os vínculos do usuário no cache antes das medições
+        self.client.get('/api/reservas/')
+        
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.post('/api/reservas/confirmar_lote/', {'ids': [reservas[0].id]}, format='json')
+        with CaptureQueriesContext(connection) as muitas:
+            self.client.post('/api/reservas/confirmar_lote/', {'ids': [r.id for r in reservas[1:]]}, format='json')
+        
+        self.assertEqual(len(poucas), len(muitas))
+    
+    def test_cliente_sem_permissao(self):
+        """Teste que o cliente não confirma, mas pode cancelar as próprias reservas"""
+        reservas = self._criar_reservas(2)
+        self.client.force_authenticate(self.cliente)
+        
+        response = self.client.post('/api/reservas/confirmar_lote/', {'ids': [reservas[0].id]}, format='json')
+        self.assertEqual(response.data['falhas'], 1)
+        self.assertEqual(Reserva.objects.get(pk=reservas[0].id).status, 'pendente')
+        
+        response = self.client.post('/api/reservas/cancelar_lote/', {'ids': [reservas[0].id]}, format='json')
+        self.assertEqual(response.data['sucesso'], 1)
+    
+    def test_cancelar_lote_libera_mesas(self):
+        """Teste que o cancelamento em lote devolve as mesas ao índice"""
+        from .ocupacao import mesas_livres
+        reservas = self._criar_reservas(3)
+        
+        response = self.client.post('/api/reservas/cancelar_lote/', {'ids': [r.id for r in reservas]}, format='json')
+        
+        self.assertEqual(response.data['sucesso'], 3)
+        self.assertEqual(len(mesas_livres(self.restaurante.id, self.data, time(19, 0))), 10)
+    
+    def test_lote_invalido(self):
+        """Teste que ids ausentes ou não inteiros são recusados"""
+        for corpo in ({}, {'ids': []}, {'ids': ['a']}, {'ids': list(range(1, 202))}):
+            response = self.client.post('/api/reservas/concluir_lote/', corpo, format='json')
+            self.assertEqual(response.status_code, 400)
+
+
+class ChaveIdempotenciaTest(TestCase):
+    """Testes para o cabeçalho Idempotency-Key na criação e nas transições"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        self.cliente = Usuario.objects.create_user(
+            email='cliente@test.com',
+            nome='Cliente',
+            username='cliente_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.cliente,
+            quantidade_mesas=5
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.cliente)
+    
+    def _criar(self, chave=None, pessoas=4):
+        dados = {
+            'restaurante': self.restaurante.id,
+            'data_reserva': str(self.data),
+            'horario': '19:00',
+            'quantidade_pessoas': pessoas,
+            'nome_cliente': 'Cliente',
+            'telefone_cliente': '999999999'
+        }
+        cabecalhos = {'HTTP_IDEMPOTENCY_KEY': chave} if chave else {}
+        return self.client.post('/api/reservas/', dados, format='json', **cabecalhos)
+    
+    def test_repeticao_devolve_resposta_gravada(self):
+        """Teste que a repetição com a mesma chave não cria outra reserva"""
+        primeira = self._criar('chave-1')
+        segunda = self._criar('chave-1')
+        
+        self.assertEqual(primeira.status_code, 201)
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda.data, primeira.data)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(Reserva.objects.count(), 1)
+    
+    def test_sem_chave_executa_sempre(self):
+        """Teste que sem o cabeçalho cada requisição cria sua reserva"""
+        self._criar()
+        self._criar()
+        
+        self.assertEqual(Reserva.objects.count(), 2)
+    
+    def test_chave_com_outro_corpo(self):
+        """Teste que reutilizar a chave em outra requisição é recusado"""
+        self._criar('chave-1')
+        
+        response = self._criar('chave-1', pessoas=8)
+        
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Reserva.objects.count(), 1)
+    
+    def test_chave_em_andamento(self):
+        """Teste que a repetição durante a primeira execução recebe 409"""
+        from .idempotencia import registrar_chave, impressao_requisicao
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        from rest_framework.parsers import JSONParser
+        requisicao = Request(
+            APIRequestFactory().post('/api/reservas/', {'a': 1}, format='json'),
+            parsers=[JSONParser()]
+        )
+        registro, resposta = registrar_chave(self.cliente, 'chave-1', impressao_requisicao(requisicao))
+        self.assertIsNotNone(registro)
+        self.assertIsNone(resposta)
+        
+        registro, resposta = registrar_chave(self.cliente, 'chave-1', impressao_requisicao(requisicao))
+        self.assertIsNone(registro)
+        self.assertEqual(resposta.status_code, 409)
+    
+    def test_execucao_interrompida_libera_chave_no_prazo(self):
+        """Teste que a chave de uma execução que não terminou é assumida depois do prazo curto"""
+        from .models import ChaveIdempotencia
+        from .idempotencia import registrar_chave, impressao_requisicao
+        from rest_framework.test import APIRequestFactory
+        from rest_framework.request import Request
+        from rest_framework.parsers import JSONParser
+        dados = {
+            'restaurante': self.restaurante.id,
+            'data_reserva': str(self.data),
+            'horario': '19:00',
+            'quantidade_pessoas': 4,
+            'nome_cliente': 'Cliente',
+            'telefone_cliente': '999999999'
+        }
+        requisicao = Request(
+            APIRequestFactory().post('/api/reservas/', dados, format='json'),
+            parsers=[JSONParser()]
+        )
+        # Processo que registrou a chave e morreu antes de responder
+        with self.settings(RESERVAS_PRAZO_IDEMPOTENCIA=30):
+            registro, _ = registrar_chave(self.cliente, 'chave-1', impressao_requisicao(requisicao))
+        self.assertAlmostEqual((registro.expira_em - timezone.now()).total_seconds(), 30, delta=2)
+        self.assertEqual(self._criar('chave-1').status_code, 409)
+        
+        ChaveIdempotencia.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        response = self._criar('chave-1')
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Reserva.objects.count(), 1)
+        # Com a resposta gravada, vale a validade longa
+        validade = (ChaveIdempotencia.objects.get().expira_em - timezone.now()).total_seconds()
+        self.assertGreater(validade, 3600)
+    
+    def test_chave_expirada_executa_de_novo(self):
+        """Teste que, vencida a chave, a requisição executa outra vez"""
+        from .models import ChaveIdempotencia
+        self._criar('chave-1')
+        ChaveIdempotencia.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        
+        response = self._criar('chave-1')
+        
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Reserva.objects.count(), 2)
+    
+    def test_erro_de_validacao_repetido_devolve_resposta_gravada(self):
+        """Teste que a repetição de uma requisição recusada pela validação devolve o mesmo 400"""
+        dados = {'restaurante': self.restaurante.id, 'data_reserva': 'amanhã', 'horario': '19:00'}
+        primeira = self.client.post('/api/reservas/', dados, format='json', HTTP_IDEMPOTENCY_KEY='chave-1')
+        segunda = self.client.post('/api/reservas/', dados, format='json', HTTP_IDEMPOTENCY_KEY='chave-1')
+        
+        self.assertEqual(primeira.status_code, 400)
+        self.assertEqual(segunda.status_code, 400)
+        self.assertEqual(segunda.data, primeira.data)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+    
+    def test_transicao_repetida_devolve_resposta_gravada(self):
+        """Teste que o cancelamento repetido com a mesma chave devolve o primeiro sucesso"""
+        reserva_id = self._criar().data['reserva']['id']
+        corpo = {'ids': [reserva_id]}
+        
+        primeira = self.client.post('/api/reservas/cancelar_lote/', corpo, format='json', HTTP_IDEMPOTENCY_KEY='cancelar-1')
+        segunda = self.client.post('/api/reservas/cancelar_lote/', corpo, format='json', HTTP_IDEMPOTENCY_KEY='cancelar-1')
+        
+        self.assertEqual(primeira.data['sucesso'], 1)
+        self.assertEqual(segunda.data, primeira.data)
+
+
+class ProcessarReservasPassadasTest(TestCase):
+    """Testes para o comando que encerra as reservas que já passaram"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=5
+        )
+    
+    def _criar_reserva(self, dias, status):
+        reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=timezone.now().date() + timedelta(days=dias),
+            horario=time(19, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999',
+            status=status
+        )
+        reserva.save(skip_validation=True)
+        return reserva
+    
+    def _processar(self, *argumentos):
+        from io import StringIO
+        from django.core.management import call_command
+        saida = StringIO()
+        call_command('processar_reservas_passadas', '--pausa', '0', *argumentos, stdout=saida)
+        return saida.getvalue()
+    
+    def _status(self, reservas):
+        return [Reserva.objects.get(pk=reserva.pk).status for reserva in reservas]
+    
+    def test_conclui_confirmadas_e_expira_pendentes(self):
+        """Teste que só as reservas passadas mudam de status"""
+        reservas = [
+            self._criar_reserva(-2, 'confirmada'),
+            self._criar_reserva(-2, 'pendente'),
+            self._criar_reserva(-3, 'cancelada'),
+            self._criar_reserva(2, 'confirmada'),
+            self._criar_reserva(2, 'pendente'),
+        ]
+        
+        saida = self._processar()
+        
+        self.assertEqual(
+            self._status(reservas),
+            ['concluida', 'cancelada', 'cancelada', 'confirmada', 'pendente']
+        )
+        self.assertIn('2 reserva(s) processada(s)', saida)
+    
+    def test_lotes_e_retomada(self):
+        """Teste que o limite interrompe a execução e a seguinte continua de onde parou"""
+        reservas = [self._criar_reserva(-dias, 'confirmada') for dias in range(1, 6)]
+        
+        self._processar('--lote', '2', '--limite', '3')
+        self.assertEqual(self._status(reservas).count('concluida'), 3)
+        
+        self._processar('--lote', '2')
+        self.assertEqual(self._status(reservas), ['concluida'] * 5)
+
+
+class EdicaoReservaMesasTest(TestCase):
+    """Testes para a realocação de mesas por diferença na edição da reserva"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.cliente = Usuario.objects.create_user(
+            email='cliente@test.com',
+            nome='Cliente',
+            username='cliente_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.cliente,
+            quantidade_mesas=4
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesas = list(Mesa.objects.filter(restaurante=self.restaurante).order_by('numero'))
+    
+    def _criar_reserva(self, mesas, horario=time(19, 0), quantidade_pessoas=None):
+        reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=self.data,
+            horario=horario,
+            quantidade_pessoas=quantidade_pessoas or len(mesas) * 4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        reserva.save(skip_validation=True)
+        for mesa in mesas:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        return reserva
+    
+    def _editar(self, reserva, **dados):
+        from .serializers import ReservaCreateUpdateSerializer
+        serializer = ReservaCreateUpdateSerializer(Reserva.objects.get(pk=reserva.pk), data=dados, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+    
+    def _mesas(self, reserva):
+        return sorted(ReservaMesa.objects.filter(reserva=reserva).values_list('mesa__numero', flat=True))
+    
+    def _livres(self, horario=time(19, 0)):
+        from .ocupacao import mesas_livres
+        return [mesa.numero for mesa in mesas_livres(self.restaurante.id, self.data, horario)]
+    
+    def test_mais_uma_pessoa_na_mesma_mesa(self):
+        """Teste que a edição que não muda a quantidade de mesas não regrava vínculos"""
+        reserva = self._criar_reserva([self.mesas[2]])
+        vinculo = ReservaMesa.objects.get(reserva=reserva)
+        reserva.quantidade_pessoas = 3
+        reserva.save(skip_validation=True)
+        
+        self._editar(reserva, quantidade_pessoas=4)
+        
+        self.assertEqual(list(ReservaMesa.objects.filter(reserva=reserva)), [vinculo])
+        self.assertEqual(
+            ReservaMesa.objects.get(pk=vinculo.pk).data_vinculacao,
+            vinculo.data_vinculacao
+        )
+    
+    def test_mais_pessoas_na_mesma_mesa_atualiza_capacidade(self):
+        """Teste que mudar só a quantidade de pessoas atualiza as pessoas da capacidade por slot"""
+        from .capacidade import verificar_capacidade
+        reserva = self._criar_reserva([self.mesas[2]], quantidade_pessoas=3)
+        self.assertEqual(verificar_capacidade(self.restaurante.id, self.data), [])
+        
+        self._editar(reserva, quantidade_pessoas=4)
+        
+        self.assertEqual(self._mesas(reserva), [3])
+        self.assertEqual(verificar_capacidade(self.restaurante.id, self.data), [])
+    
+    def test_trava_dias_atuais_no_restaurante_atual(self):
+        """Teste que a edição para outro restaurante trava os dias atuais no restaurante de origem"""
+        from django.db import transaction
+        from .models import OcupacaoDiaria
+        from .ocupacao import travar_alocacao
+        outro = Restaurante.objects.create(
+            nome='Outro Restaurante',
+            endereco='Rua Test, 456',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='outro@restaurant.com',
+            proprietario=self.cliente,
+            quantidade_mesas=2
+        )
+        reserva = self._criar_reserva([self.mesas[0]])
+        OcupacaoDiaria.objects.filter(restaurante=self.restaurante).delete()
+        
+        with transaction.atomic():
+            travar_alocacao(outro, self.data + timedelta(days=1), time(19, 0), reserva_atual=reserva)
+        
+        self.assertEqual(
+            sorted(OcupacaoDiaria.objects.values_list('restaurante_id', 'data')),
+            [(self.restaurante.id, self.data), (outro.id, self.data + timedelta(days=1))]
+        )
+    
+    def test_aumentar_mantem_mesa_atual(self):
+        """Teste que mais pessoas acrescentam mesas sem trocar a atual"""
+        reserva = self._criar_reserva([self.mesas[2]])
+        vinculo = ReservaMesa.objects.get(reserva=reserva)
+        
+        self._editar(reserva, quantidade_pessoas=8)
+        
+        self.assertIn(3, self._mesas(reserva))
+        self.assertEqual(len(self._mesas(reserva)), 2)
+        self.assertTrue(ReservaMesa.objects.filter(pk=vinculo.pk, mesa=self.mesas[2]).exists())
+        self.assertEqual(len(self._livres()), 2)
+    
+    def test_diminuir_libera_so_a_diferenca(self):
+        """Teste que menos pessoas liberam apenas as mesas que sobram"""
+        reserva = self._criar_reserva(self.mesas[:3])
+        
+        self._editar(reserva, quantidade_pessoas=8)
+        
+        self.assertEqual(len(self._mesas(reserva)), 2)
+        self.assertEqual(len(self._livres()), 2)
+    
+    def test_novo_horario_troca_so_mesa_ocupada(self):
+        """Teste que, no novo horário, só a mesa já ocupada por outra reserva é trocada"""
+        reserva = self._criar_reserva(self.mesas[:2])
+        self._criar_reserva([self.mesas[0]], horario=time(21, 0))
+        
+        self._editar(reserva, horario='21:00')
+        
+        mesas = self._mesas(reserva)
+        self.assertIn(2, mesas)
+        self.assertNotIn(1, mesas)
+        self.assertEqual(ReservaMesa.objects.filter(reserva=reserva).count(), 2)
+        self.assertEqual(len(self._livres(time(21, 0))), 1)
+        self.assertEqual(len(self._livres()), 4)
+
+
+class PermissaoEquipeReservaTest(TestCase):
+    """Testes para as permissões da equipe nas ações de reserva (contexto de autorização)"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from rest_framework.test import APIClient
+        from usuarios.models import Papel
+        from restaurantes.models import RestauranteUsuario
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        self.funcionario = Usuario.objects.create_user(
+            email='funcionario@test.com',
+            nome='Funcionário',
+            username='func_test',
+            password='SenhaForte123'
+        )
+        self.outro_funcionario = Usuario.objects.create_user(
+            email='outro@test.com',
+            nome='Outro Funcionário',
+            username='outro_test',
+            password='SenhaForte123'
+        )
+        papel_funcionario = Papel.objects.get_or_create(tipo='funcionario')[0]
+        self.funcionario.papeis.add(papel_funcionario)
+        self.outro_funcionario.papeis.add(papel_funcionario)
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=3
+        )
+        RestauranteUsuario.objects.create(restaurante=self.restaurante, usuario=self.funcionario, papel='funcionario')
+        
+        self.reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=timezone.now().date() + timedelta(days=2),
+            horario=time(19, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        self.reserva.save(skip_validation=True)
+        ReservaMesa.objects.create(reserva=self.reserva, mesa=Mesa.objects.filter(restaurante=self.restaurante).first())
+        self.client = APIClient()
+    
+    def _confirmar(self, usuario):
+        self.client.force_authenticate(usuario)
+        return self.client.post(f'/api/reservas/{self.reserva.id}/confirmar/')
+    
+    def test_admin_confirma(self):
+        """Teste que o admin_sistema vê e confirma a reserva de um cliente"""
+        from usuarios.models import Papel
+        self.outro_funcionario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        response = self._confirmar(self.outro_funcionario)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['reserva']['status'], 'confirmada')
+    
+    def test_funcionario_confirma_reserva_propria(self):
+        """Teste que o funcionário vinculado confirma a reserva que é dele"""
+        Reserva.objects.filter(pk=self.reserva.pk).update(usuario=self.funcionario)
+        
+        self.assertEqual(self._confirmar(self.funcionario).status_code, 200)
+    
+    def test_funcionario_de_outro_restaurante(self):
+        """Teste que o funcionário sem vínculo não confirma a própria reserva em outro restaurante"""
+        Reserva.objects.filter(pk=self.reserva.pk).update(usuario=self.outro_funcionario)
+        
+        self.assertEqual(self._confirmar(self.outro_funcionario).status_code, 403)
+    
+    def test_equipe_nao_acessa_reserva_de_cliente(self):
+        """Teste que proprietário e funcionário sem papel de admin só veem as próprias reservas"""
+        url = f'/api/reservas/{self.reserva.id}/'
+        for usuario in (self.proprietario, self.funcionario):
+            self.client.force_authenticate(usuario)
+            
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.patch(url, {'observacoes': 'Janela'}, format='json').status_code, 404)
+            self.assertEqual(self._confirmar(usuario).status_code, 404)
+    
+    def test_papeis_consultados_uma_vez(self):
+        """Teste que permissão, queryset e ação usam o mesmo contexto (uma consulta de papéis)"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        Reserva.objects.filter(pk=self.reserva.pk).update(usuario=self.funcionario)
+        
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._confirmar(self.funcionario).status_code, 200)
+        
+        consultas_papeis = [
+            consulta for consulta in consultas.captured_queries
+            if 'usuarios_usuariopapel' in consulta['sql'] or 'restaurantes_restauranteusuario' in consulta['sql']
+        ]
+        self.assertEqual(len(consultas_papeis), 1)
+
+
+class RelatorioOcupacaoTest(TestCase):
+    """Testes para o relatório de ocupação calculado com consultas agrupadas"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=4
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.mesas = list(Mesa.objects.filter(restaurante=self.restaurante).order_by('numero'))
+        self._criar_reserva(self.data, 'confirmada', self.mesas[:2])
+        self._criar_reserva(self.data, 'pendente', self.mesas[1:3])
+        self._criar_reserva(self.data, 'cancelada', self.mesas[3:])
+        self._criar_reserva(self.data + timedelta(days=1), 'pendente', self.mesas[:1])
+    
+    def _criar_reserva(self, data, status, mesas):
+        reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=data,
+            horario=time(19, 0),
+            quantidade_pessoas=4,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999',
+            status=status
+        )
+        reserva.save(skip_validation=True)
+        for mesa in mesas:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+    
+    def test_valores_por_restaurante_e_data(self):
+        """Teste que cada dia traz reservas e mesas distintas ocupadas, inclusive os dias vazios"""
+        from .reports import RelatorioHelper
+        
+        relatorio = RelatorioHelper.gerar_relatorio_ocupacao(
+            restaurante_id=self.restaurante.id,
+            data_inicio=self.data,
+            data_fim=self.data + timedelta(days=2)
+        )
+        
+        self.assertEqual(
+            [
+                (linha['data'], linha['mesas_ocupadas'], linha['reservas_confirmadas'], linha['reservas_pendentes'])
+                for linha in relatorio
+            ],
+            [
+                (self.data, 3, 1, 1),
+                (self.data + timedelta(days=1), 1, 0, 1),
+                (self.data + timedelta(days=2), 0, 0, 0),
+            ]
+        )
+        self.assertEqual(relatorio[0]['percentual_ocupacao'], 75.0)
+    
+    def test_consultas_independem_do_periodo(self):
+        """Teste que o número de consultas não cresce com o período"""
+        from .reports import RelatorioHelper
+        
+        # Cobertura do resumo, reservas, mesas ocupadas e mesas ativas
+        with self.assertNumQueries(4):
+            RelatorioHelper.gerar_relatorio_ocupacao(data_inicio=self.data, data_fim=self.data)
+        with self.assertNumQueries(4):
+            RelatorioHelper.gerar_relatorio_ocupacao(data_inicio=self.data, data_fim=self.data + timedelta(days=90))
+
+
+class RelatorioHorariosMovimentadosTest(TestCase):
+    """Testes para o relatório de horários mais movimentados agregado no banco"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=4
+        )
+        
+        self.data = timezone.now().date() - timedelta(days=2)
+        for horario, status, pessoas in [
+            (time(19, 0), 'confirmada', 2),
+            (time(19, 0), 'pendente', 4),
+            (time(19, 0), 'cancelada', 6),
+            (time(20, 0), 'confirmada', 3),
+        ]:
+            Reserva(
+                restaurante=self.restaurante,
+                data_reserva=self.data,
+                horario=horario,
+                quantidade_pessoas=pessoas,
+                nome_cliente='Cliente',
+                telefone_cliente='999999999',
+                status=status
+            ).save(skip_validation=True)
+    
+    def test_agrupamento_e_top(self):
+        """Teste que o relatório agrupa por horário, ignora canceladas e limita no banco"""
+        from .reports import RelatorioHelper
+        
+        # Cobertura do resumo e o GROUP BY
+        with self.assertNumQueries(2):
+            relatorio = RelatorioHelper.gerar_relatorio_horarios_movimentados(
+                data_inicio=self.data,
+                data_fim=self.data,
+                top=1
+            )
+        
+        self.assertEqual(len(relatorio), 1)
+        self.assertEqual(relatorio[0]['restaurante_nome'], 'Restaurante Test')
+        self.assertEqual(relatorio[0]['horario'], time(19, 0))
+        self.assertEqual(relatorio[0]['total_reservas'], 2)
+        self.assertEqual(relatorio[0]['pessoas_total'], 6)
+        self.assertEqual(relatorio[0]['taxa_confirmacao'], 50.0)
+    
+    def test_top_invalido(self):
+        """Teste que top não positivo é recusado"""
+        from rest_framework.test import APIClient
+        from usuarios.models import Papel
+        self.proprietario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        client = APIClient()
+        client.force_authenticate(self.proprietario)
+        
+        response = client.get('/api/reservas/horarios_movimentados/', {'top': '0'})
+        
+        self.assertEqual(response.status_code, 400)
+
+
+class AgregacaoPeriodoTest(TestCase):
+    """Testes para a agregação de reservas por período"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=4
+        )
+        
+        # Estatísticas do painel em cache de outros testes
+        cache.clear()
+        
+        # Segunda-feira de duas semanas ISO diferentes, em meses diferentes
+        for data, horario, status in [
+            (date(2025, 12, 29), time(19, 0), 'confirmada'),
+            (date(2026, 1, 2), time(12, 30), 'cancelada'),
+            (date(2026, 1, 5), time(19, 30), 'pendente'),
+            (date(2026, 1, 5), time(20, 0), 'confirmada'),
+        ]:
+            Reserva(
+                restaurante=self.restaurante,
+                data_reserva=data,
+                horario=horario,
+                quantidade_pessoas=2,
+                nome_cliente='Cliente',
+                telefone_cliente='999999999',
+                status=status
+            ).save(skip_validation=True)
+    
+    def _serie(self, tipo_periodo):
+        from django.db.models import Count
+        from .agregacao import agregar_por_periodo
+        return [
+            (linha['rotulo'], linha['total'])
+            for linha in agregar_por_periodo(Reserva.objects.all(), tipo_periodo, total=Count('id'))
+        ]
+    
+    def test_baldes_em_ordem_cronologica(self):
+        """Teste que dia, semana e mês vêm em ordem cronológica (não pelo rótulo)"""
+        self.assertEqual(self._serie('dia'), [('29/12/2025', 1), ('02/01/2026', 1), ('05/01/2026', 2)])
+        self.assertEqual(self._serie('semana'), [('Semana 1/2026', 2), ('Semana 2/2026', 2)])
+        self.assertEqual(self._serie('mes'), [('12/2025', 1), ('01/2026', 3)])
+    
+    def test_hora_e_dia_da_semana(self):
+        """Teste os baldes por hora do horário e por dia da semana"""
+        self.assertEqual(self._serie('hora'), [('12:00', 1), ('19:00', 2), ('20:00', 1)])
+        self.assertEqual(self._serie('dia_semana'), [('Segunda', 3), ('Sexta', 1)])
+    
+    def test_estatisticas_com_serie(self):
+        """Teste que a ação estatisticas inclui a série do período pedido"""
+        from rest_framework.test import APIClient
+        from usuarios.models import Papel
+        self.proprietario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        client = APIClient()
+        client.force_authenticate(self.proprietario)
+        
+        response = client.get('/api/reservas/estatisticas/', {'tipo_periodo': 'mes'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_reservas'], 4)
+        self.assertEqual(
+            [(linha['periodo'], linha['confirmadas'], linha['canceladas']) for linha in response.data['serie']],
+            [('12/2025', 1, 0), ('01/2026', 1, 1)]
+        )
+        self.assertEqual(client.get('/api/reservas/estatisticas/', {'tipo_periodo': 'ano'}).status_code, 400)
+    
+    def test_estatisticas_em_uma_consulta(self):
+        """Teste que as contagens do painel vêm de uma consulta, filtradas pelo escopo"""
+        from .reports import RelatorioHelper
+        
+        with self.assertNumQueries(1):
+            stats = RelatorioHelper.gerar_estatisticas(
+                restaurante_id=self.restaurante.id,
+                data_inicio=date(2026, 1, 1)
+            )
+        
+        self.assertEqual(
+            (stats['total_reservas'], stats['pendentes'], stats['confirmadas'], stats['canceladas'], stats['concluidas']),
+            (3, 1, 1, 1, 0)
+        )
+    
+    def test_estatisticas_em_cache_por_escopo(self):
+        """Teste que a repetição do mesmo escopo não consulta o banco"""
+        from .reports import RelatorioHelper
+        RelatorioHelper.estatisticas_em_cache(restaurante_id=self.restaurante.id)
+        
+        with self.assertNumQueries(0):
+            stats = RelatorioHelper.estatisticas_em_cache(restaurante_id=self.restaurante.id)
+        with self.assertNumQueries(1):
+            RelatorioHelper.estatisticas_em_cache(restaurante_id=self.restaurante.id, data_fim=date(2025, 12, 31))
+        
+        self.assertEqual(stats['total_reservas'], 4)
+
+
+class ResumoDiarioTest(TestCase):
+    """Testes para o resumo diário de reservas usado pelos relatórios"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        self.proprietario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=4
+        )
+        
+        self.data = timezone.now().date() + timedelta(days=2)
+        self.reservas = [
+            self._criar_reserva(self.data, time(19, 0), 'confirmada', 2),
+            self._criar_reserva(self.data, time(19, 0), 'pendente', 4),
+            self._criar_reserva(self.data + timedelta(days=1), time(20, 0), 'pendente', 3),
+        ]
+    
+    def _criar_reserva(self, data, horario, status, pessoas):
+        reserva = Reserva(
+            restaurante=self.restaurante,
+            data_reserva=data,
+            horario=horario,
+            quantidade_pessoas=pessoas,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999',
+            status=status
+        )
+        reserva.save(skip_validation=True)
+        return reserva
+    
+    def _resumo(self, data):
+        from .models import ResumoDiario
+        return sorted(
+            ResumoDiario.objects.filter(data_reserva=data).values_list('horario', 'status', 'quantidade', 'pessoas')
+        )
+    
+    def test_escritas_atualizam_resumo(self):
+        """Teste que criação, transição, mudança de data e exclusão mantêm o resumo"""
+        from .transicoes import aplicar_transicao
+        self.assertEqual(self._resumo(self.data), [
+            (time(19, 0), 'confirmada', 1, 2),
+            (time(19, 0), 'pendente', 1, 4),
+        ])
+        
+        aplicar_transicao(self.reservas[1], 'confirmar')
+        self.assertEqual(self._resumo(self.data), [(time(19, 0), 'confirmada', 2, 6)])
+        
+        reserva = Reserva.objects.get(pk=self.reservas[2].pk)
+        reserva.data_reserva = self.data
+        reserva.save(skip_validation=True)
+        self.assertEqual(self._resumo(self.data + timedelta(days=1)), [])
+        self.assertIn((time(20, 0), 'pendente', 1, 3), self._resumo(self.data))
+        
+        reserva.delete()
+        self.assertEqual(self._resumo(self.data), [(time(19, 0), 'confirmada', 2, 6)])
+    
+    def test_reconstrucao_paralela_marca_particoes(self):
+        """Teste que o comando reconstrói o resumo e marca todos os dias do período"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import ResumoDiario, ParticaoResumo
+        ResumoDiario.objects.all().delete()
+        ParticaoResumo.objects.all().delete()
+        
+        call_command(
+            'reconstruir_resumo',
+            desde=str(self.data - timedelta(days=1)),
+            processos=1,
+            stdout=StringIO()
+        )
+        
+        self.assertEqual(
+            list(ParticaoResumo.objects.values_list('data', flat=True)),
+            [self.data - timedelta(days=1), self.data, self.data + timedelta(days=1)]
+        )
+        self.assertEqual(ResumoDiario.objects.count(), 3)
+        self.assertEqual(self._resumo(self.data + timedelta(days=1)), [(time(20, 0), 'pendente', 1, 3)])
+    
+    def test_relatorios_usam_resumo_quando_coberto(self):
+        """Teste que os relatórios leem o resumo com o período coberto e dão o mesmo resultado das reservas"""
+        from .models import ParticaoResumo
+        from .reports import RelatorioHelper
+        from .resumo import fonte_de_reservas
+        inicio, fim = self.data, self.data + timedelta(days=1)
+        
+        def relatorios():
+            return (
+                RelatorioHelper.gerar_relatorio_ocupacao(data_inicio=inicio, data_fim=fim),
+                RelatorioHelper.gerar_relatorio_horarios_movimentados(data_inicio=inicio, data_fim=fim),
+                RelatorioHelper.gerar_relatorio_estatisticas_periodo(data_inicio=inicio, data_fim=fim, tipo_periodo='hora'),
+            )
+        
+        self.assertTrue(fonte_de_reservas(inicio, fim).usa_resumo)
+        pelo_resumo = relatorios()
+        
+        ParticaoResumo.objects.filter(data=fim).delete()
+        self.assertFalse(fonte_de_reservas(inicio, fim).usa_resumo)
+        pelas_reservas = relatorios()
+        
+        self.assertEqual(pelo_resumo, pelas_reservas)
+        self.assertEqual(pelo_resumo[2][0]['periodo'], '19:00')
+        self.assertEqual(pelo_resumo[2][0]['pessoas_total'], 6)
+    
+    def _outro_restaurante(self):
+        return Restaurante.objects.create(
+            nome='Outro Restaurante',
+            endereco='Rua Outra, 1',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='outro@restaurant.com',
+            proprietario=self.proprietario,
+            quantidade_mesas=2
+        )
+    
+    def test_escrita_nao_reagrega_outros_restaurantes(self):
+        """Teste que a escrita trava e altera só a partição do próprio restaurante e dia"""
+        from .models import ResumoDiario, ParticaoResumo
+        outro = self._outro_restaurante()
+        # Linha divergente do outro restaurante: só uma reagregação do dia inteiro a corrigiria
+        ResumoDiario.objects.create(
+            restaurante=outro, data_reserva=self.data, horario=time(12, 0), status='pendente', quantidade=5, pessoas=10
+        )
+        
+        self._criar_reserva(self.data, time(21, 0), 'pendente', 2)
+        
+        self.assertTrue(ResumoDiario.objects.filter(restaurante=outro, quantidade=5).exists())
+        self.assertFalse(ParticaoResumo.objects.filter(restaurante=outro).exists())
+    
+    def test_escrita_soma_variacoes(self):
+        """Teste que escritas em dia com partição só mexem nas linhas (horário, status) afetadas"""
+        from .models import ResumoDiario
+        from .transicoes import aplicar_transicao_em_lote
+        intocada = ResumoDiario.objects.get(restaurante=self.restaurante, data_reserva=self.data, status='confirmada')
+        
+        aplicar_transicao_em_lote([self.reservas[1].pk, self.reservas[2].pk], 'cancelar')
+        
+        self.assertEqual(ResumoDiario.objects.get(pk=intocada.pk).quantidade, 1)
+        self.assertEqual(self._resumo(self.data), [
+            (time(19, 0), 'cancelada', 1, 4),
+            (time(19, 0), 'confirmada', 1, 2),
+        ])
+        self.assertEqual(self._resumo(self.data + timedelta(days=1)), [(time(20, 0), 'cancelada', 1, 3)])
+    
+    def test_resumo_divergente_e_reagregado(self):
+        """Teste que uma variação que deixaria a linha negativa reagrega o restaurante no dia"""
+        from .models import ResumoDiario
+        ResumoDiario.objects.filter(data_reserva=self.data, status='pendente').delete()
+        
+        Reserva.objects.get(pk=self.reservas[1].pk).delete()
+        
+        self.assertEqual(self._resumo(self.data), [(time(19, 0), 'confirmada', 1, 2)])
+    
+    def test_periodo_coberto_por_restaurante(self):
+        """Teste que o relatório geral exige as partições de todos os restaurantes"""
+        from .resumo import fonte_de_reservas, reconstruir_particao
+        inicio, fim = self.data, self.data + timedelta(days=1)
+        outro = self._outro_restaurante()
+        
+        self.assertTrue(fonte_de_reservas(inicio, fim, self.restaurante.id).usa_resumo)
+        self.assertFalse(fonte_de_reservas(inicio, fim).usa_resumo)
+        self.assertFalse(fonte_de_reservas(inicio, fim, outro.id).usa_resumo)
+        
+        reconstruir_particao(inicio)
+        reconstruir_particao(fim)
+        
+        self.assertTrue(fonte_de_reservas(inicio, fim).usa_resumo)
@@ -0,0 +1,184 @@
+"""
+Transições de status de reservas (confirmar, cancelar, concluir, expirar).
+
+Cada transição é um UPDATE condicional para cada status de origem:
+
+    UPDATE reserva SET status = destino WHERE id = ? AND status = origem
+
+então duas requisições simultâneas não podem aplicar a mesma transição (só uma
+encontra a reserva no status de origem) e não há validação completa do modelo
+(a regra de antecedência vale para criar reservas, não para mudar o status).
+Em bancos com UPDATE ... RETURNING (PostgreSQL, SQLite >= 3.35) a linha
+atualizada volta na mesma instrução, sem um SELECT adicional. Ações em lote
+usam o mesmo UPDATE com `id IN (...)`.
+
+Como o UPDATE não dispara signals, o índice de ocupação dos dias da reserva é
+recalculado aqui quando a reserva deixa de ocupar mesas, e o resumo diário dos
+relatórios move cada reserva do status anterior para o novo (o da origem cujo
+UPDATE a alterou, sem reler as linhas).
+"""
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Reserva, dias_do_intervalo
+from .resumo import atualizar_resumos
+
+
+# Mensagem para cada (ação, status atual) fora da máquina de estados
+MENSAGENS_TRANSICAO_INVALIDA = {
+    ('confirmar', 'confirmada'): 'Esta reserva já está confirmada.',
+    ('confirmar', 'cancelada'): 'Não é possível confirmar uma reserva cancelada.',
+    ('confirmar', 'concluida'): 'Esta reserva já foi concluída.',
+    ('cancelar', 'cancelada'): 'Esta reserva já está cancelada.',
+    ('cancelar', 'concluida'): 'Não é possível cancelar uma reserva já concluída.',
+}
+
+
+class TransicaoInvalida(Exception):
+    """A reserva não está em um status de origem da transição (ou não existe mais)"""
+
+    def __init__(self, acao, status_atual):
+        self.acao = acao
+        self.status_atual = status_atual
+        if status_atual is None:
+            mensagem = 'Reserva não encontrada.'
+        elif acao == 'concluir':
+            mensagem = 'Apenas reservas confirmadas podem ser concluídas.'
+        else:
+            mensagem = MENSAGENS_TRANSICAO_INVALIDA.get(
+                (acao, status_atual),
+                f'Não é possível {acao} uma reserva com status {status_atual}.'
+            )
+        super().__init__(mensagem)
+
+
+def _suporta_update_returning():
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _atualizar_status(reserva_ids, origens, destino):
+    """
+    Aplica o UPDATE condicional às reservas; retorna as reservas que mudaram de
+    status e {id: status anterior}
+    """
+    atualizadas = []
+    anteriores = {}
+    for origem in origens:
+        if len(atualizadas) == len(reserva_ids):
+            break
+        for reserva in _atualizar_status_de(reserva_ids, origem, destino):
+            atualizadas.append(reserva)
+            anteriores[reserva.pk] = origem
+    return atualizadas, anteriores
+
+
+def _atualizar_resumo(atualizadas, anteriores):
+    """Move as reservas do status anterior para o atual no resumo diário"""
+    atualizar_resumos(
+        adicionadas=[reserva.linha_resumo() for reserva in atualizadas],
+        removidas=[
+            (reserva.restaurante_id, reserva.data_reserva, reserva.horario,
+             anteriores[reserva.pk], reserva.quantidade_pessoas)
+            for reserva in atualizadas
+        ]
+    )
+
+
+def _atualizar_status_de(reserva_ids, origem, destino):
+    """UPDATE condicional das reservas no status `origem`; retorna as que mudaram"""
+    agora = timezone.now()
+    if not _suporta_update_returning():
+        # Sem RETURNING, as linhas alteradas são relidas pela marca de atualização
+        Reserva.objects.filter(pk__in=reserva_ids, status=origem).update(
+            status=destino,
+            data_atualizacao=agora
+        )
+        return list(Reserva.objects.filter(pk__in=reserva_ids, status=destino, data_atualizacao=agora))
+
+    nome = connection.ops.quote_name
+    campo_atualizacao = Reserva._meta.get_field('data_atualizacao')
+    colunas = ', '.join(nome(campo.column) for campo in Reserva._meta.concrete_fields)
+    sql = (
+        f"UPDATE {nome(Reserva._meta.db_table)} "
+        f"SET {nome('status')} = %s, {nome(campo_atualizacao.column)} = %s "
+        f"WHERE {nome(Reserva._meta.pk.column)} IN ({', '.join(['%s'] * len(reserva_ids))}) "
+        f"AND {nome('status')} = %s "
+        f"RETURNING {colunas}"
+    )
+    parametros = [destino, campo_atualizacao.get_db_prep_value(agora, connection), *reserva_ids, origem]
+    return list(Reserva.objects.raw(sql, parametros))
+
+
+def _liberar_ocupacao(reservas, desde=None):
+    """
+    Recalcula uma vez cada dia ocupado pelas reservas que deixaram de ocupar
+    mesas (só os dias a partir de `desde`, se informado)
+    """
+    from .ocupacao import atualizar_ocupacao
+    dias = {
+        (reserva.restaurante_id, data)
+        for reserva in reservas
+        for data in dias_do_intervalo(reserva.inicio, reserva.fim)
+        if desde is None or data >= desde
+    }
+    for restaurante_id, data in sorted(dias):
+        atualizar_ocupacao(restaurante_id, data)
+
+
+def aplicar_transicao(reserva, acao):
+    """
+    Aplica a ação ('confirmar', 'cancelar' ou 'concluir') à reserva e retorna a
+    reserva atualizada (com o restaurante da instância recebida já carregado).
+    Levanta TransicaoInvalida se a reserva não estiver em um status de origem.
+    """
+    origens, destino = Reserva.TRANSICOES[acao]
+
+    with transaction.atomic():
+        atualizadas, anteriores = _atualizar_status([reserva.pk], origens, destino)
+        if not atualizadas:
+            status_atual = Reserva.objects.filter(pk=reserva.pk).values_list('status', flat=True).first()
+            raise TransicaoInvalida(acao, status_atual)
+
+        if destino not in Reserva.STATUS_ATIVOS:
+            _liberar_ocupacao(atualizadas)
+        _atualizar_resumo(atualizadas, anteriores)
+
+    atualizada = atualizadas[0]
+    if reserva.restaurante_id == atualizada.restaurante_id and Reserva.restaurante.is_cached(reserva):
+        atualizada.restaurante = reserva.restaurante
+    return atualizada
+
+
+def aplicar_transicao_em_lote(reserva_ids, acao, recalcular_desde=None):
+    """
+    Aplica a ação a várias reservas com um único UPDATE condicional.
+    Retorna (atualizadas, falhas): as reservas que mudaram de status e
+    {id: TransicaoInvalida} das demais. Com `recalcular_desde`, o índice só é
+    recalculado nos dias a partir dessa data (dias passados não são consultados).
+    """
+    origens, destino = Reserva.TRANSICOES[acao]
+    reserva_ids = list(dict.fromkeys(reserva_ids))
+    if not reserva_ids:
+        return [], {}
+
+    with transaction.atomic():
+        atualizadas, anteriores = _atualizar_status(reserva_ids, origens, destino)
+        if destino not in Reserva.STATUS_ATIVOS:
+            _liberar_ocupacao(atualizadas, recalcular_desde)
+        _atualizar_resumo(atualizadas, anteriores)
+
+    atualizadas_ids = {reserva.pk for reserva in atualizadas}
+    restantes = [reserva_id for reserva_id in reserva_ids if reserva_id not in atualizadas_ids]
+    status_atuais = dict(
+        Reserva.objects.filter(pk__in=restantes).values_list('id', 'status')
+    ) if restantes else {}
+    falhas = {
+        reserva_id: TransicaoInvalida(acao, status_atuais.get(reserva_id))
+        for reserva_id in restantes
+    }
+    return atualizadas, falhas
@@ -2,21 +2,36 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import Reserva, ReservaMesa, Notificacao
+from django.core.exceptions import ValidationError as DjangoValidationError
+from datetime import datetime
+from collections import defaultdict
+from restaurantes.models import Restaurante
+from .models import Reserva, ReservaMesa, Notificacao, BloqueioMesa
 from .serializers import (
     ReservaSerializer,
     ReservaListSerializer,
     ReservaCreateUpdateSerializer,
+    BloqueioMesaSerializer,
+    BloqueioMesaCreateSerializer,
     NotificacaoSerializer
 )
-from .permissions import IsOwnerOrAdminForReservas
+from .bloqueios import liberar_bloqueio as liberar_bloqueio_mesas
+from .idempotencia import idempotente
+from .transicoes import aplicar_transicao, aplicar_transicao_em_lote, TransicaoInvalida
+from .permissions import IsOwnerOrAdminForReservas, restaurantes_da_equipe
+from usuarios.autorizacao import contexto_autorizacao
+from .importacao import ImportadorReservas, CSVParser, TAMANHO_MAXIMO_IMPORTACAO
+from .agregacao import TIPOS_PERIODO
 from .reports import RelatorioHelper, RelatorioOcupacaoSerializer, HorarioMovimentadoSerializer, EstatisticasSerieSerializer
 
 
+# Limite de reservas por ação em lote
+TAMANHO_MAXIMO_LOTE = 200
+
+
 class ReservaViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gerenciamento de reservas.
@@ -42,6 +57,8 @@ class ReservaViewSet(viewsets.ModelViewSet):
             return ReservaListSerializer
         elif self.action in ['create', 'update', 'partial_update']:
             return ReservaCreateUpdateSerializer
+        elif self.action == 'bloquear':
+            return BloqueioMesaCreateSerializer
         return ReservaSerializer
     
     def get_queryset(self):
@@ -54,16 +71,13 @@ class ReservaViewSet(viewsets.ModelViewSet):
         user = self.request.user
         
         # Verificar se é admin
-        is_admin = user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if is_admin:
+        if contexto_autorizacao(self.request).is_admin:
             return queryset
         
         # Usuário comum vê apenas suas reservas
         return queryset.filter(usuario=user)
     
+    @idempotente
     def create(self, request, *args, **kwargs):
         """
         Criar nova reserva com alocação automática de mesas.
@@ -108,11 +122,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         Clientes devem usar cancelar/ action ao invés de DELETE.
         """
         # Apenas admin_sistema
-        is_admin_sistema = request.user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if not is_admin_sistema:
+        if not contexto_autorizacao(request).is_admin_sistema:
             return Response(
                 {'error': 'Clientes devem usar o endpoint cancelar/ para cancelar reservas. '
                           'Apenas administradores podem deletar.'},
@@ -128,6 +138,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         )
     
     @action(detail=True, methods=['post'])
+    @idempotente
     def confirmar(self, request, pk=None):
         """
         Confirmar reserva.
@@ -135,74 +146,27 @@ class ReservaViewSet(viewsets.ModelViewSet):
         Cria automaticamente uma notificação para o cliente.
         """
         reserva = self.get_object()
-        user = request.user
-        
-        # 🔒 Validar permissão
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if not is_admin_sistema:
-            # Admin_secundario: deve ser proprietário
-            if user != reserva.restaurante.proprietario:
-                # Funcionário: deve trabalhar naquele restaurante
-                is_funcionario = user.usuariopapel_set.filter(
-                    papel__nome='funcionario'
-                ).exists()
-                
-                if is_funcionario:
-                    from restaurantes.models import RestauranteUsuario
-                    trabalha_aqui = RestauranteUsuario.objects.filter(
-                        usuario=user,
-                        restaurante=reserva.restaurante,
-                        papel__nome='funcionario'
-                    ).exists()
-                    
-                    if not trabalha_aqui:
-                        return Response(
-                            {'error': 'Você não trabalha neste restaurante.'},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    return Response(
-                        {'error': 'Apenas administradores e funcionários podem confirmar reservas.'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-        
-        # Validar status atual
-        if reserva.status == 'confirmada':
-            return Response(
-                {'error': 'Esta reserva já está confirmada.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if reserva.status == 'cancelada':
-            return Response(
-                {'error': 'Não é possível confirmar uma reserva cancelada.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
         
-        if reserva.status == 'concluida':
-            return Response(
-                {'error': 'Esta reserva já foi concluída.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # 🔒 Validar permissão: admin_sistema ou equipe do restaurante
+        erro = self._erro_permissao_equipe(
+            request, reserva, 'Apenas administradores e funcionários podem confirmar reservas.'
+        )
+        if erro:
+            return erro
         
-        # Confirmar reserva
-        reserva.status = 'confirmada'
-        reserva.save()
+        # Confirmar reserva (UPDATE condicional: só uma confirmação simultânea vence)
+        try:
+            reserva = aplicar_transicao(reserva, 'confirmar')
+        except TransicaoInvalida as erro:
+            return Response({'error': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
         
         # Criar notificação de confirmação para o cliente
-        if reserva.usuario:
-            Notificacao.objects.create(
-                usuario=reserva.usuario,
-                reserva=reserva,
-                tipo='confirmacao',
-                titulo=f'Reserva Confirmada - {reserva.restaurante.nome}',
-                mensagem=f'Sua reserva para {reserva.quantidade_pessoas} pessoas em {reserva.restaurante.nome} '
-                         f'foi confirmada para {reserva.data_reserva} às {reserva.horario}. '
-                         f'Mesas: {", ".join([str(m.numero) for m in reserva.mesas.all()])}'
-            )
+        if reserva.usuario_id:
+            Notificacao.de_confirmacao(
+                reserva,
+                reserva.restaurante,
+                [mesa.numero for mesa in reserva.mesas.all()]
+            ).save()
         
         serializer = ReservaSerializer(reserva)
         return Response({
@@ -211,6 +175,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=True, methods=['post'])
+    @idempotente
     def cancelar(self, request, pk=None):
         """
         Cancelar reserva.
@@ -218,66 +183,27 @@ class ReservaViewSet(viewsets.ModelViewSet):
         Permitido para: dono da reserva, admin_sistema, admin_secundario, funcionario
         """
         reserva = self.get_object()
-        user = request.user
         
         # Validar permissão: dono OU admin OU funcionário do restaurante
-        is_dono = reserva.usuario == user
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if not (is_dono or is_admin_sistema):
-            # Admin_secundario: deve ser proprietário
-            if user != reserva.restaurante.proprietario:
-                # Funcionário: deve trabalhar naquele restaurante
-                is_funcionario = user.usuariopapel_set.filter(
-                    papel__nome='funcionario'
-                ).exists()
-                
-                if is_funcionario:
-                    from restaurantes.models import RestauranteUsuario
-                    trabalha_aqui = RestauranteUsuario.objects.filter(
-                        usuario=user,
-                        restaurante=reserva.restaurante,
-                        papel__nome='funcionario'
-                    ).exists()
-                    
-                    if not trabalha_aqui:
-                        return Response(
-                            {'error': 'Você não trabalha neste restaurante.'},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    return Response(
-                        {'error': 'Você não tem permissão para cancelar esta reserva.'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-        
-        # Verificar se pode cancelar
-        if reserva.status == 'cancelada':
-            return Response(
-                {'error': 'Esta reserva já está cancelada.'},
-                status=status.HTTP_400_BAD_REQUEST
+        if reserva.usuario_id != request.user.id:
+            erro = self._erro_permissao_equipe(
+                request, reserva, 'Você não tem permissão para cancelar esta reserva.'
             )
+            if erro:
+                return erro
         
-        if reserva.status == 'concluida':
-            return Response(
-                {'error': 'Não é possível cancelar uma reserva já concluída.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if not reserva.pode_cancelar():
+        # Verificar se pode cancelar (o status é conferido de novo na transição)
+        if reserva.status in Reserva.STATUS_ATIVOS and not reserva.pode_cancelar():
             return Response(
                 {'error': 'Não é possível cancelar reservas com menos de 2 horas de antecedência.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # RN03: Liberar mesas automaticamente
-        ReservaMesa.objects.filter(reserva=reserva).delete()
-        
-        # Atualizar status
-        reserva.status = 'cancelada'
-        reserva.save()
+        # RN03: a reserva cancelada deixa de ocupar as mesas no índice de ocupação
+        try:
+            reserva = aplicar_transicao(reserva, 'cancelar')
+        except TransicaoInvalida as erro:
+            return Response({'error': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = ReservaSerializer(reserva)
         return Response({
@@ -286,56 +212,26 @@ class ReservaViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=True, methods=['post'])
+    @idempotente
     def concluir(self, request, pk=None):
         """
         Marca a reserva como concluída.
         Permitido para: admin_sistema, admin_secundario, funcionario
         """
         reserva = self.get_object()
-        user = request.user
-        
-        # 🔒 Validar permissão
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
-        
-        if not is_admin_sistema:
-            # Admin_secundario: deve ser proprietário
-            if user != reserva.restaurante.proprietario:
-                # Funcionário: deve trabalhar naquele restaurante
-                is_funcionario = user.usuariopapel_set.filter(
-                    papel__nome='funcionario'
-                ).exists()
-                
-                if is_funcionario:
-                    from restaurantes.models import RestauranteUsuario
-                    trabalha_aqui = RestauranteUsuario.objects.filter(
-                        usuario=user,
-                        restaurante=reserva.restaurante,
-                        papel__nome='funcionario'
-                    ).exists()
-                    
-                    if not trabalha_aqui:
-                        return Response(
-                            {'error': 'Você não trabalha neste restaurante.'},
-                            status=status.HTTP_403_FORBIDDEN
-                        )
-                else:
-                    return Response(
-                        {'error': 'Apenas administradores e funcionários podem concluir reservas.'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
         
-        # Validar status
-        if reserva.status != 'confirmada':
-            return Response(
-                {'error': 'Apenas reservas confirmadas podem ser concluídas.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        # 🔒 Validar permissão: admin_sistema ou equipe do restaurante
+        erro = self._erro_permissao_equipe(
+            request, reserva, 'Apenas administradores e funcionários podem concluir reservas.'
+        )
+        if erro:
+            return erro
         
         # Concluir reserva
-        reserva.status = 'concluida'
-        reserva.save()
+        try:
+            reserva = aplicar_transicao(reserva, 'concluir')
+        except TransicaoInvalida as erro:
+            return Response({'error': str(erro)}, status=status.HTTP_400_BAD_REQUEST)
         
         serializer = ReservaSerializer(reserva)
         return Response({
@@ -343,6 +239,128 @@ class ReservaViewSet(viewsets.ModelViewSet):
             'reserva': serializer.data
         })
     
+    def _erro_permissao_equipe(self, request, reserva, mensagem):
+        """
+        Resposta 403 se o usuário não for admin_sistema nem da equipe do
+        restaurante da reserva (proprietário, admin_secundario ou funcionário).
+        """
+        contexto = contexto_autorizacao(request)
+        if contexto.pode_gerenciar(reserva.restaurante_id):
+            return None
+        if contexto.tem_papel('funcionario'):
+            mensagem = 'Você não trabalha neste restaurante.'
+        return Response({'error': mensagem}, status=status.HTTP_403_FORBIDDEN)
+    
+    @action(detail=False, methods=['post'])
+    @idempotente
+    def confirmar_lote(self, request):
+        """
+        Confirma várias reservas (corpo: {"ids": [...]}).
+        Permitido para: admin_sistema, proprietário, admin_secundario ou funcionário do restaurante de cada reserva.
+        Os clientes são notificados. Retorna o resultado de cada id.
+        """
+        return self._transicao_em_lote(request, 'confirmar')
+    
+    @action(detail=False, methods=['post'])
+    @idempotente
+    def cancelar_lote(self, request):
+        """
+        Cancela várias reservas (corpo: {"ids": [...]}), liberando as mesas.
+        Permitido para: dono da reserva ou equipe do restaurante (como em confirmar_lote).
+        Retorna o resultado de cada id.
+        """
+        return self._transicao_em_lote(request, 'cancelar')
+    
+    @action(detail=False, methods=['post'])
+    @idempotente
+    def concluir_lote(self, request):
+        """
+        Conclui várias reservas confirmadas (corpo: {"ids": [...]}).
+        Permitido para: equipe do restaurante (como em confirmar_lote).
+        Retorna o resultado de cada id.
+        """
+        return self._transicao_em_lote(request, 'concluir')
+    
+    def _transicao_em_lote(self, request, acao):
+        """
+        Aplica a transição às reservas pedidas: uma consulta para as reservas,
+        uma avaliação de permissão por restaurante e um único UPDATE condicional
+        para todas as permitidas.
+        """
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids or not all(
+            isinstance(reserva_id, int) and not isinstance(reserva_id, bool) for reserva_id in ids
+        ):
+            return Response(
+                {'error': 'Envie {"ids": [...]} com os ids das reservas.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(ids) > TAMANHO_MAXIMO_LOTE:
+            return Response(
+                {'error': f'Máximo de {TAMANHO_MAXIMO_LOTE} reservas por requisição.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        reservas = Reserva.objects.in_bulk(ids)
+        restaurantes = Restaurante.objects.only('id', 'nome', 'proprietario_id').in_bulk(
+            {reserva.restaurante_id for reserva in reservas.values()}
+        )
+        permitidos = restaurantes_da_equipe(contexto_autorizacao(request), restaurantes)
+        
+        erros = {}
+        candidatas = []
+        for reserva_id in dict.fromkeys(ids):
+            reserva = reservas.get(reserva_id)
+            if reserva is None:
+                erros[reserva_id] = 'Reserva não encontrada.'
+            elif reserva.restaurante_id not in permitidos and not (
+                acao == 'cancelar' and reserva.usuario_id == request.user.id
+            ):
+                erros[reserva_id] = 'Você não tem permissão para alterar esta reserva.'
+            elif acao == 'cancelar' and reserva.status in Reserva.STATUS_ATIVOS and not reserva.pode_cancelar():
+                erros[reserva_id] = 'Não é possível cancelar reservas com menos de 2 horas de antecedência.'
+            else:
+                candidatas.append(reserva_id)
+        
+        atualizadas, falhas = aplicar_transicao_em_lote(candidatas, acao)
+        erros.update({reserva_id: str(erro) for reserva_id, erro in falhas.items()})
+        
+        if acao == 'confirmar':
+            self._notificar_confirmacoes(atualizadas, restaurantes)
+        
+        status_final = {reserva.id: reserva.status for reserva in atualizadas}
+        resultados = [
+            {'id': reserva_id, 'sucesso': True, 'status': status_final[reserva_id]}
+            if reserva_id in status_final else
+            {'id': reserva_id, 'sucesso': False, 'erro': erros[reserva_id]}
+            for reserva_id in dict.fromkeys(ids)
+        ]
+        
+        return Response({
+            'total': len(resultados),
+            'sucesso': len(status_final),
+            'falhas': len(resultados) - len(status_final),
+            'resultados': resultados
+        })
+    
+    def _notificar_confirmacoes(self, reservas, restaurantes):
+        """Cria as notificações de confirmação em um INSERT (uma consulta para as mesas)"""
+        reservas = [reserva for reserva in reservas if reserva.usuario_id]
+        if not reservas:
+            return
+        
+        mesas = defaultdict(list)
+        for reserva_id, numero in ReservaMesa.objects.filter(
+            reserva_id__in=[reserva.id for reserva in reservas]
+        ).order_by('mesa__numero').values_list('reserva_id', 'mesa__numero'):
+            mesas[reserva_id].append(numero)
+        
+        Notificacao.objects.bulk_create([
+            Notificacao.de_confirmacao(reserva, restaurantes[reserva.restaurante_id], mesas[reserva.id])
+            for reserva in reservas
+        ])
+    
     @action(detail=False, methods=['get'])
     def minhas_reservas(self, request):
         """
@@ -367,31 +385,138 @@ class ReservaViewSet(viewsets.ModelViewSet):
         """
         Estatísticas básicas de reservas.
         Apenas para admins.
+        
+        Query params:
+        - restaurante_id: filtrar por restaurante
+        - data_inicio / data_fim: período das reservas (YYYY-MM-DD, opcionais)
+        - tipo_periodo: inclui `serie` com as reservas por status em cada período
+          ('dia', 'semana', 'mes', 'hora' ou 'dia_semana')
+        
+        Uma consulta de agregados, guardada por alguns segundos
+        (RESERVAS_TTL_ESTATISTICAS) para cada combinação de filtros.
         """
         # Verificar se é admin
-        is_admin = request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if not is_admin:
+        if not contexto_autorizacao(request).is_admin:
             return Response(
                 {'error': 'Apenas administradores podem visualizar estatísticas.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        queryset = self.get_queryset()
+        tipo_periodo = request.query_params.get('tipo_periodo')
+        if tipo_periodo is not None and tipo_periodo not in TIPOS_PERIODO:
+            return Response(
+                {'error': f"tipo_periodo deve ser um de: {', '.join(TIPOS_PERIODO)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        restaurante_id = request.query_params.get('restaurante_id')
+        if restaurante_id is not None:
+            try:
+                restaurante_id = int(restaurante_id)
+            except ValueError:
+                return Response(
+                    {'error': 'restaurante_id deve ser um número inteiro'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
         
-        stats = {
-            'total_reservas': queryset.count(),
-            'pendentes': queryset.filter(status='pendente').count(),
-            'confirmadas': queryset.filter(status='confirmada').count(),
-            'canceladas': queryset.filter(status='cancelada').count(),
-            'concluidas': queryset.filter(status='concluida').count(),
-            'hoje': queryset.filter(data_reserva=timezone.now().date()).count(),
-        }
+        datas = {}
+        for parametro in ('data_inicio', 'data_fim'):
+            valor = request.query_params.get(parametro)
+            if valor:
+                try:
+                    datas[parametro] = datetime.strptime(valor, '%Y-%m-%d').date()
+                except ValueError:
+                    return Response(
+                        {'error': 'Formato de data inválido. Use YYYY-MM-DD'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
         
+        stats = RelatorioHelper.estatisticas_em_cache(
+            restaurante_id=restaurante_id,
+            tipo_periodo=tipo_periodo,
+            **datas
+        )
         return Response(stats)
     
+    @action(detail=False, methods=['post'])
+    def bloquear(self, request):
+        """
+        Bloqueia as mesas de uma futura reserva por alguns minutos (RESERVAS_TTL_BLOQUEIO).
+        Enquanto o bloqueio vale, as mesas aparecem ocupadas para os demais; envie
+        o token em `bloqueio` ao criar a reserva para usar as mesas bloqueadas.
+        Cada usuário mantém um bloqueio por vez.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        bloqueio = serializer.save()
+        
+        return Response(
+            {
+                'message': 'Mesas bloqueadas. Conclua a reserva antes da expiração.',
+                'bloqueio': BloqueioMesaSerializer(bloqueio).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+    
+    @action(detail=False, methods=['post'])
+    def liberar_bloqueio(self, request):
+        """Desiste de um bloqueio, devolvendo as mesas (corpo: {"token": ...})"""
+        token = request.data.get('token')
+        try:
+            bloqueio = BloqueioMesa.objects.filter(token=token, usuario=request.user).first()
+        except DjangoValidationError:
+            bloqueio = None
+        
+        if bloqueio is None:
+            return Response(
+                {'error': 'Bloqueio não encontrado.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        liberar_bloqueio_mesas(bloqueio)
+        return Response({'message': 'Bloqueio liberado.'})
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, CSVParser])
+    def importar(self, request):
+        """
+        Importação de reservas em lote: lista JSON (ou {"reservas": [...]}) ou CSV
+        (text/csv) com cabeçalho. Mesmas regras da criação unitária, com as mesas
+        alocadas em lote por restaurante e dia.
+        Permitido para: admin_sistema, proprietário ou admin_secundario do restaurante de cada linha.
+        Retorna o resultado de cada linha.
+        """
+        linhas = request.data
+        if isinstance(linhas, dict):
+            linhas = linhas.get('reservas')
+        
+        if not isinstance(linhas, list) or not all(isinstance(linha, dict) for linha in linhas):
+            return Response(
+                {'error': 'Envie uma lista de reservas em JSON ou um CSV com cabeçalho.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not linhas:
+            return Response(
+                {'error': 'Nenhuma reserva para importar.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if len(linhas) > TAMANHO_MAXIMO_IMPORTACAO:
+            return Response(
+                {'error': f'Máximo de {TAMANHO_MAXIMO_IMPORTACAO} reservas por importação.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resultados = ImportadorReservas(request.user, contexto_autorizacao(request)).importar(linhas)
+        importadas = sum(1 for resultado in resultados if resultado['sucesso'])
+        
+        return Response({
+            'total': len(resultados),
+            'importadas': importadas,
+            'falhas': len(resultados) - importadas,
+            'resultados': resultados
+        })
+    
     @action(detail=False, methods=['get'])
     def ocupacao(self, request):
         """
@@ -404,11 +529,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         - data_fim: data de fim (YYYY-MM-DD)
         """
         # Verificar se é admin
-        is_admin = request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if not is_admin:
+        if not contexto_autorizacao(request).is_admin:
             return Response(
                 {'error': 'Apenas administradores podem visualizar relatórios.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -470,11 +591,7 @@ class ReservaViewSet(viewsets.ModelViewSet):
         - top: quantidade de horários a retornar (padrão: 10)
         """
         # Verificar se é admin
-        is_admin = request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if not is_admin:
+        if not contexto_autorizacao(request).is_admin:
             return Response(
                 {'error': 'Apenas administradores podem visualizar relatórios.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -484,7 +601,15 @@ class ReservaViewSet(viewsets.ModelViewSet):
         restaurante_id = request.query_params.get('restaurante_id')
         data_inicio_str = request.query_params.get('data_inicio')
         data_fim_str = request.query_params.get('data_fim')
-        top = int(request.query_params.get('top', 10))
+        try:
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            top = 0
+        if top < 1:
+            return Response(
+                {'error': 'top deve ser um número inteiro positivo'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Converter strings para dates
         data_inicio = None
@@ -535,14 +660,10 @@ class ReservaViewSet(viewsets.ModelViewSet):
         - restaurante_id: filtrar por restaurante
         - data_inicio: data de início (YYYY-MM-DD), padrão: últimos 30 dias
         - data_fim: data de fim (YYYY-MM-DD), padrão: hoje
-        - tipo_periodo: 'dia', 'semana' ou 'mes' (padrão: 'dia')
+        - tipo_periodo: 'dia', 'semana', 'mes', 'hora' ou 'dia_semana' (padrão: 'dia')
         """
         # Verificar se é admin
-        is_admin = request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if not is_admin:
+        if not contexto_autorizacao(request).is_admin:
             return Response(
                 {'error': 'Apenas administradores podem visualizar relatórios.'},
                 status=status.HTTP_403_FORBIDDEN
@@ -555,9 +676,9 @@ class ReservaViewSet(viewsets.ModelViewSet):
         tipo_periodo = request.query_params.get('tipo_periodo', 'dia')
         
         # Validar tipo_periodo
-        if tipo_periodo not in ['dia', 'semana', 'mes']:
+        if tipo_periodo not in TIPOS_PERIODO:
             return Response(
-                {'error': "tipo_periodo deve ser 'dia', 'semana' ou 'mes'"},
+                {'error': f"tipo_periodo deve ser um de: {', '.join(TIPOS_PERIODO)}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
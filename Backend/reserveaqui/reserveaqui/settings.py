@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 from decouple import config, Csv
 
@@ -87,6 +88,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transações pegam a trava de escrita já no BEGIN; assim a alocação de
+            # mesas (reservas/ocupacao.py: travar_alocacao) é serializada também no
+            # SQLite, onde select_for_update não tem efeito
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -133,7 +141,7 @@ AUTH_USER_MODEL = 'usuarios.Usuario'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.autenticacao.JWTAutenticacaoCache',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -161,7 +169,60 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ALGORITHM': 'HS256',
+    # O refresh reemite a claim de autorização (usuarios/autorizacao.py)
+    'TOKEN_REFRESH_SERIALIZER': 'usuarios.serializers.TokenRefreshAutorizacaoSerializer',
+}
+
+# Cache
+# O alias 'disponibilidade' guarda as consultas de disponibilidade de mesas
+# (reservas/cache_disponibilidade.py); troque o BACKEND (ex: Redis) para
+# compartilhar o cache entre processos
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+    'disponibilidade': {
+        'BACKEND': config('CACHE_DISPONIBILIDADE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_DISPONIBILIDADE_LOCATION', default='disponibilidade'),
+        'TIMEOUT': 300,
+    },
+    # Usuário autenticado em cache (USUARIOS_CACHE_USUARIO): precisa ser visto por todos
+    # os workers. Os arquivos valem para os processos de um mesmo servidor; com vários
+    # servidores use Redis ou Memcached
+    'usuarios': {
+        'BACKEND': config('CACHE_USUARIOS_BACKEND', default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': config('CACHE_USUARIOS_LOCATION', default=str(Path(tempfile.gettempdir()) / 'reserveaqui-usuarios')),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
 }
+
+# Usuarios
+# Cache do usuário autenticado (usuarios/autenticacao.py); só é usado se for compartilhado
+# entre os processos (backend diferente de LocMemCache/DummyCache)
+USUARIOS_CACHE_USUARIO = 'usuarios'
+# Validade (segundos) do usuário autenticado em cache; 0 desativa
+USUARIOS_TTL_CACHE_USUARIO = config('USUARIOS_TTL_CACHE_USUARIO', default=60, cast=int)
+# Usuários no cache de vínculos com restaurantes de cada processo (usuarios/autorizacao.py); 0 desativa.
+# As entradas valem pela versão de autorização do usuário autenticado, lida do banco ou do
+# cache compartilhado, então mudanças de papel chegam a todos os processos
+USUARIOS_TAMANHO_CACHE_VINCULOS = config('USUARIOS_TAMANHO_CACHE_VINCULOS', default=10000, cast=int)
+
+# Reservas
+RESERVAS_CACHE_DISPONIBILIDADE = 'disponibilidade'
+# Estratégia de alocação de mesas (reservas/alocacao.py):
+# primeiro_livre, melhor_encaixe, bloco_contiguo ou o caminho de uma classe
+RESERVAS_ESTRATEGIA_ALOCACAO = config('RESERVAS_ESTRATEGIA_ALOCACAO', default='melhor_encaixe')
+# Validade (segundos) dos bloqueios temporários de mesas (reservas/bloqueios.py)
+RESERVAS_TTL_BLOQUEIO = config('RESERVAS_TTL_BLOQUEIO', default=300, cast=int)
+# Validade (segundos) das respostas gravadas por Idempotency-Key (reservas/idempotencia.py)
+RESERVAS_TTL_IDEMPOTENCIA = config('RESERVAS_TTL_IDEMPOTENCIA', default=86400, cast=int)
+# Prazo (segundos) de uma requisição com Idempotency-Key em andamento; depois dele, uma
+# repetição assume a chave. Deve passar do tempo máximo de uma requisição
+RESERVAS_PRAZO_IDEMPOTENCIA = config('RESERVAS_PRAZO_IDEMPOTENCIA', default=60, cast=int)
+# Validade (segundos) das estatísticas do painel em cache (reservas/reports.py); 0 desativa
+RESERVAS_TTL_ESTATISTICAS = config('RESERVAS_TTL_ESTATISTICAS', default=10, cast=int)
+
 # Email Configuration for Password Recovery
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -0,0 +1,20 @@
+# Generated by Django 6.0.2 on 2026-10-17 11:00
+
+import datetime
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurantes', '0002_restaurante_quantidade_mesas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurante',
+            name='duracao_reserva',
+            field=models.DurationField(default=datetime.timedelta(seconds=3600), help_text='Tempo que cada reserva ocupa as mesas (ex: 01:30:00)', validators=[django.core.validators.MinValueValidator(datetime.timedelta(seconds=900)), django.core.validators.MaxValueValidator(datetime.timedelta(seconds=21600))], verbose_name='Duração da Reserva'),
+        ),
+    ]
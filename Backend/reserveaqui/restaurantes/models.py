@@ -1,7 +1,14 @@
 from django.db import models
-from django.db.models.signals import post_save
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from usuarios.models import Usuario
+from datetime import timedelta
+
+
+# Limites para o tempo que uma reserva ocupa as mesas
+DURACAO_RESERVA_MINIMA = timedelta(minutes=15)
+DURACAO_RESERVA_MAXIMA = timedelta(hours=6)
 
 
 class Restaurante(models.Model):
@@ -31,6 +38,17 @@ class Restaurante(models.Model):
         help_text="Número total de mesas (cada mesa comporta 4 pessoas)"
     )
     
+    # Tempo que cada reserva ocupa as mesas
+    duracao_reserva = models.DurationField(
+        default=timedelta(hours=1),
+        validators=[
+            MinValueValidator(DURACAO_RESERVA_MINIMA),
+            MaxValueValidator(DURACAO_RESERVA_MAXIMA)
+        ],
+        verbose_name="Duração da Reserva",
+        help_text="Tempo que cada reserva ocupa as mesas (ex: 01:30:00)"
+    )
+    
     # Status do restaurante
     ativo = models.BooleanField(default=True, verbose_name="Ativo")
     data_criacao = models.DateTimeField(auto_now_add=True, verbose_name="Data de Criação")
@@ -44,6 +62,16 @@ class Restaurante(models.Model):
     def __str__(self):
         return f"{self.nome} ({self.cidade})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Guarda o proprietário carregado para detectar a troca de dono"""
+        instance = super().from_db(db, field_names, values)
+        if 'proprietario_id' in field_names:
+            valor = values[field_names.index('proprietario_id')]
+            if valor is not models.DEFERRED:
+                instance._proprietario_original = valor
+        return instance
+    
     def criar_mesas(self):
         """Cria as mesas automaticamente para o restaurante"""
         from mesas.models import Mesa
@@ -108,3 +136,23 @@ def criar_mesas_restaurante(sender, instance, created, **kwargs):
         instance._creating_mesas = True
         instance.criar_mesas()
         delattr(instance, '_creating_mesas')
+
+
+@receiver(post_save, sender=RestauranteUsuario)
+@receiver(post_delete, sender=RestauranteUsuario)
+def invalidar_autorizacao_vinculo(sender, instance, **kwargs):
+    """Signal para invalidar as permissões dos tokens do usuário vinculado ou desvinculado"""
+    from usuarios.autorizacao import invalidar_autorizacao
+    invalidar_autorizacao(instance.usuario_id)
+
+
+@receiver(post_save, sender=Restaurante)
+@receiver(post_delete, sender=Restaurante)
+def invalidar_autorizacao_proprietario(sender, instance, **kwargs):
+    """Signal para invalidar as permissões dos tokens quando o proprietário muda"""
+    original = getattr(instance, '_proprietario_original', None)
+    if kwargs.get('created') is False and original == instance.proprietario_id:
+        return
+    from usuarios.autorizacao import invalidar_autorizacao
+    invalidar_autorizacao(*{original, instance.proprietario_id} - {None})
+    instance._proprietario_original = instance.proprietario_id
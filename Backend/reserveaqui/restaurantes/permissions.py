@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from usuarios.autorizacao import contexto_autorizacao
 
 
 class IsAdminSystemOnly(permissions.BasePermission):
@@ -12,9 +13,7 @@ class IsAdminSystemOnly(permissions.BasePermission):
             return False
         
         # Apenas admin_sistema (não admin_secundario)
-        return request.user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
+        return contexto_autorizacao(request).is_admin_sistema
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -34,9 +33,7 @@ class IsAdminOrReadOnly(permissions.BasePermission):
             return False
         
         # Verifica se o usuário tem papel de admin
-        return request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
+        return contexto_autorizacao(request).is_admin
 
 
 class IsProprietarioOrAdmin(permissions.BasePermission):
@@ -55,11 +52,7 @@ class IsProprietarioOrAdmin(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
         
-        # Proprietário do restaurante
-        if obj.proprietario == request.user:
-            return True
+        contexto = contexto_autorizacao(request)
         
-        # Administrador do sistema
-        return request.user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
+        # Proprietário do restaurante ou administrador
+        return contexto.is_proprietario(obj.pk) or contexto.is_admin
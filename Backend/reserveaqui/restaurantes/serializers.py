@@ -23,6 +23,7 @@ class RestauranteSerializer(serializers.ModelSerializer):
             'proprietario',
             'proprietario_nome',
             'quantidade_mesas',
+            'duracao_reserva',
             'total_mesas',
             'ativo',
             'data_criacao',
@@ -60,6 +61,24 @@ class RestauranteListSerializer(serializers.ModelSerializer):
         ]
 
 
+class RestauranteDisponivelSerializer(serializers.ModelSerializer):
+    """Serializer para o resultado da busca de restaurantes com mesas livres"""
+    
+    mesas_livres = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Restaurante
+        fields = [
+            'id',
+            'nome',
+            'endereco',
+            'cidade',
+            'estado',
+            'telefone',
+            'mesas_livres'
+        ]
+
+
 class RestauranteCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer para criação e atualização de restaurante"""
     
@@ -82,6 +101,7 @@ class RestauranteCreateUpdateSerializer(serializers.ModelSerializer):
             'proprietario_email',
             'proprietario_nome',
             'quantidade_mesas',
+            'duracao_reserva',
             'ativo'
         ]
         extra_kwargs = {
@@ -1,5 +1,7 @@
 from django.test import TestCase
 from django.db import IntegrityError
+from django.utils import timezone
+from datetime import timedelta, time
 from usuarios.models import Usuario, Papel
 from .models import Restaurante, RestauranteUsuario
 
@@ -202,3 +204,96 @@ class RestauranteUsuarioModelTest(TestCase):
             
             self.assertEqual(vinculo.papel, papel)
             self.assertEqual(vinculo.get_papel_display(), {'admin_secundario': 'Admin Secundário', 'funcionario': 'Funcionário', 'cliente': 'Cliente'}[papel])
+
+
+class BuscaDisponibilidadeTest(TestCase):
+    """Testes para a busca de restaurantes com mesas livres"""
+    
+    def setUp(self):
+        """Criar restaurantes em cidades diferentes"""
+        from rest_framework.test import APIClient
+        
+        self.usuario = Usuario.objects.create_user(
+            email='proprietario@test.com',
+            nome='Proprietário',
+            username='prop_test',
+            password='SenhaForte123'
+        )
+        
+        def criar(nome, cidade, mesas, ativo=True):
+            return Restaurante.objects.create(
+                nome=nome,
+                endereco='Rua Test',
+                cidade=cidade,
+                estado='CE',
+                cep='60000-000',
+                email=f'{nome.lower()}@test.com',
+                proprietario=self.usuario,
+                quantidade_mesas=mesas,
+                ativo=ativo
+            )
+        
+        self.pequeno = criar('Pequeno', 'Fortaleza', 1)
+        self.grande = criar('Grande', 'Fortaleza', 5)
+        self.medio = criar('Medio', 'Fortaleza', 3)
+        criar('Fechado', 'Fortaleza', 10, ativo=False)
+        criar('Distante', 'Sobral', 10)
+        
+        self.client = APIClient()
+        self.client.force_authenticate(self.usuario)
+        self.data = timezone.now().date() + timedelta(days=2)
+    
+    def _buscar(self, **params):
+        params = {
+            'cidade': 'fortaleza',
+            'data': str(self.data),
+            'horario': '20:00',
+            'quantidade_pessoas': 8,
+            **params
+        }
+        return self.client.get('/api/restaurantes/busca_disponibilidade/', params)
+    
+    def test_busca_ordena_por_mesas_livres(self):
+        """Teste que a busca filtra por cidade e capacidade e ordena por mesas livres"""
+        response = self._buscar()
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [(r['nome'], r['mesas_livres']) for r in response.data['results']],
+            [('Grande', 5), ('Medio', 3)]
+        )
+    
+    def test_busca_desconta_mesas_reservadas(self):
+        """Teste que mesas com reservas conflitantes não contam como livres"""
+        from reservas.models import Reserva, ReservaMesa
+        reserva = Reserva.objects.create(
+            restaurante=self.medio,
+            data_reserva=self.data,
+            horario=time(19, 30),
+            quantidade_pessoas=8,
+            nome_cliente='Cliente',
+            telefone_cliente='999999999'
+        )
+        for mesa in self.medio.mesas.all()[:2]:
+            ReservaMesa.objects.create(reserva=reserva, mesa=mesa)
+        
+        response = self._buscar()
+        self.assertEqual([r['nome'] for r in response.data['results']], ['Grande'])
+        
+        # Fora da janela de conflito a mesa volta a contar
+        response = self._buscar(horario='21:00')
+        self.assertEqual([r['nome'] for r in response.data['results']], ['Grande', 'Medio'])
+    
+    def test_busca_paginada(self):
+        """Teste que a busca é paginada"""
+        response = self._buscar(quantidade_pessoas=1, page_size=2)
+        
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+    
+    def test_busca_exige_cidade_ou_estado(self):
+        """Teste que a busca exige cidade ou estado"""
+        response = self._buscar(cidade='')
+        self.assertEqual(response.status_code, 400)
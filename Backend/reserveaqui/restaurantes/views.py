@@ -2,20 +2,33 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from django.utils import timezone
+from datetime import datetime
+import math
 from .models import Restaurante, RestauranteUsuario
 from .serializers import (
     RestauranteSerializer,
     RestauranteListSerializer,
+    RestauranteDisponivelSerializer,
     RestauranteCreateUpdateSerializer,
     RestauranteUsuarioSerializer,
     AdicionarFuncionarioSerializer
 )
 from .permissions import IsAdminOrReadOnly, IsProprietarioOrAdmin, IsAdminSystemOnly
 from usuarios.models import Usuario, Papel
+from usuarios.autorizacao import contexto_autorizacao
 from usuarios.utils import enviar_senha_generica
 
 
+class BuscaDisponibilidadePagination(PageNumberPagination):
+    """Paginação da busca de restaurantes com mesas livres"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
 class RestauranteViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gerenciar restaurantes.
@@ -26,6 +39,7 @@ class RestauranteViewSet(viewsets.ModelViewSet):
     update: Atualizar restaurante (proprietário ou admin)
     partial_update: Atualizar parcialmente restaurante (proprietário ou admin)
     destroy: Remover restaurante (apenas admin)
+    busca_disponibilidade: Buscar restaurantes com mesas livres por cidade, data e horário
     """
     
     queryset = Restaurante.objects.select_related('proprietario').prefetch_related('mesas').all()
@@ -66,26 +80,15 @@ class RestauranteViewSet(viewsets.ModelViewSet):
         if not user.is_authenticated:
             return queryset.filter(ativo=True)
         
-        # Admin_sistema vê todos (incluindo inativos)
-        is_admin_sistema = user.usuariopapel_set.filter(
-            papel__nome='admin_sistema'
-        ).exists()
+        contexto = contexto_autorizacao(self.request)
         
-        if is_admin_sistema:
+        # Admin_sistema vê todos (incluindo inativos)
+        if contexto.is_admin_sistema:
             return queryset  # Vê tudo
         
         # Admin_secundario vê apenas seu restaurante
-        is_admin_secundario = user.usuariopapel_set.filter(
-            papel__nome='admin_secundario'
-        ).exists()
-        
-        if is_admin_secundario:
-            # Admin_secundario é proprietário de apenas 1 restaurante
-            restaurante = queryset.filter(proprietario=user).first()
-            if restaurante:
-                return queryset.filter(id=restaurante.id)
-            else:
-                return queryset.none()
+        if contexto.tem_papel('admin_secundario'):
+            return queryset.filter(id__in=contexto.restaurantes_proprios())
         
         # Clientes e funcionários veem apenas restaurantes ativos
         return queryset.filter(ativo=True)
@@ -128,6 +131,82 @@ class RestauranteViewSet(viewsets.ModelViewSet):
             papel='admin_secundario'
         )
     
+    @action(detail=False, methods=['get'])
+    def busca_disponibilidade(self, request):
+        """
+        Busca restaurantes ativos de uma cidade/estado com mesas livres suficientes.
+        Resolvida em uma única consulta agregada, sem consultar restaurante por restaurante.
+        
+        Query params:
+        - cidade e/ou estado (ao menos um é obrigatório)
+        - data (obrigatório): Data no formato YYYY-MM-DD
+        - horario (obrigatório): Horário no formato HH:MM
+        - quantidade_pessoas (obrigatório): Quantidade de pessoas
+        - page / page_size (opcional): Paginação
+        
+        Ordena pelos restaurantes com mais mesas livres.
+        """
+        from reservas.ocupacao import anotar_mesas_livres
+        
+        cidade = request.query_params.get('cidade')
+        estado = request.query_params.get('estado')
+        data_str = request.query_params.get('data')
+        horario_str = request.query_params.get('horario')
+        quantidade_pessoas = request.query_params.get('quantidade_pessoas')
+        
+        # Validações
+        if not cidade and not estado:
+            return Response(
+                {"error": "Informe ao menos um dos parâmetros 'cidade' ou 'estado'."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not data_str or not horario_str or not quantidade_pessoas:
+            return Response(
+                {"error": "Os parâmetros 'data', 'horario' e 'quantidade_pessoas' são obrigatórios."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            data_reserva = datetime.strptime(data_str, '%Y-%m-%d').date()
+            horario_reserva = datetime.strptime(horario_str, '%H:%M').time()
+            qtd_pessoas = int(quantidade_pessoas)
+        except ValueError:
+            return Response(
+                {"error": "Parâmetros inválidos. Use YYYY-MM-DD para data, HH:MM para horário e um número inteiro de pessoas."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if qtd_pessoas < 1:
+            return Response(
+                {"error": "A quantidade de pessoas deve ser maior que zero."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data_hora_reserva = timezone.make_aware(datetime.combine(data_reserva, horario_reserva))
+        if data_hora_reserva < timezone.now():
+            return Response(
+                {"error": "Não é possível consultar disponibilidade para datas/horários no passado."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        restaurantes = Restaurante.objects.filter(ativo=True)
+        if cidade:
+            restaurantes = restaurantes.filter(cidade__iexact=cidade)
+        if estado:
+            restaurantes = restaurantes.filter(estado__iexact=estado)
+        
+        mesas_necessarias = math.ceil(qtd_pessoas / 4)
+        restaurantes = anotar_mesas_livres(
+            restaurantes, data_reserva, horario_reserva
+        ).filter(mesas_livres__gte=mesas_necessarias).order_by('-mesas_livres', 'nome')
+        
+        paginator = BuscaDisponibilidadePagination()
+        page = paginator.paginate_queryset(restaurantes, request, view=self)
+        serializer = RestauranteDisponivelSerializer(page, many=True)
+        
+        return paginator.get_paginated_response(serializer.data)
+    
     @action(detail=True, methods=['get'])
     def mesas(self, request, pk=None):
         """Retorna as mesas do restaurante"""
@@ -155,11 +234,9 @@ class RestauranteViewSet(viewsets.ModelViewSet):
         restaurante = self.get_object()
         
         # Verifica se é proprietário ou admin
-        if restaurante.proprietario != request.user:
-            is_admin = request.user.usuariopapel_set.filter(
-                papel__nome__in=['admin_sistema', 'admin_secundario']
-            ).exists()
-            if not is_admin:
+        contexto = contexto_autorizacao(request)
+        if not contexto.is_proprietario(restaurante.id):
+            if not contexto.is_admin:
                 return Response(
                     {"detail": "Apenas o proprietário ou administradores podem adicionar usuários."},
                     status=status.HTTP_403_FORBIDDEN
@@ -183,7 +260,7 @@ class RestauranteViewSet(viewsets.ModelViewSet):
         restaurante = self.get_object()
         
         # Verifica se é o proprietário (admin_secundario) do restaurante
-        if restaurante.proprietario != request.user:
+        if not contexto_autorizacao(request).is_proprietario(restaurante.id):
             return Response(
                 {"detail": "Apenas o proprietário do restaurante pode adicionar funcionários."},
                 status=status.HTTP_403_FORBIDDEN
@@ -250,16 +327,11 @@ class RestauranteUsuarioViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Filtra vínculos baseado no usuário"""
         queryset = super().get_queryset()
-        user = self.request.user
+        contexto = contexto_autorizacao(self.request)
         
         # Admin vê tudo
-        is_admin = user.usuariopapel_set.filter(
-            papel__nome__in=['admin_sistema', 'admin_secundario']
-        ).exists()
-        
-        if is_admin:
+        if contexto.is_admin:
             return queryset
         
         # Proprietários veem seus restaurantes
-        restaurantes_proprietario = Restaurante.objects.filter(proprietario=user)
-        return queryset.filter(restaurante__in=restaurantes_proprietario)
+        return queryset.filter(restaurante_id__in=contexto.restaurantes_proprios())
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UsuariosConfig(AppConfig):
     name = 'usuarios'
+
+    def ready(self):
+        from . import checks  # noqa: F401
@@ -0,0 +1,102 @@
+"""
+Autenticação JWT com o usuário em cache.
+
+A autenticação padrão do SimpleJWT busca o usuário do token no banco em toda
+requisição. JWTAutenticacaoCache guarda o usuário autenticado no cache
+settings.USUARIOS_CACHE_USUARIO (um alias de settings.CACHES) por
+settings.USUARIOS_TTL_CACHE_USUARIO segundos (0 desativa), então só a
+primeira requisição da janela consulta o banco.
+
+O cache precisa ser compartilhado entre os processos (o padrão é em arquivos,
+para os workers de um servidor; Redis ou Memcached para vários): a desativação,
+a troca de senha e a versão de autorização do usuário em cache valem para todos
+os workers. Com um backend local ao processo (LocMemCache, DummyCache) o usuário
+não é guardado e a verificação `usuarios.W001` avisa na inicialização.
+
+O registro em cache é descartado:
+- ao salvar ou apagar o usuário (troca de senha, desativação, edição);
+- ao mudar a versão de autorização (invalidar_autorizacao), que é gravada com
+  UPDATE e não passa pelo save.
+
+Uma gravação concorrente com a primeira leitura pode deixar o registro antigo no
+cache até o fim da validade; por isso a validade é curta.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+TTL_CACHE_USUARIO_PADRAO = 60
+
+# Backends cujo conteúdo é visto só pelo próprio processo
+BACKENDS_LOCAIS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def _alias_cache():
+    return getattr(settings, 'USUARIOS_CACHE_USUARIO', 'default')
+
+
+def _cache():
+    return caches[_alias_cache()]
+
+
+def cache_compartilhado():
+    """Indica se o cache do usuário autenticado é visto por todos os processos"""
+    return settings.CACHES[_alias_cache()]['BACKEND'] not in BACKENDS_LOCAIS
+
+
+def ttl_configurado():
+    return getattr(settings, 'USUARIOS_TTL_CACHE_USUARIO', TTL_CACHE_USUARIO_PADRAO)
+
+
+def ttl_cache_usuario():
+    """Validade (segundos) do usuário em cache; 0 sem cache compartilhado"""
+    return ttl_configurado() if cache_compartilhado() else 0
+
+
+def chave_cache_usuario(usuario_id):
+    return f'usuarios:autenticado:{usuario_id}'
+
+
+def invalidar_usuario_em_cache(*usuario_ids):
+    """Descarta o usuário em cache; a próxima requisição o busca no banco"""
+    chaves = [chave_cache_usuario(usuario_id) for usuario_id in usuario_ids if usuario_id is not None]
+    if chaves and ttl_cache_usuario():
+        cache = _cache()
+        cache.delete_many(chaves)
+        # De novo após o commit: uma leitura no meio da transação veria os dados antigos
+        transaction.on_commit(lambda: cache.delete_many(chaves))
+
+
+class JWTAutenticacaoCache(JWTAuthentication):
+    """JWTAuthentication que busca o usuário no cache antes do banco"""
+
+    def get_user(self, validated_token):
+        ttl = ttl_cache_usuario()
+        usuario_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if not ttl or usuario_id is None:
+            return super().get_user(validated_token)
+
+        chave = chave_cache_usuario(usuario_id)
+        cache = _cache()
+        usuario = cache.get(chave)
+        if usuario is None:
+            # Verifica existência, usuário ativo e senha como a autenticação padrão
+            usuario = super().get_user(validated_token)
+            cache.set(chave, usuario, ttl)
+            return usuario
+
+        # Só usuários ativos entram no cache e a desativação o descarta
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(usuario.password):
+            raise AuthenticationFailed('A senha do usuário foi alterada.', code='password_changed')
+        return usuario
@@ -0,0 +1,244 @@
+"""
+Contexto de autorização por requisição.
+
+Os papéis globais do usuário (UsuarioPapel) e seus vínculos com restaurantes
+(proprietário e RestauranteUsuario) são carregados em uma única consulta (UNION)
+na primeira verificação da requisição e guardados nela. Permissões, querysets e
+ações de `reservas`, `mesas` e `restaurantes` consultam esse contexto em vez de
+repetir as próprias consultas de papel.
+
+Os tokens de acesso emitidos no login e no refresh levam o mesmo contexto na
+claim `autz`, com a versão de autorização do usuário (Usuario.versao_autorizacao).
+Requisições com a claim na versão atual (a do usuário autenticado, lido do banco
+ou do cache compartilhado) montam o contexto sem consultar o banco;
+mudanças de papel ou de vínculo incrementam a versão (signals em
+usuarios/models.py e restaurantes/models.py) e os tokens antigos voltam a ser
+resolvidos pela consulta até o próximo refresh.
+
+Sem claim válida, o resultado da consulta fica em um cache em memória do
+processo (usuário -> papéis e {restaurante_id: papel}), preenchido na primeira
+requisição e guardado com a versão de autorização: a entrada só é usada enquanto
+a versão do usuário autenticado for a mesma. Os signals que incrementam a versão
+também descartam a entrada no processo; nos demais, ela deixa de ser usada porque
+o usuário autenticado vem do banco ou do cache compartilhado (descartado por
+invalidar_autorizacao), já com a versão nova. Quem chama carregar_contexto com
+um usuário guardado de outra forma precisa informar a versão atual.
+"""
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import CharField, F, IntegerField, Value
+
+from .models import Usuario, UsuarioPapel
+
+
+# Papel de quem é dono do restaurante (Restaurante.proprietario)
+PROPRIETARIO = 'proprietario'
+
+# Papéis no restaurante que fazem parte da equipe (confirmam reservas, mudam status de mesas)
+PAPEIS_EQUIPE = {PROPRIETARIO, 'admin_secundario', 'funcionario'}
+
+# Usuários mantidos no cache de vínculos do processo (os menos usados saem primeiro)
+TAMANHO_CACHE_VINCULOS_PADRAO = 10000
+
+# Claim do token de acesso com o contexto: {'v': versão, 'p': [papéis], 'r': {restaurante_id: papel}}
+CLAIM_AUTORIZACAO = 'autz'
+
+
+class ContextoAutorizacao:
+    """Papéis globais e papel em cada restaurante de um usuário"""
+
+    def __init__(self, usuario_id=None, papeis=(), restaurantes=None):
+        self.usuario_id = usuario_id
+        self.papeis = frozenset(papeis)
+        # {restaurante_id: 'proprietario' | 'admin_secundario' | 'funcionario' | 'cliente'}
+        self.restaurantes = restaurantes or {}
+
+    def tem_papel(self, *tipos):
+        """Indica se o usuário tem algum dos papéis globais"""
+        return not self.papeis.isdisjoint(tipos)
+
+    @property
+    def is_admin_sistema(self):
+        return 'admin_sistema' in self.papeis
+
+    @property
+    def is_admin(self):
+        """admin_sistema ou admin_secundario"""
+        return self.tem_papel('admin_sistema', 'admin_secundario')
+
+    def papel_no_restaurante(self, restaurante_id):
+        return self.restaurantes.get(restaurante_id)
+
+    def is_proprietario(self, restaurante_id):
+        return self.restaurantes.get(restaurante_id) == PROPRIETARIO
+
+    def trabalha_no_restaurante(self, restaurante_id):
+        """Proprietário, admin_secundario ou funcionário vinculado ao restaurante"""
+        return self.restaurantes.get(restaurante_id) in PAPEIS_EQUIPE
+
+    def pode_gerenciar(self, restaurante_id):
+        """admin_sistema ou equipe do restaurante"""
+        return self.is_admin_sistema or self.trabalha_no_restaurante(restaurante_id)
+
+    def restaurantes_proprios(self):
+        return {restaurante_id for restaurante_id, papel in self.restaurantes.items() if papel == PROPRIETARIO}
+
+    def restaurantes_da_equipe(self):
+        return {restaurante_id for restaurante_id, papel in self.restaurantes.items() if papel in PAPEIS_EQUIPE}
+
+
+class CacheVinculos:
+    """
+    Cache em memória do processo de {usuario_id: (versão, papéis, {restaurante_id: papel})}.
+
+    Não é compartilhado: a entrada de outro processo só é ignorada porque a versão
+    consultada é a atual, lida do banco ou do cache compartilhado do usuário.
+    """
+
+    def __init__(self):
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, usuario_id, versao):
+        """Retorna (papéis, restaurantes) guardados na versão informada, ou None"""
+        with self._trava:
+            entrada = self._entradas.get(usuario_id)
+            if entrada is None or entrada[0] != versao:
+                return None
+            self._entradas.move_to_end(usuario_id)
+        return entrada[1], dict(entrada[2])
+
+    def guardar(self, usuario_id, versao, papeis, restaurantes):
+        tamanho = getattr(settings, 'USUARIOS_TAMANHO_CACHE_VINCULOS', TAMANHO_CACHE_VINCULOS_PADRAO)
+        if tamanho <= 0:
+            return
+        with self._trava:
+            self._entradas[usuario_id] = (versao, frozenset(papeis), dict(restaurantes))
+            self._entradas.move_to_end(usuario_id)
+            while len(self._entradas) > tamanho:
+                self._entradas.popitem(last=False)
+
+    def descartar(self, *usuario_ids):
+        with self._trava:
+            for usuario_id in usuario_ids:
+                self._entradas.pop(usuario_id, None)
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+
+
+cache_vinculos = CacheVinculos()
+
+
+def carregar_contexto(usuario, versao=None):
+    """
+    Monta o contexto do usuário a partir do cache de vínculos ou com uma consulta
+    (nenhuma para anônimos). `versao` é a versão de autorização atual do usuário
+    (por padrão, a do objeto, que deve ter vindo do banco ou do cache compartilhado).
+    """
+    from restaurantes.models import Restaurante, RestauranteUsuario
+
+    if usuario is None or not usuario.is_authenticated:
+        return ContextoAutorizacao()
+
+    if versao is None:
+        versao = getattr(usuario, 'versao_autorizacao', None)
+    if versao is not None:
+        em_cache = cache_vinculos.obter(usuario.pk, versao)
+        if em_cache is not None:
+            return ContextoAutorizacao(usuario.pk, *em_cache)
+
+    # Linhas (papel, restaurante_id): restaurante nulo indica papel global
+    papeis = UsuarioPapel.objects.filter(usuario_id=usuario.pk).annotate(
+        nome_papel=F('papel__tipo'),
+        restaurante_papel=Value(None, output_field=IntegerField())
+    ).values_list('nome_papel', 'restaurante_papel').order_by()
+    vinculos = RestauranteUsuario.objects.filter(usuario_id=usuario.pk).values_list('papel', 'restaurante_id').order_by()
+    proprios = Restaurante.objects.filter(proprietario_id=usuario.pk).annotate(
+        nome_papel=Value(PROPRIETARIO, output_field=CharField())
+    ).values_list('nome_papel', 'id').order_by()
+
+    globais = set()
+    restaurantes = {}
+    for papel, restaurante_id in papeis.union(vinculos, proprios, all=True):
+        if restaurante_id is None:
+            globais.add(papel)
+        elif restaurantes.get(restaurante_id) != PROPRIETARIO:
+            restaurantes[restaurante_id] = papel
+
+    if versao is not None:
+        cache_vinculos.guardar(usuario.pk, versao, globais, restaurantes)
+    return ContextoAutorizacao(usuario.pk, globais, restaurantes)
+
+
+def invalidar_autorizacao(*usuario_ids):
+    """Incrementa a versão de autorização, invalidando a claim dos tokens já emitidos"""
+    usuario_ids = {usuario_id for usuario_id in usuario_ids if usuario_id is not None}
+    if usuario_ids:
+        Usuario.objects.filter(pk__in=usuario_ids).update(versao_autorizacao=F('versao_autorizacao') + 1)
+        cache_vinculos.descartar(*usuario_ids)
+        # O usuário em cache guarda a versão antiga (usuarios/autenticacao.py)
+        from .autenticacao import invalidar_usuario_em_cache
+        invalidar_usuario_em_cache(*usuario_ids)
+
+
+def claims_autorizacao(usuario):
+    """Claim `autz` com o contexto atual do usuário"""
+    # A versão é lida antes dos papéis: uma mudança entre as duas leituras deixa a claim já vencida
+    versao = Usuario.objects.filter(pk=usuario.pk).values_list('versao_autorizacao', flat=True).first() or 0
+    contexto = carregar_contexto(usuario, versao)
+    return {
+        'v': versao,
+        'p': sorted(contexto.papeis),
+        'r': {str(restaurante_id): papel for restaurante_id, papel in contexto.restaurantes.items()},
+    }
+
+
+def contexto_das_claims(usuario, claims):
+    """
+    Contexto a partir da claim `autz`, ou None se ela não existir ou estiver vencida.
+
+    A versão da claim é comparada à do `usuario`, que precisa ter sido lido do
+    banco ou do cache compartilhado do usuário autenticado (usuarios/autenticacao.py),
+    ambos atualizados por invalidar_autorizacao em todos os processos; um objeto
+    guardado em memória do processo aceitaria claims já vencidas.
+    """
+    if not isinstance(claims, dict) or claims.get('v') != usuario.versao_autorizacao:
+        return None
+    return ContextoAutorizacao(
+        usuario.pk,
+        claims.get('p', ()),
+        {int(restaurante_id): papel for restaurante_id, papel in claims.get('r', {}).items()}
+    )
+
+
+def tokens_com_autorizacao(usuario):
+    """RefreshToken do usuário com a claim `autz` (copiada para o token de acesso)"""
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    refresh = RefreshToken.for_user(usuario)
+    refresh[CLAIM_AUTORIZACAO] = claims_autorizacao(usuario)
+    return refresh
+
+
+def contexto_autorizacao(request):
+    """
+    Contexto do usuário da requisição, lido da claim do token quando ela está na
+    versão atual ou carregado do banco, uma vez, e guardado na requisição.
+    """
+    usuario = getattr(request, 'user', None)
+    usuario_id = usuario.pk if usuario is not None and usuario.is_authenticated else None
+    contexto = getattr(request, '_contexto_autorizacao', None)
+    if contexto is None or contexto.usuario_id != usuario_id:
+        contexto = None
+        token = getattr(request, 'auth', None)
+        if usuario_id is not None and token is not None and hasattr(token, 'get'):
+            contexto = contexto_das_claims(usuario, token.get(CLAIM_AUTORIZACAO))
+        if contexto is None:
+            contexto = carregar_contexto(usuario)
+        request._contexto_autorizacao = contexto
+    return contexto
@@ -0,0 +1,19 @@
+from django.core.checks import Warning, register
+
+from .autenticacao import cache_compartilhado, ttl_configurado
+
+
+@register()
+def verificar_cache_usuario(app_configs, **kwargs):
+    """Avisa quando o cache do usuário autenticado está ligado sobre um cache local ao processo"""
+    if ttl_configurado() and not cache_compartilhado():
+        return [
+            Warning(
+                'O usuário autenticado não será guardado em cache: o cache configurado em '
+                'USUARIOS_CACHE_USUARIO é local ao processo, e a desativação ou a troca de '
+                'permissões de um usuário não chegaria aos demais workers.',
+                hint='Use um cache compartilhado (arquivos, Redis, Memcached ou banco) ou defina USUARIOS_TTL_CACHE_USUARIO=0.',
+                id='usuarios.W001',
+            )
+        ]
+    return []
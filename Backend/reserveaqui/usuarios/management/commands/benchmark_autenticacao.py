@@ -0,0 +1,86 @@
+"""
+Benchmark da autenticação JWT.
+
+Cria um usuário temporário, emite seu token e chama `GET /api/usuarios/me/`
+(pela view, sem servidor HTTP) repetidas vezes com a autenticação padrão do
+SimpleJWT e com JWTAutenticacaoCache, informando requisições por segundo e
+consultas ao banco por requisição de cada uma. Sem um cache compartilhado
+(USUARIOS_CACHE_USUARIO) o usuário não é guardado e as duas se equivalem.
+
+Uso:
+    python manage.py benchmark_autenticacao [--requisicoes 2000]
+"""
+
+import time as relogio
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from usuarios.autenticacao import JWTAutenticacaoCache, cache_compartilhado, invalidar_usuario_em_cache
+from usuarios.autorizacao import tokens_com_autorizacao
+from usuarios.models import Usuario
+from usuarios.views import UsuarioViewSet
+
+
+AUTENTICACOES = [('JWTAuthentication (banco)', JWTAuthentication), ('JWTAutenticacaoCache', JWTAutenticacaoCache)]
+
+
+class Command(BaseCommand):
+    help = 'Compara requisições/s da autenticação JWT padrão e com o usuário em cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requisicoes', type=int, default=2000, help='Requisições por autenticação (padrão: 2000)')
+
+    def handle(self, *args, **options):
+        if options['requisicoes'] < 1:
+            raise CommandError('--requisicoes deve ser maior que zero.')
+        if not cache_compartilhado():
+            self.stderr.write(
+                'Aviso: USUARIOS_CACHE_USUARIO aponta para um cache local ao processo; '
+                'o usuário não será guardado em cache.'
+            )
+
+        sufixo = uuid.uuid4().hex[:8]
+        usuario = Usuario.objects.create_user(
+            username=f'benchmark-{sufixo}',
+            email=f'benchmark-{sufixo}@reserveaqui.local',
+            password=Usuario.gerar_senha_generica(),
+            nome='Benchmark de Autenticação'
+        )
+        try:
+            cabecalho = f'Bearer {tokens_com_autorizacao(usuario).access_token}'
+            resultados = [
+                (nome, *self._medir(autenticacao, cabecalho, options['requisicoes']))
+                for nome, autenticacao in AUTENTICACOES
+            ]
+        finally:
+            invalidar_usuario_em_cache(usuario.pk)
+            usuario.delete()
+
+        base = resultados[0][1]
+        for nome, vazao, consultas in resultados:
+            self.stdout.write(
+                f'{nome}: {vazao:.0f} requisições/s | {consultas:.2f} consultas/requisição '
+                f'| {vazao / base if base else 0:.2f}x'
+            )
+
+    def _medir(self, autenticacao, cabecalho, requisicoes):
+        """Retorna (requisições/s, consultas por requisição)"""
+        view = UsuarioViewSet.as_view({'get': 'me'}, authentication_classes=[autenticacao])
+        fabrica = APIRequestFactory()
+
+        # Aquecimento (e carga do cache)
+        view(fabrica.get('/api/usuarios/me/', HTTP_AUTHORIZATION=cabecalho))
+
+        with CaptureQueriesContext(connection) as consultas:
+            comeco = relogio.perf_counter()
+            for _ in range(requisicoes):
+                response = view(fabrica.get('/api/usuarios/me/', HTTP_AUTHORIZATION=cabecalho))
+                if response.status_code != 200:
+                    raise CommandError(f'Resposta inesperada: {response.status_code}')
+            duracao = relogio.perf_counter() - comeco
+        return requisicoes / duracao, len(consultas) / requisicoes
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_populate_papeis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='versao_autorizacao',
+            field=models.PositiveIntegerField(default=0, help_text='Incrementada quando papéis ou vínculos com restaurantes mudam; invalida as permissões gravadas nos tokens JWT já emitidos', verbose_name='Versão da Autorização'),
+        ),
+    ]
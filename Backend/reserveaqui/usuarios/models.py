@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.tokens import default_token_generator
 from django.utils import timezone
@@ -46,6 +48,12 @@ class Usuario(AbstractUser):
         verbose_name="Precisa Trocar Senha",
         help_text="Indica se o usuário precisa trocar a senha no próximo login"
     )
+    versao_autorizacao = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Versão da Autorização",
+        help_text="Incrementada quando papéis ou vínculos com restaurantes mudam; "
+                  "invalida as permissões gravadas nos tokens JWT já emitidos"
+    )
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'nome']
@@ -142,3 +150,35 @@ class PasswordResetToken(models.Model):
         )
         
         return reset_token
+
+
+@receiver(post_save, sender=UsuarioPapel)
+@receiver(post_delete, sender=UsuarioPapel)
+def invalidar_autorizacao_papel(sender, instance, **kwargs):
+    """Signal para invalidar as permissões dos tokens quando um papel é atribuído ou removido"""
+    from .autorizacao import invalidar_autorizacao
+    invalidar_autorizacao(instance.usuario_id)
+
+
+@receiver(m2m_changed, sender=Usuario.papeis.through)
+def invalidar_autorizacao_papeis(sender, instance, action, reverse, pk_set, **kwargs):
+    """Signal para papeis.add/remove/clear (não disparam o post_save do UsuarioPapel)"""
+    from .autorizacao import invalidar_autorizacao
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidar_autorizacao(instance.pk)
+    elif action in ('post_add', 'post_remove'):
+        invalidar_autorizacao(*pk_set)
+    elif action == 'pre_clear':
+        # papel.usuario_set.clear(): os usuários afetados só são conhecidos antes
+        invalidar_autorizacao(*instance.usuariopapel_set.values_list('usuario_id', flat=True))
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_usuario_autenticado(sender, instance, **kwargs):
+    """Signal para descartar o usuário em cache da autenticação (senha, desativação, edição)"""
+    from .autenticacao import invalidar_usuario_em_cache
+    from .autorizacao import cache_vinculos
+    invalidar_usuario_em_cache(instance.pk)
+    cache_vinculos.descartar(instance.pk)
@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
 from .models import Usuario, Papel, PasswordResetToken
 from .validators import validar_forca_senha
 
@@ -222,4 +225,19 @@ class RedefinirSenhaSerializer(serializers.Serializer):
             })
         
         data['reset_token'] = reset_token
-        return data
\ No newline at end of file
+        return data
+
+
+class TokenRefreshAutorizacaoSerializer(TokenRefreshSerializer):
+    """Refresh que emite o token de acesso com a claim de autorização atual"""
+
+    def validate(self, attrs):
+        from .autorizacao import CLAIM_AUTORIZACAO, claims_autorizacao
+
+        data = super().validate(attrs)
+        access = AccessToken(data['access'])
+        usuario = Usuario.objects.filter(pk=access.get(jwt_settings.USER_ID_CLAIM)).first()
+        if usuario is not None:
+            access[CLAIM_AUTORIZACAO] = claims_autorizacao(usuario)
+            data['access'] = str(access)
+        return data
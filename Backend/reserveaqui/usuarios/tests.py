@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.test import TestCase
 from django.db import IntegrityError
 from django.contrib.auth import authenticate
@@ -246,3 +247,393 @@ class ValidadorForcaSenhaTest(TestCase):
             # Se não lançar exceção, passou
         except Exception:
             self.fail('Senha válida lançou exceção')
+
+
+class ContextoAutorizacaoTest(TestCase):
+    """Testes para o contexto de autorização por requisição"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from restaurantes.models import Restaurante, RestauranteUsuario
+        self.usuario = Usuario.objects.create_user(
+            email='usuario@example.com',
+            nome='Usuario Test',
+            username='usuario_test',
+            password='SenhaForte123'
+        )
+        self.outro = Usuario.objects.create_user(
+            email='outro@example.com',
+            nome='Outro Test',
+            username='outro_test',
+            password='SenhaForte123'
+        )
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='funcionario')[0])
+        
+        self.proprio = Restaurante.objects.create(
+            nome='Restaurante Próprio',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='proprio@restaurant.com',
+            proprietario=self.usuario,
+            quantidade_mesas=1
+        )
+        self.alheio = Restaurante.objects.create(
+            nome='Restaurante Alheio',
+            endereco='Rua Test, 456',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='alheio@restaurant.com',
+            proprietario=self.outro,
+            quantidade_mesas=1
+        )
+        RestauranteUsuario.objects.create(restaurante=self.proprio, usuario=self.usuario, papel='admin_secundario')
+        RestauranteUsuario.objects.create(restaurante=self.alheio, usuario=self.usuario, papel='funcionario')
+    
+    def test_contexto_em_uma_consulta(self):
+        """Teste que papéis e vínculos vêm em uma consulta"""
+        from .autorizacao import carregar_contexto
+        
+        with self.assertNumQueries(1):
+            contexto = carregar_contexto(self.usuario)
+        
+        self.assertTrue(contexto.tem_papel('funcionario'))
+        self.assertFalse(contexto.is_admin)
+        self.assertTrue(contexto.is_proprietario(self.proprio.id))
+        self.assertEqual(contexto.papel_no_restaurante(self.alheio.id), 'funcionario')
+        self.assertEqual(contexto.restaurantes_proprios(), {self.proprio.id})
+        self.assertEqual(contexto.restaurantes_da_equipe(), {self.proprio.id, self.alheio.id})
+    
+    def test_contexto_guardado_na_requisicao(self):
+        """Teste que o contexto é carregado uma vez por requisição e usuário"""
+        from django.test import RequestFactory
+        from .autorizacao import contexto_autorizacao
+        request = RequestFactory().get('/')
+        request.user = self.usuario
+        
+        with self.assertNumQueries(1):
+            contexto = contexto_autorizacao(request)
+            self.assertIs(contexto_autorizacao(request), contexto)
+        
+        request.user = self.outro
+        self.assertEqual(contexto_autorizacao(request).restaurantes_proprios(), {self.alheio.id})
+    
+    def test_anonimo_sem_consultas(self):
+        """Teste que o usuário anônimo tem contexto vazio"""
+        from django.contrib.auth.models import AnonymousUser
+        from .autorizacao import carregar_contexto
+        
+        with self.assertNumQueries(0):
+            contexto = carregar_contexto(AnonymousUser())
+        
+        self.assertFalse(contexto.pode_gerenciar(self.proprio.id))
+
+
+class ClaimsAutorizacaoTest(TestCase):
+    """Testes para a claim de autorização dos tokens JWT"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from restaurantes.models import Restaurante
+        self.usuario = Usuario.objects.create_user(
+            email='usuario@example.com',
+            nome='Usuario Test',
+            username='usuario_test',
+            password='SenhaForte123'
+        )
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='funcionario')[0])
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.usuario,
+            quantidade_mesas=1
+        )
+    
+    def _login(self):
+        from rest_framework.test import APIClient
+        response = APIClient().post(
+            '/api/usuarios/login/',
+            {'email': 'usuario@example.com', 'password': 'SenhaForte123'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+    
+    def _request(self, access):
+        from django.test import RequestFactory
+        from rest_framework_simplejwt.tokens import AccessToken
+        request = RequestFactory().get('/')
+        request.user = Usuario.objects.get(pk=self.usuario.pk)
+        request.auth = AccessToken(access)
+        return request
+    
+    def test_login_emite_claims(self):
+        """Teste que o token de acesso do login leva papéis, restaurantes e versão"""
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .autorizacao import CLAIM_AUTORIZACAO
+        
+        claims = AccessToken(self._login()['access'])[CLAIM_AUTORIZACAO]
+        
+        self.usuario.refresh_from_db()
+        self.assertEqual(claims['v'], self.usuario.versao_autorizacao)
+        self.assertEqual(claims['p'], ['funcionario'])
+        self.assertEqual(claims['r'], {str(self.restaurante.id): 'proprietario'})
+    
+    def test_claims_sem_consultas(self):
+        """Teste que o contexto vem da claim sem consultar o banco"""
+        from .autorizacao import contexto_autorizacao
+        request = self._request(self._login()['access'])
+        
+        with self.assertNumQueries(0):
+            contexto = contexto_autorizacao(request)
+        
+        self.assertTrue(contexto.tem_papel('funcionario'))
+        self.assertTrue(contexto.is_proprietario(self.restaurante.id))
+    
+    def test_mudanca_de_papel_invalida_claims(self):
+        """Teste que mudar papéis vence a claim e o contexto volta ao banco"""
+        from .autorizacao import contexto_autorizacao
+        access = self._login()['access']
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        request = self._request(access)
+        
+        with self.assertNumQueries(1):
+            contexto = contexto_autorizacao(request)
+        
+        self.assertTrue(contexto.is_admin_sistema)
+    
+    def test_refresh_reemite_claims(self):
+        """Teste que o refresh emite a claim com a versão e os papéis atuais"""
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .autorizacao import CLAIM_AUTORIZACAO
+        refresh = self._login()['refresh']
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        
+        response = APIClient().post('/api/token/refresh/', {'refresh': refresh}, format='json')
+        
+        self.assertEqual(response.status_code, 200)
+        claims = AccessToken(response.data['access'])[CLAIM_AUTORIZACAO]
+        self.usuario.refresh_from_db()
+        self.assertEqual(claims['v'], self.usuario.versao_autorizacao)
+        self.assertEqual(claims['p'], ['admin_sistema', 'funcionario'])
+    
+    def test_usuario_em_cache_vence_claims(self):
+        """Teste que a claim antiga é recusada mesmo com o usuário autenticado vindo do cache"""
+        from django.core.cache import caches
+        from django.test import RequestFactory
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .autenticacao import JWTAutenticacaoCache
+        from .autorizacao import contexto_autorizacao
+        caches[settings.USUARIOS_CACHE_USUARIO].clear()
+        token = AccessToken(self._login()['access'])
+        # Usuário guardado no cache por uma requisição anterior (de qualquer processo)
+        JWTAutenticacaoCache().get_user(token)
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='admin_sistema')[0])
+        
+        request = RequestFactory().get('/')
+        request.user = JWTAutenticacaoCache().get_user(token)
+        request.auth = token
+        contexto = contexto_autorizacao(request)
+        
+        self.assertTrue(contexto.is_admin_sistema)
+
+
+class AutenticacaoCacheTest(TestCase):
+    """Testes para a autenticação JWT com o usuário em cache (configuração padrão)"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from django.core.cache import caches
+        from rest_framework_simplejwt.tokens import AccessToken
+        caches[settings.USUARIOS_CACHE_USUARIO].clear()
+        self.usuario = Usuario.objects.create_user(
+            email='usuario@example.com',
+            nome='Usuario Test',
+            username='usuario_test',
+            password='SenhaForte123'
+        )
+        self.token = AccessToken.for_user(self.usuario)
+    
+    def test_usuario_em_cache_sem_consultas(self):
+        """Teste que só a primeira autenticação consulta o banco"""
+        from .autenticacao import JWTAutenticacaoCache
+        autenticacao = JWTAutenticacaoCache()
+        
+        with self.assertNumQueries(1):
+            autenticacao.get_user(self.token)
+        with self.assertNumQueries(0):
+            usuario = autenticacao.get_user(self.token)
+        
+        self.assertEqual(usuario.pk, self.usuario.pk)
+    
+    def test_requisicao_sem_consultar_usuario(self):
+        """Teste que, com as configurações padrão, a requisição seguinte não busca o usuário no banco"""
+        from rest_framework.test import APIClient
+        from .autenticacao import cache_compartilhado
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.assertTrue(cache_compartilhado())
+        
+        # Usuário e papéis serializados
+        with self.assertNumQueries(2):
+            client.get('/api/usuarios/me/')
+        # Só os papéis serializados
+        with self.assertNumQueries(1):
+            response = client.get('/api/usuarios/me/')
+        
+        self.assertEqual(response.status_code, 200)
+    
+    def test_troca_de_senha_invalida_cache(self):
+        """Teste que salvar o usuário descarta o registro em cache"""
+        from .autenticacao import JWTAutenticacaoCache
+        autenticacao = JWTAutenticacaoCache()
+        autenticacao.get_user(self.token)
+        
+        self.usuario.set_password('OutraSenha456')
+        self.usuario.save()
+        
+        with self.assertNumQueries(1):
+            usuario = autenticacao.get_user(self.token)
+        self.assertTrue(usuario.check_password('OutraSenha456'))
+    
+    def test_usuario_desativado_recusado(self):
+        """Teste que o usuário desativado deixa de autenticar mesmo estando em cache"""
+        from rest_framework_simplejwt.exceptions import AuthenticationFailed
+        from .autenticacao import JWTAutenticacaoCache
+        autenticacao = JWTAutenticacaoCache()
+        autenticacao.get_user(self.token)
+        
+        self.usuario.is_active = False
+        self.usuario.save()
+        
+        with self.assertRaises(AuthenticationFailed):
+            autenticacao.get_user(self.token)
+    
+    def test_mudanca_de_papel_atualiza_versao(self):
+        """Teste que a nova versão de autorização não fica presa no cache"""
+        from .autenticacao import JWTAutenticacaoCache
+        autenticacao = JWTAutenticacaoCache()
+        versao = autenticacao.get_user(self.token).versao_autorizacao
+        
+        self.usuario.papeis.add(Papel.objects.get_or_create(tipo='funcionario')[0])
+        
+        self.assertEqual(autenticacao.get_user(self.token).versao_autorizacao, versao + 1)
+    
+    def test_cache_local_nao_guarda_usuario(self):
+        """Teste que, com cache local ao processo, o usuário é sempre lido do banco e a verificação avisa"""
+        from .autenticacao import JWTAutenticacaoCache
+        from .checks import verificar_cache_usuario
+        autenticacao = JWTAutenticacaoCache()
+        
+        with self.settings(USUARIOS_CACHE_USUARIO='default'):
+            autenticacao.get_user(self.token)
+            with self.assertNumQueries(1):
+                autenticacao.get_user(self.token)
+            self.assertEqual([aviso.id for aviso in verificar_cache_usuario(None)], ['usuarios.W001'])
+        
+        self.assertEqual(verificar_cache_usuario(None), [])
+
+
+class CacheVinculosTest(TestCase):
+    """Testes para o cache de vínculos com restaurantes"""
+    
+    def setUp(self):
+        """Criar dados para testes"""
+        from restaurantes.models import Restaurante
+        self.usuario = Usuario.objects.create_user(
+            email='usuario@example.com',
+            nome='Usuario Test',
+            username='usuario_test',
+            password='SenhaForte123'
+        )
+        self.outro = Usuario.objects.create_user(
+            email='outro@example.com',
+            nome='Outro Test',
+            username='outro_test',
+            password='SenhaForte123'
+        )
+        self.restaurante = Restaurante.objects.create(
+            nome='Restaurante Test',
+            endereco='Rua Test, 123',
+            cidade='Test City',
+            estado='TC',
+            cep='99999-999',
+            email='test@restaurant.com',
+            proprietario=self.outro,
+            quantidade_mesas=1
+        )
+    
+    def _contexto(self, usuario):
+        from .autorizacao import carregar_contexto
+        return carregar_contexto(Usuario.objects.get(pk=usuario.pk))
+    
+    def test_vinculos_em_cache(self):
+        """Teste que a segunda carga do contexto não consulta o banco"""
+        from .autorizacao import carregar_contexto
+        usuario = Usuario.objects.get(pk=self.outro.pk)
+        
+        with self.assertNumQueries(1):
+            carregar_contexto(usuario)
+        with self.assertNumQueries(0):
+            contexto = carregar_contexto(usuario)
+        
+        self.assertTrue(contexto.is_proprietario(self.restaurante.id))
+    
+    def test_vinculo_invalida_cache(self):
+        """Teste que vincular o usuário a um restaurante atualiza o contexto"""
+        from restaurantes.models import RestauranteUsuario
+        self.assertIsNone(self._contexto(self.usuario).papel_no_restaurante(self.restaurante.id))
+        
+        RestauranteUsuario.objects.create(restaurante=self.restaurante, usuario=self.usuario, papel='funcionario')
+        
+        self.assertTrue(self._contexto(self.usuario).trabalha_no_restaurante(self.restaurante.id))
+    
+    def test_troca_de_proprietario_invalida_cache(self):
+        """Teste que a troca de proprietário atualiza o contexto do antigo e do novo dono"""
+        from restaurantes.models import Restaurante
+        self.assertTrue(self._contexto(self.outro).is_proprietario(self.restaurante.id))
+        self.assertFalse(self._contexto(self.usuario).is_proprietario(self.restaurante.id))
+        
+        restaurante = Restaurante.objects.get(pk=self.restaurante.pk)
+        restaurante.proprietario = self.usuario
+        restaurante.save()
+        
+        self.assertFalse(self._contexto(self.outro).is_proprietario(self.restaurante.id))
+        self.assertTrue(self._contexto(self.usuario).is_proprietario(self.restaurante.id))
+    
+    def test_versao_diferente_ignora_cache(self):
+        """Teste que a entrada de outra versão (ex: guardada em outro processo) não é usada"""
+        from .autorizacao import carregar_contexto
+        self._contexto(self.outro)
+        usuario = Usuario.objects.get(pk=self.outro.pk)
+        usuario.versao_autorizacao += 1
+        
+        with self.assertNumQueries(1):
+            carregar_contexto(usuario)
+    
+    def test_mudanca_em_outro_processo_ignora_cache(self):
+        """Teste que a mudança feita por outro processo vence a entrada pela versão do usuário autenticado"""
+        from django.core.cache import caches
+        from django.db.models import F
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .autenticacao import JWTAutenticacaoCache, invalidar_usuario_em_cache
+        from .autorizacao import carregar_contexto
+        caches[settings.USUARIOS_CACHE_USUARIO].clear()
+        token = AccessToken.for_user(self.outro)
+        autenticacao = JWTAutenticacaoCache()
+        carregar_contexto(autenticacao.get_user(token))
+        # O outro processo incrementa a versão e descarta o usuário do cache
+        # compartilhado, mas não alcança o cache de vínculos deste processo
+        Usuario.objects.filter(pk=self.outro.pk).update(versao_autorizacao=F('versao_autorizacao') + 1)
+        invalidar_usuario_em_cache(self.outro.pk)
+        usuario = autenticacao.get_user(token)
+        
+        with self.assertNumQueries(1):
+            carregar_contexto(usuario)
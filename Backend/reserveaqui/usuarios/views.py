@@ -2,10 +2,10 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.core.mail import send_mail
 from django.conf import settings
 from .models import Usuario, PasswordResetToken
+from .autorizacao import tokens_com_autorizacao
 from .serializers import (
     UsuarioSerializer, LoginSerializer, TrocarSenhaSerializer,
     SolicitarRecuperacaoSenhaSerializer, RedefinirSenhaSerializer,
@@ -42,7 +42,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             usuario = serializer.validated_data['usuario']
-            refresh = RefreshToken.for_user(usuario)
+            refresh = tokens_com_autorizacao(usuario)
             
             return Response({
                 'mensagem': 'Login realizado com sucesso!',